@@ -1,6 +1,8 @@
-from flask import Flask
+from flask import Flask, jsonify
 from app.config import DevConfig, ProdConfig, TestingConfig
-from app.extensions import db, migrate, bcrypt, jwt, cors
+from app.extensions import db, migrate, bcrypt, jwt, cors, route_cache, upstreams, address_index, identity_cache, password_hasher, events, outbox
+from app.utilis.hashing import HashingBusy
+from app.utilis.events import StreamLimitReached
 
 
 from app.routes.auth import auth_bp
@@ -9,6 +11,7 @@ from app.routes.customer import customer_bp
 from app.routes.admin import admin_bp
 from app.routes.notifications import notifications_bp
 from app.routes.maps import maps_bp
+from app.cli import notifications_cli, outbox_cli, parcels_cli
 
 
 from . import models
@@ -32,11 +35,19 @@ def create_app(config_name="development"):
     migrate.init_app(app, db)
     bcrypt.init_app(app)
     jwt.init_app(app)
+    route_cache.init_app(app)
+    upstreams.init_app(app)
+    address_index.init_app(app)
+    identity_cache.init_app(app)
+    password_hasher.init_app(app)
+    events.init_app(app)
+    outbox.init_app(app)
     cors.init_app(app,
-    resources={r"/*": {"origins": ["http://localhost:5173","https://deliveroo-4lqr.onrender.com"]}},
+    resources={r"/*": {"origins": app.config["CORS_ORIGINS"]}},
     supports_credentials=True,
     methods=["GET","POST","PUT","PATCH","DELETE","OPTIONS"],
-    allow_headers=["Content-Type", "Authorization"])
+    allow_headers=["Content-Type", "Authorization"],
+    expose_headers=["X-Next-Cursor", "X-Prev-Cursor", "Retry-After"])
 
 
     # blueprints registration
@@ -47,6 +58,23 @@ def create_app(config_name="development"):
     app.register_blueprint(notifications_bp, url_prefix="/api/notifications")
     app.register_blueprint(maps_bp, url_prefix="/api/maps")
 
+    # CLI commands
+    app.cli.add_command(notifications_cli)
+    app.cli.add_command(outbox_cli)
+    app.cli.add_command(parcels_cli)
+
+
+    @app.errorhandler(HashingBusy)
+    def hashing_busy(e):
+        response = jsonify({"success": False, "msg": "Server busy, please retry shortly"})
+        response.headers["Retry-After"] = str(e.retry_after)
+        return response, 503
+
+    @app.errorhandler(StreamLimitReached)
+    def stream_limit_reached(e):
+        response = jsonify({"error": "Too many open streams, please retry shortly"})
+        response.headers["Retry-After"] = str(e.retry_after)
+        return response, 503
 
     @app.route("/")
     def index():
@@ -0,0 +1,55 @@
+# app/cli.py
+import json
+import click
+from flask.cli import AppGroup
+from app.utilis import notification_service, outbox, parcel_events, retention, route_service
+
+notifications_cli = AppGroup("notifications", help="Notification maintenance commands.")
+
+
+@notifications_cli.command("reconcile")
+@click.option("--batch-size", default=500, show_default=True, help="Users recounted per transaction.")
+def reconcile_command(batch_size):
+    """Recount every stored unread counter from the notifications table."""
+    done = notification_service.reconcile_all(batch_size=batch_size)
+    click.echo(f"Reconciled unread counters for {done} users")
+
+
+@notifications_cli.command("prune")
+@click.option("--dry-run", is_flag=True, help="Only count what would be archived.")
+@click.option("--batch-size", default=None, type=int, help="Rows per transaction (NOTIFICATION_RETENTION_BATCH_SIZE).")
+@click.option("--max-batches", default=None, type=int, help="Stop after this many batches.")
+def prune_command(dry_run, batch_size, max_batches):
+    """Archive and delete notifications past their retention period."""
+    report = retention.prune_notifications(batch_size=batch_size, max_batches=max_batches, dry_run=dry_run)
+    click.echo(json.dumps(report, indent=2))
+
+
+@notifications_cli.command("digest")
+@click.option("--force", is_flag=True, help="Send even if ADMIN_DIGEST_INTERVAL has not passed.")
+def digest_command(force):
+    """Send the admin digest of recent parcel events."""
+    notification = parcel_events.send_admin_digest(force=force)
+    click.echo(notification.message if notification else "Nothing to digest")
+
+
+outbox_cli = AppGroup("outbox", help="Outbox worker commands.")
+
+
+@outbox_cli.command("drain")
+@click.option("--batch-size", default=None, type=int, help="Events per transaction (OUTBOX_BATCH_SIZE).")
+def drain_command(batch_size):
+    """Process every due outbox event now."""
+    processed, failed = outbox.drain(batch_size)
+    click.echo(f"Processed {processed} outbox events, {failed} failed")
+
+
+parcels_cli = AppGroup("parcels", help="Parcel maintenance commands.")
+
+
+@parcels_cli.command("retry-routes")
+@click.option("--limit", default=None, type=int, help="Retry at most this many parcels.")
+def retry_routes_command(limit):
+    """Recompute routes stored as estimates while OSRM was unavailable."""
+    retried, estimated = route_service.retry_estimated_routes(limit)
+    click.echo(f"Retried {retried} estimated routes, {estimated} still estimated")
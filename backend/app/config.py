@@ -1,5 +1,6 @@
 import os
 from dotenv import load_dotenv
+from app.utilis.routing import DEFAULT_CIRCUITY_FACTOR, DEFAULT_SPEED_PROFILES
 
 load_dotenv()
 
@@ -8,7 +9,119 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "supersecret")
     SECRET_KEY = os.getenv("SECRET_KEY", "devsecret")
-    BCRYPT_LOG_ROUNDS = 12
+    # bcrypt cost for new hashes; older hashes are upgraded on the next login
+    BCRYPT_LOG_ROUNDS = int(os.getenv("BCRYPT_LOG_ROUNDS", 12))
+    PASSWORD_REHASH_ASYNC = True
+    CORS_ORIGINS = ["http://localhost:5173", "https://deliveroo-4lqr.onrender.com"]
+
+    # Route cache for /api/maps/distance ("memory" or "sqlite")
+    ROUTE_CACHE_BACKEND = os.getenv("ROUTE_CACHE_BACKEND", "memory")
+    ROUTE_CACHE_PATH = os.getenv("ROUTE_CACHE_PATH")
+    ROUTE_CACHE_TTL = int(os.getenv("ROUTE_CACHE_TTL", 6 * 3600))
+    ROUTE_CACHE_MAX_ENTRIES = int(os.getenv("ROUTE_CACHE_MAX_ENTRIES", 5000))
+    ROUTE_CACHE_PRECISION = 4
+    # Default Douglas-Peucker tolerance for route geometry, in metres
+    ROUTE_SIMPLIFY_TOLERANCE_M = float(os.getenv("ROUTE_SIMPLIFY_TOLERANCE_M", 5))
+    # ?tolerance= is snapped down to one of these, so clients can't mint cache variants
+    ROUTE_SIMPLIFY_TOLERANCES = (0, 1, 2, 5, 10, 25, 50, 100)
+
+    # Upstream map services (OSRM routing, Nominatim geocoding)
+    OSRM_URL = os.getenv("OSRM_URL", "http://router.project-osrm.org")
+    NOMINATIM_URL = os.getenv("NOMINATIM_URL", "https://nominatim.openstreetmap.org")
+    UPSTREAM_CONNECT_TIMEOUT = 3.05
+    UPSTREAM_READ_TIMEOUT = float(os.getenv("UPSTREAM_READ_TIMEOUT", 10))
+    UPSTREAM_RETRIES = 2
+    UPSTREAM_BACKOFF = 0.2
+    UPSTREAM_POOL_SIZE = 10
+    ASYNC_UPSTREAM_POOL_SIZE = 20
+    CIRCUIT_FAILURE_THRESHOLD = 5
+    CIRCUIT_RESET_TIMEOUT = 30
+
+    # Offline route estimates (?mode=fast and OSRM fallback)
+    ROUTE_CIRCUITY_FACTOR = float(os.getenv("ROUTE_CIRCUITY_FACTOR", DEFAULT_CIRCUITY_FACTOR))
+    ROUTE_SPEED_PROFILES = dict(DEFAULT_SPEED_PROFILES)
+
+    # /api/maps/matrix limits (the public OSRM server allows 100 coordinates per table)
+    MATRIX_MAX_COORDINATES = int(os.getenv("MATRIX_MAX_COORDINATES", 100))
+    MATRIX_MAX_PAIRS = 2500
+
+    # Reverse geocoding: answer from known addresses within this radius,
+    # cache Nominatim misses for GEOCODE_CACHE_TTL seconds
+    GEOCODE_LOCAL_RADIUS_M = float(os.getenv("GEOCODE_LOCAL_RADIUS_M", 50))
+    GEOCODE_INDEX_REFRESH = 600
+    GEOCODE_INDEX_REFRESH_ASYNC = True
+    GEOCODE_CACHE_TTL = 7 * 24 * 3600
+
+    # Compute parcel routes on a background thread after create/update; a
+    # bulk create is one job, so it holds one of the PARCEL_ROUTE_WORKERS
+    PARCEL_ROUTE_ASYNC = True
+    PARCEL_ROUTE_WORKERS = int(os.getenv("PARCEL_ROUTE_WORKERS", 2))
+    # Estimated routes older than this are retried by `flask parcels retry-routes`
+    PARCEL_ROUTE_RETRY_AFTER = 300
+
+    # bcrypt runs in a per-worker process pool; once HASH_POOL_MAX_PENDING
+    # hashes are running or queued, login/signup answer 503 with Retry-After
+    HASH_POOL_WORKERS = int(os.getenv("HASH_POOL_WORKERS", 2))
+    HASH_POOL_MAX_PENDING = int(os.getenv("HASH_POOL_MAX_PENDING", 32))
+    HASH_TIMEOUT = 10
+
+    # GET /api/notifications/get/notifications page size
+    NOTIFICATIONS_PAGE_SIZE = 50
+    NOTIFICATIONS_MAX_PAGE_SIZE = 200
+
+    # GET /api/parcels and /api/customer/parcels page size
+    PARCELS_PAGE_SIZE = 50
+    PARCELS_MAX_PAGE_SIZE = 200
+    # Rows fetched per round trip by GET /api/admin/parcels/export
+    EXPORT_BATCH_SIZE = 1000
+    # Parcels accepted by one bulk request (customer bulk create, admin bulk status)
+    BULK_PARCELS_MAX = 500
+
+    # GET /api/notifications/stream (Server-Sent Events). "memory" only
+    # reaches streams on the same worker; "sqlite" shares a local file
+    # between the workers on a host
+    EVENT_BROKER_BACKEND = os.getenv("EVENT_BROKER_BACKEND", "memory")
+    EVENT_BROKER_PATH = os.getenv("EVENT_BROKER_PATH")
+    EVENT_POLL_INTERVAL = 0.5
+    EVENT_HISTORY = 1000  # events kept for Last-Event-ID resume
+    SSE_MAX_CONNECTIONS = int(os.getenv("SSE_MAX_CONNECTIONS", 48))  # per worker
+    SSE_HEARTBEAT = 15
+    SSE_MAX_DURATION = 300
+    SSE_RETRY_MS = 3000
+
+    # Parcel side effects (notifications) are recorded as outbox events in
+    # the request transaction and applied by a background worker
+    OUTBOX_ASYNC = True
+    OUTBOX_BATCH_SIZE = 100
+    OUTBOX_POLL_INTERVAL = 5
+    OUTBOX_MAX_ATTEMPTS = 5
+    OUTBOX_RETRY_BACKOFF = 2  # seconds, doubled per attempt
+    OUTBOX_RETENTION_DAYS = 7  # processed events; None keeps them
+
+    # Parcel updates for the same customer within this many seconds rewrite
+    # one unread notification (0 disables). With ADMIN_DIGEST_INTERVAL set,
+    # admins get one summary ALERT per interval instead of one per event
+    NOTIFICATION_COALESCE_WINDOW = int(os.getenv("NOTIFICATION_COALESCE_WINDOW", 300))
+    ADMIN_DIGEST_INTERVAL = int(os.getenv("ADMIN_DIGEST_INTERVAL", 0))
+    ADMIN_DIGEST_LAG = 10
+
+    # Retention (flask notifications prune): read notifications older than
+    # their type's TTL in days are archived and deleted (None keeps them).
+    # NOTIFICATION_ARCHIVE is "table", "file" (gzipped JSON lines under
+    # NOTIFICATION_ARCHIVE_PATH) or "none"
+    NOTIFICATION_RETENTION_DAYS = {
+        "INFO": 30,
+        "ALERT": 30,
+        "PARCEL_UPDATE": 90,
+    }
+    NOTIFICATION_ARCHIVE = os.getenv("NOTIFICATION_ARCHIVE", "table")
+    NOTIFICATION_ARCHIVE_PATH = os.getenv("NOTIFICATION_ARCHIVE_PATH")
+    NOTIFICATION_RETENTION_BATCH_SIZE = 1000
+    NOTIFICATION_RETENTION_PAUSE = 0.1  # seconds between batches
+
+    # Per-worker cache of user name/email/phone for authenticated views
+    IDENTITY_CACHE_TTL = int(os.getenv("IDENTITY_CACHE_TTL", 300))
+    IDENTITY_CACHE_MAX_ENTRIES = 10000
 
 class DevConfig(Config):
     DEBUG = True
@@ -23,3 +136,13 @@ class TestingConfig(Config):
     SQLALCHEMY_DATABASE_URI = "sqlite:///:memory:"
     WTF_CSRF_ENABLED = False
     BCRYPT_LOG_ROUNDS = 4
+    HASH_POOL_WORKERS = 0
+    PASSWORD_REHASH_ASYNC = False
+    ROUTE_CACHE_BACKEND = "memory"
+    UPSTREAM_READ_TIMEOUT = 2
+    UPSTREAM_BACKOFF = 0
+    PARCEL_ROUTE_ASYNC = False
+    GEOCODE_INDEX_REFRESH_ASYNC = False
+    EVENT_BROKER_BACKEND = "memory"
+    OUTBOX_ASYNC = False
+    NOTIFICATION_RETENTION_PAUSE = 0
@@ -3,6 +3,14 @@ from flask_migrate import Migrate
 from flask_bcrypt import Bcrypt
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS
+from app.utilis.cache import RouteCache
+from app.utilis.upstream import Upstreams
+from app.utilis.geoindex import AddressIndex
+from app.utilis.singleflight import SingleFlight
+from app.utilis.identity import IdentityCache
+from app.utilis.hashing import PasswordHasher
+from app.utilis.events import EventBroker
+from app.utilis.outbox import OutboxWorker
 
 # Instantiate extensions
 db = SQLAlchemy()
@@ -10,6 +18,14 @@ migrate = Migrate()
 bcrypt = Bcrypt()
 jwt = JWTManager()
 cors = CORS()
+route_cache = RouteCache()
+upstreams = Upstreams()
+address_index = AddressIndex()
+singleflight = SingleFlight()
+identity_cache = IdentityCache()
+password_hasher = PasswordHasher()
+events = EventBroker()
+outbox = OutboxWorker()
 
 # Utility helper to get the active database session
 def get_db():
@@ -1,6 +1,6 @@
 from sqlalchemy import (
     Column, String, Float, Date, DateTime, ForeignKey,
-    Enum, Text, Numeric, Boolean, Index
+    Enum, Text, Numeric, Boolean, Index, Integer, JSON
 )
 from email_validator import validate_email, EmailNotValidError
 from datetime import datetime, timezone
@@ -9,7 +9,12 @@ import enum
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import relationship
 from sqlalchemy_serializer import SerializerMixin
-from app.extensions import db, bcrypt
+from app.extensions import db, password_hasher
+from app.utilis.geoindex import register_address_events
+from app.utilis.identity import register_user_events
+from app.utilis.events import register_stream_events
+from app.utilis.outbox import register_outbox_events
+from app.utilis.password_service import schedule_rehash
 
 
 # Helpers
@@ -49,16 +54,16 @@ class User(db.Model, SerializerMixin):
     __tablename__ = "users"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=gen_uuid, unique=True, nullable=False)
-    name = Column(String(100), nullable=False, index=True)
+    name = Column(String(100), nullable=False)
     email = Column(String(100), unique=True, nullable=False, index=True)
     phone_number = Column(String(20), unique=True, nullable=False, index=True)
     _password_hash = Column(String, nullable=False)
 
-    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), index=True)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
     updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc),
-                        onupdate=lambda: datetime.now(timezone.utc), index=True)
+                        onupdate=lambda: datetime.now(timezone.utc))
 
-    role = Column(Enum(UserRole, name="user_role"), nullable=False, default=UserRole.CUSTOMER, index=True)
+    role = Column(Enum(UserRole, name="user_role"), nullable=False, default=UserRole.CUSTOMER)
     security_question = Column(String(255), nullable=True)
     _security_answer_hash = Column(String, nullable=True)
 
@@ -75,16 +80,22 @@ class User(db.Model, SerializerMixin):
 
     @password.setter
     def password(self, plain_password):
-        self._password_hash = bcrypt.generate_password_hash(plain_password).decode("utf-8")
+        self._password_hash = password_hasher.hash(plain_password)
 
     def check_password(self, plain_password):
-        return bcrypt.check_password_hash(self._password_hash, plain_password)
+        ok = password_hasher.check(plain_password, self._password_hash)
+        if ok and password_hasher.needs_rehash(self._password_hash):
+            schedule_rehash(self, plain_password)
+        return ok
 
     def set_security_answer(self, answer: str):
-        self._security_answer_hash = bcrypt.generate_password_hash(answer.lower().strip()).decode("utf-8")
+        self._security_answer_hash = password_hasher.hash(answer.lower().strip())
 
     def check_security_answer(self, answer: str) -> bool:
-        return bcrypt.check_password_hash(self._security_answer_hash, answer.lower().strip())
+        return password_hasher.check(answer.lower().strip(), self._security_answer_hash)
+
+
+register_user_events(User)
 
 
 class Parcel(db.Model, SerializerMixin):
@@ -93,19 +104,33 @@ class Parcel(db.Model, SerializerMixin):
     id = Column(UUID(as_uuid=True), primary_key=True, default=gen_uuid)
     tracking_id = Column(String, index=True, unique=True, nullable=False, default=_generate_tracking_id)
 
-    customer_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False, index=True)
-    pickup_address_id = Column(UUID(as_uuid=True), ForeignKey("addresses.id"), nullable=False, index=True)
-    delivery_address_id = Column(UUID(as_uuid=True), ForeignKey("addresses.id"), nullable=False, index=True)
+    customer_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
+    pickup_address_id = Column(UUID(as_uuid=True), ForeignKey("addresses.id"), nullable=False)
+    delivery_address_id = Column(UUID(as_uuid=True), ForeignKey("addresses.id"), nullable=False)
 
     weight_kg = Column(Float)
     description = Column(String)
 
-    status = Column(Enum(ParcelStatus, name="parcel_status"), default=ParcelStatus.CREATED, nullable=False, index=True)
-    estimated_delivery_date = Column(Date, index=True)
+    status = Column(Enum(ParcelStatus, name="parcel_status"), default=ParcelStatus.CREATED, nullable=False)
+    estimated_delivery_date = Column(Date)
 
     created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False, index=True)
     updated_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc),
-                        onupdate=lambda: datetime.now(timezone.utc), nullable=False, index=True)
+                        onupdate=lambda: datetime.now(timezone.utc), nullable=False)
+
+    # Precomputed pickup -> delivery route (filled in the background)
+    route_distance_km = Column(Float)
+    route_duration_min = Column(Float)
+    route_polyline = Column(Text)  # Google encoded polyline
+    route_computed_at = Column(DateTime(timezone=True))
+    route_source = Column(String(10))  # "osrm", or "estimate" until OSRM answers
+
+    # A customer's parcels, newest first; admin lists by status, newest first.
+    # The unfiltered admin list uses the created_at index.
+    __table_args__ = (
+        Index("ix_parcels_customer_created", "customer_id", "created_at"),
+        Index("ix_parcels_status_created", "status", "created_at"),
+    )
 
     # Relationships
     customer = relationship("User", back_populates="parcels")
@@ -121,13 +146,18 @@ class StatusHistory(db.Model, SerializerMixin):
     __tablename__ = "status_history"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=gen_uuid)
-    parcel_id = Column(UUID(as_uuid=True), ForeignKey("parcels.id"), nullable=False, index=True)
-    status = Column(Enum(ParcelStatus), nullable=False, index=True)
-    actor_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False, index=True)
+    parcel_id = Column(UUID(as_uuid=True), ForeignKey("parcels.id"), nullable=False)
+    status = Column(Enum(ParcelStatus), nullable=False)
+    actor_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False)
     notes = Column(Text)
     location_lat = Column(Numeric(10, 7))
     location_lng = Column(Numeric(10, 7))
-    timestamp = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), index=True)
+    timestamp = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
+
+    # A parcel's history in order
+    __table_args__ = (
+        Index("ix_status_history_parcel_timestamp", "parcel_id", "timestamp"),
+    )
 
     # Relationships
     parcel = relationship("Parcel", back_populates="status_history")
@@ -138,14 +168,15 @@ class Address(db.Model, SerializerMixin):
     __tablename__ = "addresses"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=gen_uuid)
-    street = Column(String(100), nullable=False, index=True)
-    city = Column(String(50), nullable=False, index=True)
-    county = Column(String(50), index=True)
-    country = Column(String(50), nullable=False, index=True)
-    postal_code = Column(String(20), index=True)
-    lat = Column(Numeric(10, 7), index=True)
-    lng = Column(Numeric(10, 7), index=True)
-    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), index=True)
+    # Addresses are only ever fetched by id (nearby lookups use the in-memory AddressIndex)
+    street = Column(String(100), nullable=False)
+    city = Column(String(50), nullable=False)
+    county = Column(String(50))
+    country = Column(String(50), nullable=False)
+    postal_code = Column(String(20))
+    lat = Column(Numeric(10, 7))
+    lng = Column(Numeric(10, 7))
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc))
 
     # Relationships
     pickup_parcels = relationship("Parcel", foreign_keys="Parcel.pickup_address_id", back_populates="pickup_address")
@@ -155,18 +186,136 @@ class Address(db.Model, SerializerMixin):
         return f"<Address {self.street}, {self.city}>"
 
 
+register_address_events(Address)
+
+
 class Notification(db.Model, SerializerMixin):
     __tablename__ = "notifications"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=gen_uuid)
-    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=False, index=True)
+    # Personal notifications have a user_id; broadcasts have an audience
+    # role instead and track per-user read state in NotificationReceipt
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id"), nullable=True)
+    audience = Column(Enum(UserRole, name="user_role"), nullable=True)
     message = Column(Text, nullable=False)
-    type = Column(Enum(NotificationType, name="notification_type"), nullable=False, default=NotificationType.INFO, index=True)
-    is_read = Column(Boolean, default=False, nullable=False, index=True)
-    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False, index=True)
+    type = Column(Enum(NotificationType, name="notification_type"), nullable=False, default=NotificationType.INFO)
+    is_read = Column(Boolean, default=False, nullable=False)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+    # Parcel the notification is about; repeated updates within
+    # NOTIFICATION_COALESCE_WINDOW rewrite one row and bump event_count
+    parcel_id = Column(UUID(as_uuid=True), ForeignKey("parcels.id", ondelete="SET NULL"))
+    event_count = Column(Integer, default=1, nullable=False)
+
+    # Keyset feed order (created_at, id) within each recipient; a user's
+    # unread rows (counter reconcile, mark-all-read, coalescing); expired
+    # rows of a type (retention)
+    __table_args__ = (
+        Index("ix_notifications_user_feed", "user_id", "created_at", "id"),
+        Index("ix_notifications_audience_feed", "audience", "created_at", "id"),
+        Index("ix_notifications_user_unread", "user_id", "is_read", "created_at"),
+        Index("ix_notifications_type_created", "type", "created_at"),
+    )
 
     # Relationships
     user = relationship("User", back_populates="notifications")
+    receipts = relationship("NotificationReceipt", back_populates="notification",
+                            cascade="all, delete-orphan", passive_deletes=True)
+
+    @property
+    def is_broadcast(self):
+        return self.audience is not None
 
     def __repr__(self):
-        return f"<Notification(user_id={self.user_id}, type={self.type.name}, is_read={self.is_read})>"
+        recipient = self.user_id if self.user_id else self.audience.name
+        return f"<Notification(user_id={recipient}, type={self.type.name}, is_read={self.is_read})>"
+
+
+class NotificationReceipt(db.Model, SerializerMixin):
+    """A user's read / dismissed marker on one broadcast notification."""
+    __tablename__ = "notification_receipts"
+
+    notification_id = Column(UUID(as_uuid=True), ForeignKey("notifications.id", ondelete="CASCADE"), primary_key=True)
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True, index=True)
+    read_at = Column(DateTime(timezone=True))
+    deleted_at = Column(DateTime(timezone=True))
+
+    notification = relationship("Notification", back_populates="receipts")
+
+
+class NotificationState(db.Model, SerializerMixin):
+    """
+    Per-user notification bookkeeping.
+
+    Broadcast watermarks are set by mark-all-read and delete-all: broadcasts
+    created at or before them count as read / cleared. The unread badge is
+    unread_count (personal, NULL until first counted) plus the broadcasts
+    sent to the user's role since broadcast_base that they have not handled
+    one by one (broadcast_handled).
+    """
+    __tablename__ = "notification_states"
+
+    user_id = Column(UUID(as_uuid=True), ForeignKey("users.id", ondelete="CASCADE"), primary_key=True)
+    broadcasts_read_before = Column(DateTime(timezone=True))
+    broadcasts_cleared_before = Column(DateTime(timezone=True))
+    unread_count = Column(Integer)
+    broadcast_base = Column(Integer, nullable=False, default=0)
+    broadcast_handled = Column(Integer, nullable=False, default=0)
+    counted_at = Column(DateTime(timezone=True))
+
+
+class NotificationArchive(db.Model, SerializerMixin):
+    """
+    Notification moved out by the retention job. Written once and only read
+    by id, so it carries no secondary indexes and no foreign keys.
+    """
+    __tablename__ = "notification_archive"
+
+    id = Column(UUID(as_uuid=True), primary_key=True)
+    user_id = Column(UUID(as_uuid=True))
+    audience = Column(Enum(UserRole, name="user_role"))
+    message = Column(Text, nullable=False)
+    type = Column(Enum(NotificationType, name="notification_type"), nullable=False)
+    is_read = Column(Boolean, nullable=False)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    archived_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+
+
+class NotificationCounter(db.Model, SerializerMixin):
+    """Running number of broadcasts ever sent to each role."""
+    __tablename__ = "notification_counters"
+
+    audience = Column(Enum(UserRole, name="user_role"), primary_key=True)
+    broadcast_total = Column(Integer, nullable=False, default=0)
+    # Parcel events up to here are covered by a sent digest
+    digested_until = Column(DateTime(timezone=True))
+
+
+class OutboxEvent(db.Model, SerializerMixin):
+    """
+    Domain event written in the same transaction as the change it describes.
+    The outbox worker runs its handler (e.g. to notify users) later and
+    stamps processed_at; failed events are retried from available_at.
+    """
+    __tablename__ = "outbox_events"
+
+    id = Column(UUID(as_uuid=True), primary_key=True, default=gen_uuid)
+    type = Column(String(64), nullable=False)
+    payload = Column(JSON, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(Text)
+    created_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+    available_at = Column(DateTime(timezone=True), default=lambda: datetime.now(timezone.utc), nullable=False)
+    processed_at = Column(DateTime(timezone=True))
+
+    # Only unprocessed events are ever scanned
+    __table_args__ = (
+        Index("ix_outbox_events_due", "available_at",
+              postgresql_where=processed_at.is_(None), sqlite_where=processed_at.is_(None)),
+    )
+
+    def __repr__(self):
+        return f"<OutboxEvent(type={self.type}, processed={self.processed_at is not None})>"
+
+
+register_stream_events(Notification, Parcel)
+register_outbox_events(OutboxEvent)
@@ -1,10 +1,16 @@
 import uuid
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+from sqlalchemy import or_
 from app.extensions import db
-from app.models import User, Parcel, StatusHistory, ParcelStatus, Notification, Address
-from app.schemas import ParcelSchema, AddressRequestSchema
-from datetime import datetime
+from app.models import User, UserRole, Parcel, StatusHistory, ParcelStatus, Address, gen_uuid
+from app.schemas import ParcelSchema, AddressRequestSchema, with_loaders
+from app.utilis.route_service import schedule_parcel_route, clear_parcel_route, address_coords
+from app.utilis.auth import CurrentUser
+from app.utilis.parcel_export import FORMATS, export_query
+from app.utilis.parcel_states import transition_error
+from app.utilis.parcel_events import parcel_event, PARCEL_STATUS_CHANGED, PARCEL_CANCELLED
+from datetime import datetime, timezone
 
 admin_bp = Blueprint("admin", __name__)
 parcel_schema = ParcelSchema()
@@ -24,6 +30,10 @@ def admin_required(fn):
     return wrapper
 
 
+def _current_admin():
+    return CurrentUser(uuid.UUID(get_jwt_identity()), UserRole.ADMIN)
+
+
 @admin_bp.route("/parcels", methods=["GET"])
 @jwt_required()
 @admin_required
@@ -32,7 +42,7 @@ def list_parcels():
     per_page = int(request.args.get("per_page", 20))
     status_filter = request.args.get("status")
 
-    query = Parcel.query.order_by(Parcel.created_at.desc())
+    query = with_loaders(Parcel.query, parcel_schema_many).order_by(Parcel.created_at.desc())
     if status_filter:
         try:
             status_enum = ParcelStatus(status_filter)
@@ -56,11 +66,34 @@ def list_parcels():
     }), 200
 
 
+@admin_bp.route("/parcels/export", methods=["GET"])
+@jwt_required()
+@admin_required
+def export_parcels():
+    # ?format=ndjson|csv, filters ?status=&created_from=&created_to=
+    fmt = request.args.get("format", "ndjson").lower()
+    if fmt not in FORMATS:
+        return jsonify({"success": False, "msg": f"format must be one of {', '.join(FORMATS)}"}), 400
+    try:
+        stmt = export_query(request.args)
+    except ValueError as e:
+        return jsonify({"success": False, "msg": str(e)}), 400
+
+    stream, mimetype = FORMATS[fmt]
+    # Rows are read while the body is sent, so the request context (and
+    # its session) has to outlive the view
+    response = Response(stream_with_context(stream(stmt)), mimetype=mimetype)
+    response.headers["Content-Disposition"] = (
+        f"attachment; filename=parcels-{datetime.utcnow():%Y%m%d-%H%M%S}.{fmt}"
+    )
+    return response
+
+
 @admin_bp.route("/parcels/<uuid:parcel_id>", methods=["GET"])
 @jwt_required()
 @admin_required
 def get_parcel(parcel_id):
-    parcel = Parcel.query.get(parcel_id)
+    parcel = with_loaders(Parcel.query, parcel_schema).get(parcel_id)
     if not parcel:
         return jsonify({"success": False, "msg": "Parcel not found"}), 404
 
@@ -85,6 +118,9 @@ def update_parcel_status(parcel_id):
         status_enum = ParcelStatus(new_status)
     except ValueError:
         return jsonify({"success": False, "msg": "Invalid status"}), 400
+    error = transition_error(parcel.status, status_enum)
+    if error:
+        return jsonify({"success": False, "msg": error}), 400
 
     parcel.status = status_enum
 
@@ -100,18 +136,115 @@ def update_parcel_status(parcel_id):
     )
     db.session.add(history)
 
-    # Notify customer
-    notification = Notification(
-        user_id=uuid.UUID(str(parcel.customer_id)),
-        message=f"Your parcel {parcel.tracking_id} is now {status_enum.value}",
-        type="PARCEL_UPDATE"
-    )
-    db.session.add(notification)
+    # Customer is notified from the outbox
+    parcel_event(PARCEL_STATUS_CHANGED, parcel, _current_admin())
 
     db.session.commit()
     return jsonify({"success": True, "msg": f"Parcel updated to {status_enum.value}"}), 200
 
 
+@admin_bp.route("/parcels/status", methods=["POST"])
+@jwt_required()
+@admin_required
+def bulk_update_parcel_status():
+    """
+    Moves a scanned batch to one status:
+    {"tracking_ids": [...], "parcel_ids": [...], "status", "notes", "location"}.
+    Parcels are loaded (and locked) in one query and checked against the
+    state machine; history rows and outbox events go out as one multi-row
+    INSERT each. Each reference gets an outcome: updated, unchanged (already
+    there), invalid_transition or not_found.
+    """
+    data = request.get_json()
+    if not isinstance(data, dict):
+        return jsonify({"success": False, "msg": "Request body must be a JSON object"}), 400
+    tracking_ids = data.get("tracking_ids") or []
+    parcel_refs = data.get("parcel_ids") or []
+    location = data.get("location") or {}
+    notes = data.get("notes") or ""
+    limit = current_app.config["BULK_PARCELS_MAX"]
+
+    if not isinstance(tracking_ids, list) or not isinstance(parcel_refs, list):
+        return jsonify({"success": False, "msg": "tracking_ids and parcel_ids must be lists"}), 400
+    if not all(isinstance(ref, str) for ref in tracking_ids + parcel_refs):
+        return jsonify({"success": False, "msg": "tracking_ids and parcel_ids must hold strings"}), 400
+    if not isinstance(location, dict) or not all(
+        isinstance(location.get(key), (int, float, type(None))) and not isinstance(location.get(key), bool)
+        for key in ("lat", "lng")
+    ):
+        return jsonify({"success": False, "msg": "location must be an object with numeric lat and lng"}), 400
+    if not isinstance(notes, str):
+        return jsonify({"success": False, "msg": "notes must be a string"}), 400
+    if not tracking_ids and not parcel_refs:
+        return jsonify({"success": False, "msg": "tracking_ids or parcel_ids is required"}), 400
+    if len(tracking_ids) + len(parcel_refs) > limit:
+        return jsonify({"success": False, "msg": f"At most {limit} parcels per request"}), 400
+    try:
+        status_enum = ParcelStatus(data.get("status"))
+    except ValueError:
+        return jsonify({"success": False, "msg": "Invalid status"}), 400
+
+    parcel_ids = {}
+    for ref in parcel_refs:
+        try:
+            parcel_ids[ref] = uuid.UUID(ref)
+        except ValueError:
+            pass  # reported as not_found
+
+    parcels = Parcel.query.filter(or_(
+        Parcel.id.in_(parcel_ids.values()), Parcel.tracking_id.in_(tracking_ids)
+    )).with_for_update().all()
+    by_id = {parcel.id: parcel for parcel in parcels}
+    by_tracking_id = {parcel.tracking_id: parcel for parcel in parcels}
+
+    actor = _current_admin()
+    now = datetime.now(timezone.utc)
+    outcomes = {}  # parcel id -> outcome, so a parcel named twice moves once
+    results = []
+    refs = [(ref, by_tracking_id.get(ref)) for ref in tracking_ids]
+    refs += [(ref, by_id.get(parcel_ids.get(ref))) for ref in parcel_refs]
+    # Lookups on the way (e.g. the actor's name) must not flush the batch early
+    with db.session.no_autoflush:
+        for ref, parcel in refs:
+            if parcel is None:
+                results.append({"ref": ref, "outcome": "not_found"})
+                continue
+            if parcel.id not in outcomes:
+                previous = parcel.status
+                error = transition_error(previous, status_enum)
+                if previous == status_enum:
+                    outcomes[parcel.id] = {"outcome": "unchanged"}
+                elif error:
+                    outcomes[parcel.id] = {"outcome": "invalid_transition", "error": error}
+                else:
+                    parcel.status = status_enum
+                    db.session.add(StatusHistory(
+                        id=gen_uuid(),
+                        parcel_id=parcel.id,
+                        status=status_enum,
+                        actor_id=actor.id,
+                        notes=notes,
+                        location_lat=location.get("lat"),
+                        location_lng=location.get("lng"),
+                        timestamp=now,
+                    ))
+                    # Customers are notified from the outbox
+                    parcel_event(PARCEL_STATUS_CHANGED, parcel, actor)
+                    outcomes[parcel.id] = {"outcome": "updated", "from": previous.value}
+            results.append({
+                "ref": ref, "parcel_id": str(parcel.id), "tracking_id": parcel.tracking_id, **outcomes[parcel.id],
+            })
+
+    db.session.commit()
+    updated = sum(1 for outcome in outcomes.values() if outcome["outcome"] == "updated")
+    return jsonify({
+        "success": True,
+        "msg": f"{updated} parcels updated to {status_enum.value}",
+        "updated": updated,
+        "results": results,
+    }), 200
+
+
 @admin_bp.route("/parcels/<uuid:parcel_id>", methods=["PATCH"])
 @jwt_required()
 @admin_required
@@ -121,6 +254,7 @@ def update_parcel_details(parcel_id):
         return jsonify({"success": False, "msg": "Parcel not found"}), 404
 
     data = request.get_json()
+    route_changed = False
 
     # Update pickup/delivery addresses
     if "pickup_address" in data:
@@ -129,8 +263,10 @@ def update_parcel_details(parcel_id):
         except Exception as e:
             return jsonify({"success": False, "errors": str(e)}), 400
         pickup_address = Address.query.get(parcel.pickup_address_id)
+        old_coords = address_coords(pickup_address)
         for key, value in address_data.items():
             setattr(pickup_address, key, value)
+        route_changed |= address_coords(pickup_address) != old_coords
         db.session.add(pickup_address)
 
     if "delivery_address" in data:
@@ -139,14 +275,21 @@ def update_parcel_details(parcel_id):
         except Exception as e:
             return jsonify({"success": False, "errors": str(e)}), 400
         delivery_address = Address.query.get(parcel.delivery_address_id)
+        old_coords = address_coords(delivery_address)
         for key, value in address_data.items():
             setattr(delivery_address, key, value)
+        route_changed |= address_coords(delivery_address) != old_coords
         db.session.add(delivery_address)
 
     if "estimated_delivery_date" in data:
         parcel.estimated_delivery_date = data["estimated_delivery_date"]
 
+    if route_changed:
+        clear_parcel_route(parcel)
     db.session.commit()
+
+    if route_changed:
+        schedule_parcel_route(parcel.id)
     return jsonify({"success": True, "msg": "Parcel details updated"}), 200
 
 
@@ -168,12 +311,7 @@ def cancel_parcel(parcel_id):
     )
     db.session.add(history)
 
-    notification = Notification(
-        user_id=uuid.UUID(str(parcel.customer_id)),
-        message=f"Your parcel {parcel.tracking_id} was cancelled by admin",
-        type="ALERT"
-    )
-    db.session.add(notification)
+    parcel_event(PARCEL_CANCELLED, parcel, _current_admin())
 
     db.session.commit()
     return jsonify({"success": True, "msg": f"Parcel {parcel.tracking_id} cancelled by admin"}), 200
@@ -1,5 +1,7 @@
 from flask import Blueprint, request, jsonify
-from app.extensions import db
+from app.extensions import db, password_hasher
+from app.utilis.auth import jwt_required_admin
+from app.utilis.hashing import HashingBusy
 from app.models import User, UserRole
 from flask_jwt_extended import (
     create_access_token,
@@ -10,6 +12,7 @@ from flask_jwt_extended import (
 )
 from email_validator import validate_email, EmailNotValidError
 from marshmallow import ValidationError
+from sqlalchemy import func
 from datetime import datetime
 import uuid
 
@@ -87,6 +90,9 @@ def signup():
         db.session.commit()
 
         return jsonify({"success": True, "msg": "User created successfully"}), 201
+    except HashingBusy:
+        db.session.rollback()
+        raise
     except Exception as e:
         db.session.rollback()
         return jsonify({"success": False, "msg": f"Error creating user: {str(e)}"}), 500
@@ -159,3 +165,16 @@ def reset_password():
     db.session.commit()
 
     return jsonify({"success": True, "msg": "Password has been reset successfully"}), 200
+
+
+@auth_bp.route("/hashing/stats", methods=["GET"])
+@jwt_required_admin
+def hashing_stats(current_user):
+    # Stored hashes per cost ("$2b$12$..." -> 12), to follow a cost migration
+    cost = func.substr(User._password_hash, 5, 2)
+    costs = db.session.query(cost, func.count()).group_by(cost).all()
+    return jsonify({
+        **password_hasher.stats(),
+        "policy": password_hasher.policy(),
+        "stored_costs": {str(int(c)): n for c, n in costs if c and c.isdigit()},
+    }), 200
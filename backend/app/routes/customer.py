@@ -1,8 +1,15 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, current_app, request, jsonify
 from app.extensions import db
-from app.models import User,UserRole, Parcel, Address, StatusHistory, ParcelStatus, Notification, NotificationType,_generate_tracking_id
-from app.schemas import ParcelSchema, ParcelCreateSchema, AddressRequestSchema, UserSchema
+from app.models import Parcel, Address, StatusHistory, ParcelStatus, _generate_tracking_id, gen_uuid
+from app.schemas import ParcelSchema, ParcelCreateSchema, AddressRequestSchema, UserSchema, with_loaders
 from app.utilis.auth import jwt_required_customer
+from app.utilis.parcel_queries import parcel_page
+from app.utilis.route_service import (
+    schedule_parcel_route, schedule_parcel_routes, clear_parcel_route, address_coords,
+)
+from app.utilis.parcel_events import (
+    parcel_event, bulk_created_event, PARCEL_CREATED, PARCEL_DESTINATION_CHANGED, PARCEL_CANCELLED
+)
 from datetime import datetime, timedelta
 from marshmallow import ValidationError
 
@@ -13,24 +20,17 @@ address_schema = AddressRequestSchema()
 user_schema = UserSchema()
 
 
-@customer_bp.route('/parcels', methods=['POST'])
-@jwt_required_customer
-def create_parcel(current_user):
-    try:
-        data = parcel_create_schema.load(request.json)
-    except ValidationError as e:
-        return jsonify({"success": False, "errors": e.messages}), 400
-
-    # Create pickup and delivery addresses
-    pickup_address = Address(**data['pickup_address'])
-    delivery_address = Address(**data['delivery_address'])
-    db.session.add(pickup_address)
-    db.session.add(delivery_address)
-    db.session.flush()  # ensure IDs are available
-
-    # Create the parcel
+def _new_parcel(current_user, data, tracking_id):
+    """
+    Adds a validated parcel with its addresses and first history entry to
+    the session. Ids are assigned here rather than by a flush, so a batch of
+    parcels goes out as one multi-row INSERT per table at commit.
+    """
+    pickup_address = Address(id=gen_uuid(), **data['pickup_address'])
+    delivery_address = Address(id=gen_uuid(), **data['delivery_address'])
     parcel = Parcel(
-        tracking_id=_generate_tracking_id(),
+        id=gen_uuid(),
+        tracking_id=tracking_id,
         customer_id=current_user.id,
         pickup_address_id=pickup_address.id,
         delivery_address_id=delivery_address.id,
@@ -38,55 +38,110 @@ def create_parcel(current_user):
         status=ParcelStatus.CREATED,
         estimated_delivery_date=datetime.utcnow().date() + timedelta(days=2)
     )
-    db.session.add(parcel)
-    db.session.flush()  # ensure parcel.id is available for status history
-
-    # Add status history
     status_history = StatusHistory(
         parcel_id=parcel.id,
         status=ParcelStatus.CREATED,
         actor_id=current_user.id,
         notes=data.get('notes') or "Parcel created by customer"
     )
-    db.session.add(status_history)
+    db.session.add_all([pickup_address, delivery_address, parcel, status_history])
+    return parcel
 
-    # Notify all admins
-    admins = User.query.filter_by(role=UserRole.ADMIN).all()
-    for admin in admins:
-        notif_admin = Notification(
-            user_id=admin.id,
-            message=f"New parcel {parcel.tracking_id} created by {current_user.name}",
-            type=NotificationType.ALERT
-        )
-        db.session.add(notif_admin)
 
-    # Notify the customer
-    notif_customer = Notification(
-        user_id=current_user.id,
-        message=f"Your parcel {parcel.tracking_id} has been created successfully.",
-        type=NotificationType.PARCEL_UPDATE
-    )
-    db.session.add(notif_customer)
+def _tracking_ids(count):
+    """`count` tracking ids unused in the batch and in the table, checked in one query per retry."""
+    ids = set()
+    while len(ids) < count:
+        candidates = set()
+        while len(candidates) < count - len(ids):
+            candidate = _generate_tracking_id()
+            if candidate not in ids:
+                candidates.add(candidate)
+        taken = {row[0] for row in db.session.query(Parcel.tracking_id).filter(Parcel.tracking_id.in_(candidates))}
+        ids |= candidates - taken
+    return list(ids)
 
-    # Commit everything
+
+@customer_bp.route('/parcels', methods=['POST'])
+@jwt_required_customer
+def create_parcel(current_user):
+    try:
+        data = parcel_create_schema.load(request.json)
+    except ValidationError as e:
+        return jsonify({"success": False, "errors": e.messages}), 400
+
+    parcel = _new_parcel(current_user, data, _tracking_ids(1)[0])
+    # Admins and the customer are notified from the outbox
+    parcel_event(PARCEL_CREATED, parcel, current_user)
     db.session.commit()
 
+    # Route metrics are filled in off the request thread
+    schedule_parcel_route(parcel.id)
+
     parcel_data = parcel_schema.dump(parcel)
     return jsonify({"success": True, "data": parcel_data, "message": "Parcel created successfully"}), 201
 
 
+@customer_bp.route('/parcels/bulk', methods=['POST'])
+@jwt_required_customer
+def create_parcels_bulk(current_user):
+    # {"parcels": [<ParcelCreateSchema>, ...]}; all or nothing
+    body = request.json
+    items = body.get("parcels") if isinstance(body, dict) else None
+    limit = current_app.config["BULK_PARCELS_MAX"]
+    if not isinstance(items, list) or not items:
+        return jsonify({"success": False, "error": "parcels must be a non-empty list"}), 400
+    if len(items) > limit:
+        return jsonify({"success": False, "error": f"At most {limit} parcels per request"}), 400
+
+    loaded, errors = [], {}
+    for index, item in enumerate(items):
+        try:
+            loaded.append(parcel_create_schema.load(item))
+        except ValidationError as e:
+            errors[index] = e.messages
+    if errors:
+        return jsonify({"success": False, "errors": errors}), 400
+
+    # Read before commit expires the rows, which would reload each one
+    created = [
+        (parcel.id, parcel.tracking_id)
+        for parcel in (
+            _new_parcel(current_user, data, tracking_id)
+            for data, tracking_id in zip(loaded, _tracking_ids(len(loaded)))
+        )
+    ]
+    # One outbox event and one admin alert for the whole batch
+    bulk_created_event([tracking_id for _, tracking_id in created], current_user.id, current_user)
+    db.session.commit()
+
+    schedule_parcel_routes(parcel_id for parcel_id, _ in created)
+
+    return jsonify({
+        "success": True,
+        "data": [{"id": str(parcel_id), "tracking_id": tracking_id} for parcel_id, tracking_id in created],
+        "message": f"{len(created)} parcels created successfully",
+    }), 201
+
+
 @customer_bp.route('/parcels', methods=['GET'])
 @jwt_required_customer
 def get_parcels(current_user):
-    parcels = Parcel.query.filter_by(customer_id=current_user.id).all()
+    # Keyset pagination: ?limit=&cursor=, filters ?status=&created_from=&created_to=
+    try:
+        parcels, next_cursor = parcel_page(
+            with_loaders(Parcel.query, parcel_schema).filter_by(customer_id=current_user.id), request.args
+        )
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
     data = parcel_schema.dump(parcels, many=True)
-    return jsonify({"success": True, "data": data}), 200
+    return jsonify({"success": True, "data": data, "next_cursor": next_cursor}), 200
 
 
 @customer_bp.route('/parcels/<uuid:parcel_id>', methods=['GET'])
 @jwt_required_customer
 def get_parcel(current_user, parcel_id):
-    parcel = Parcel.query.filter_by(id=parcel_id, customer_id=current_user.id).first()
+    parcel = with_loaders(Parcel.query, parcel_schema).filter_by(id=parcel_id, customer_id=current_user.id).first()
     if not parcel:
         return jsonify({"success": False, "error": "Parcel not found"}), 404
 
@@ -110,8 +165,12 @@ def update_parcel(current_user, parcel_id):
         return jsonify({"success": False, "errors": e.messages}), 400
 
     delivery_address = Address.query.get(parcel.delivery_address_id)
+    old_coords = address_coords(delivery_address)
     for key, value in data.items():
         setattr(delivery_address, key, value)
+    route_changed = address_coords(delivery_address) != old_coords
+    if route_changed:
+        clear_parcel_route(parcel)
 
     # Status history
     status_history = StatusHistory(
@@ -122,17 +181,14 @@ def update_parcel(current_user, parcel_id):
     )
     db.session.add(status_history)
 
-    # Notify customer
-    notif_customer = Notification(
-        user_id=current_user.id,
-        message=f"Your parcel {parcel.tracking_id} delivery address has been updated.",
-        type=NotificationType.PARCEL_UPDATE
-    )
-    db.session.add(notif_customer)
+    parcel_event(PARCEL_DESTINATION_CHANGED, parcel, current_user)
 
     # Commit all changes at once
     db.session.commit()
 
+    if route_changed:
+        schedule_parcel_route(parcel.id)
+
     # Dump the updated parcel
     parcel_data = parcel_schema.dump(parcel)
 
@@ -166,23 +222,7 @@ def cancel_parcel(current_user, parcel_id):
     )
     db.session.add(status_history)
 
-    # Notify admins
-    admins = User.query.filter_by(role=UserRole.ADMIN).all()
-    for admin in admins:
-        notif_admin = Notification(
-            user_id=admin.id,
-            message=f"Parcel {parcel.tracking_id} was cancelled by {current_user.name}",
-            type=NotificationType.ALERT
-        )
-        db.session.add(notif_admin)
-
-    # Notify customer
-    notif_customer = Notification(
-        user_id=current_user.id,
-        message=f"Your parcel {parcel.tracking_id} has been cancelled.",
-        type=NotificationType.PARCEL_UPDATE
-    )
-    db.session.add(notif_customer)
+    parcel_event(PARCEL_CANCELLED, parcel, current_user)
 
     db.session.commit()
 
@@ -191,7 +231,7 @@ def cancel_parcel(current_user, parcel_id):
 @customer_bp.route('/profile', methods=['GET'])
 @jwt_required_customer
 def get_profile(current_user):
-    user_data = user_schema.dump(current_user)
+    user_data = user_schema.dump(current_user.get())
     return jsonify({"success": True, "data": user_data}), 200
 
 
@@ -203,18 +243,19 @@ def update_profile(current_user):
     if not json_data:
         return jsonify({"success": False, "error": "No data provided"}), 400
 
+    user = current_user.get()
     # Only allow certain fields to be updated
     allowed_fields = ['name', 'email', 'phone_number', 'password']
     for field in allowed_fields:
         if field in json_data:
             if field == 'password':
-                current_user.password = json_data[field]
+                user.password = json_data[field]
             else:
-                setattr(current_user, field, json_data[field])
+                setattr(user, field, json_data[field])
 
-    current_user.updated_at = datetime.utcnow()
-    db.session.add(current_user)
+    user.updated_at = datetime.utcnow()
+    db.session.add(user)
     db.session.commit()
 
-    user_data = user_schema.dump(current_user)
+    user_data = user_schema.dump(user)
     return jsonify({"success": True, "data": user_data, "message": "Profile updated successfully"}), 200
@@ -1,14 +1,67 @@
-from flask import Blueprint, request, jsonify
-import requests
+import uuid
+from flask import Blueprint, request, jsonify, current_app
+from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity, get_jwt
+from sqlalchemy import or_
+from app.extensions import db, route_cache, upstreams, address_index, singleflight
+from app.models import Address, Parcel, UserRole
+from app.utilis.routing import RouteEstimator
+from app.utilis.route_service import (
+    fetch_route, estimate_route, first_route, route_tolerance, shape_route, geocode_key, geocode_payload,
+    locality_payload, RouteNotFound,
+)
+from app.utilis.upstream import UpstreamError, UpstreamRejectedError, CircuitOpenError
 
 maps_bp = Blueprint("maps", __name__)
 
-OSRM_URL = "http://router.project-osrm.org/route/v1/driving"
+GEOMETRY_FORMATS = ("geojson", "polyline")
+
+
+def _metrics_payload(distance_km, duration_min, source):
+    return {
+        "distance": f"{round(distance_km, 2)} km",
+        "duration": f"{round(duration_min, 2)} mins",
+        "source": source,
+    }
+
+
+def _route_metrics(o_lat, o_lng, d_lat, d_lng, cache_key, estimator, profile):
+    """
+    Distance/duration without geometry (?overview=false). Answered from
+    cached matrix cells or full routes when possible.
+    """
+    metrics_key = f"{cache_key}|metrics"
+    cached = route_cache.get(metrics_key)
+    if cached is not None:
+        return cached
+    cached = route_cache.get(cache_key)
+    if cached is not None:
+        return _metrics_payload(cached["distance_km"], cached["duration_min"], cached["source"])
+
+    try:
+        data = singleflight.do(metrics_key, lambda: upstreams.osrm.get_json(
+            f"/route/v1/driving/{o_lng},{o_lat};{d_lng},{d_lat}",
+            params={"overview": "false"},
+        ))
+    except UpstreamRejectedError:
+        raise
+    except UpstreamError as e:
+        current_app.logger.warning("Falling back to route estimate: %s", e)
+        return _metrics_payload(*estimator.estimate(o_lat, o_lng, d_lat, d_lng, profile), "estimate")
+
+    route = first_route(data)
+    payload = _metrics_payload(route["distance"] / 1000, route["duration"] / 60, "osrm")
+    route_cache.set(metrics_key, payload)
+    return payload
+
 
 @maps_bp.route("/distance", methods=["GET"])
 def get_distance():
-    origin = request.args.get("origin")      
-    destination = request.args.get("destination")  
+    origin = request.args.get("origin")
+    destination = request.args.get("destination")
+    mode = request.args.get("mode", "accurate")
+    profile = request.args.get("profile", "driving")
+    fmt = request.args.get("format", "geojson")
+    overview = request.args.get("overview", "full")
 
     if not origin or not destination:
         return jsonify({"error": "origin and destination are required"}), 400
@@ -17,34 +70,228 @@ def get_distance():
         # Parse lat/lng
         o_lat, o_lng = map(float, origin.split(","))
         d_lat, d_lng = map(float, destination.split(","))
+    except ValueError:
+        return jsonify({"error": "origin and destination must be 'lat,lng'"}), 400
+
+    try:
+        tolerance = route_tolerance(request.args.get("tolerance"), current_app.config)
+    except ValueError:
+        return jsonify({"error": "tolerance must be a number of metres"}), 400
+    if fmt not in GEOMETRY_FORMATS:
+        return jsonify({"error": f"format must be one of {', '.join(GEOMETRY_FORMATS)}"}), 400
+
+    estimator = RouteEstimator.from_config(current_app.config)
+    if profile not in estimator.speed_profiles:
+        return jsonify({"error": f"Unknown profile: {profile}"}), 400
+
+    if mode == "fast":
+        return jsonify(shape_route(estimate_route(o_lat, o_lng, d_lat, d_lng, profile), tolerance, fmt))
+
+    # Serve repeat lookups of the same (bucketed) route from cache. The full
+    # geometry lives under cache_key, each simplified/encoded variant under its own key.
+    cache_key = route_cache.key(o_lat, o_lng, d_lat, d_lng)
+    if overview == "false":
+        try:
+            return jsonify(_route_metrics(o_lat, o_lng, d_lat, d_lng, cache_key, estimator, profile))
+        except RouteNotFound as e:
+            return jsonify({"error": e.message, "details": e.details}), e.status
+        except UpstreamRejectedError as e:
+            return jsonify({"error": str(e)}), 502
+
+    variant_key = f"{cache_key}|{tolerance:g}|{fmt}"
+    cached = route_cache.get(variant_key)
+    if cached is not None:
+        return jsonify(cached)
+
+    try:
+        route = fetch_route(o_lat, o_lng, d_lat, d_lng)
+    except UpstreamRejectedError as e:
+        return jsonify({"error": str(e)}), 502
+    except UpstreamError as e:
+        # OSRM down, slow or circuit open: answer with a local estimate
+        current_app.logger.warning("Falling back to route estimate: %s", e)
+        return jsonify(shape_route(estimate_route(o_lat, o_lng, d_lat, d_lng, profile), tolerance, fmt))
+    except RouteNotFound as e:
+        return jsonify({"error": e.message, "details": e.details}), e.status
+
+    shaped = shape_route(route, tolerance, fmt)
+    route_cache.set(variant_key, shaped)
+    return jsonify(shaped)
+
+
+def _resolve_points(items, owner_id=None):
+    """
+    Turns a list of [lat, lng] pairs and/or address IDs into (lat, lng)
+    tuples, loading all referenced addresses in one query. With `owner_id`,
+    only addresses on that customer's parcels resolve; the rest look missing.
+    """
+    address_ids = set()
+    for item in items:
+        if isinstance(item, str):
+            try:
+                address_ids.add(uuid.UUID(item))
+            except ValueError:
+                raise ValueError(f"Invalid address ID: {item}")
 
-        # Request route with geometry (geojson)
-        url = f"{OSRM_URL}/{o_lng},{o_lat};{d_lng},{d_lat}?overview=full&geometries=geojson"
+    addresses = {}
+    if address_ids:
+        query = Address.query.filter(Address.id.in_(address_ids))
+        if owner_id is not None:
+            query = query.filter(
+                db.session.query(Parcel.id).filter(
+                    Parcel.customer_id == owner_id,
+                    or_(Parcel.pickup_address_id == Address.id, Parcel.delivery_address_id == Address.id),
+                ).exists()
+            )
+        rows = query.all()
+        addresses = {str(a.id): a for a in rows}
 
-        response = requests.get(url)
-        response.raise_for_status()
-        data = response.json()
+    points = []
+    for item in items:
+        if isinstance(item, str):
+            address = addresses.get(str(uuid.UUID(item)))
+            if address is None or address.lat is None or address.lng is None:
+                raise ValueError(f"Address {item} not found or has no coordinates")
+            points.append((float(address.lat), float(address.lng)))
+        elif isinstance(item, (list, tuple)) and len(item) == 2:
+            try:
+                points.append((float(item[0]), float(item[1])))
+            except (TypeError, ValueError):
+                raise ValueError(f"Invalid coordinate: {item}")
+        else:
+            raise ValueError(f"Invalid point: {item}")
+    return points
 
-        if data.get("code") != "Ok":
-            return jsonify({"error": "OSRM request failed", "details": data}), 500
 
-        route = data["routes"][0]
+def _osrm_table(origins, destinations):
+    """
+    One OSRM table call for origins x destinations. Returns (distances_km,
+    durations_min); unreachable pairs are None.
+    """
+    coords = ";".join(f"{lng},{lat}" for lat, lng in origins + destinations)
+    data = upstreams.osrm.get_json(f"/table/v1/driving/{coords}", params={
+        "sources": ";".join(str(i) for i in range(len(origins))),
+        "destinations": ";".join(str(len(origins) + i) for i in range(len(destinations))),
+        "annotations": "distance,duration",
+    })
+    if data.get("code") != "Ok":
+        raise UpstreamError(f"OSRM table failed: {data.get('code')}")
 
-        # Distance & Duration
-        distance_km = round(route["distance"] / 1000, 2)
-        duration_min = round(route["duration"] / 60, 2)
+    shape = (len(origins), len(destinations))
+    distances = [[None if m is None else m / 1000 for m in row] for row in _table(data, "distances", shape)]
+    durations = [[None if sec is None else sec / 60 for sec in row] for row in _table(data, "durations", shape)]
+    return distances, durations
 
-        # Geometry (list of [lat, lng])
-        coordinates = [[lat, lng] for lng, lat in route["geometry"]["coordinates"]]
 
+def _table(data, name, shape):
+    """One annotation of an OSRM table reply; RouteNotFound if it is missing or misshapen."""
+    rows, cols = shape
+    table = data.get(name)
+    if not isinstance(table, list) or len(table) != rows or any(
+        not isinstance(row, list) or len(row) != cols for row in table
+    ):
+        raise RouteNotFound(data)
+    return table
+
+
+@maps_bp.route("/matrix", methods=["POST"])
+def distance_matrix():
+    """
+    Distances and durations between every origin and destination. Points are
+    [lat, lng] pairs or address IDs. OSRM is called once per chunk that fits
+    its table size limit; chunks OSRM can't answer fall back to local estimates.
+    Address IDs need a token: customers may use their own parcels' addresses,
+    admins any address.
+    """
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    mode = data.get("mode", "accurate")
+    profile = data.get("profile", "driving")
+
+    if not data.get("origins") or not data.get("destinations"):
+        return jsonify({"error": "origins and destinations are required"}), 400
+    if not isinstance(data["origins"], list) or not isinstance(data["destinations"], list):
+        return jsonify({"error": "origins and destinations must be lists"}), 400
+    if len(data["origins"]) * len(data["destinations"]) > current_app.config["MATRIX_MAX_PAIRS"]:
+        return jsonify({"error": f"Matrix larger than {current_app.config['MATRIX_MAX_PAIRS']} pairs"}), 400
+
+    estimator = RouteEstimator.from_config(current_app.config)
+    if profile not in estimator.speed_profiles:
+        return jsonify({"error": f"Unknown profile: {profile}"}), 400
+
+    owner_id = None
+    if any(isinstance(item, str) for item in data["origins"] + data["destinations"]):
+        verify_jwt_in_request()
+        if get_jwt().get("role") != UserRole.ADMIN.value:
+            try:
+                owner_id = uuid.UUID(get_jwt_identity())
+            except (ValueError, TypeError):
+                return jsonify({"msg": "Invalid user ID"}), 400
+
+    try:
+        origins = _resolve_points(data["origins"], owner_id)
+        destinations = _resolve_points(data["destinations"], owner_id)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if mode == "fast":
+        distances, durations = estimator.estimate_matrix(origins, destinations, profile)
         return jsonify({
-            "distance": f"{distance_km} km",
-            "duration": f"{duration_min} mins",
-            "coordinates": coordinates,  # for frontend Map polyline
-        })
+            "distances_km": [[round(v, 2) for v in row] for row in distances],
+            "durations_min": [[round(v, 2) for v in row] for row in durations],
+            "source": "estimate",
+        }), 200
+
+    distances = [[None] * len(destinations) for _ in origins]
+    durations = [[None] * len(destinations) for _ in origins]
+    sources = set()
+
+    # OSRM caps coordinates per table request; split both sides so each chunk fits
+    chunk_size = max(1, current_app.config["MATRIX_MAX_COORDINATES"] // 2)
+    for o_start in range(0, len(origins), chunk_size):
+        o_chunk = origins[o_start:o_start + chunk_size]
+        for d_start in range(0, len(destinations), chunk_size):
+            d_chunk = destinations[d_start:d_start + chunk_size]
+            try:
+                chunk_dist, chunk_dur = _osrm_table(o_chunk, d_chunk)
+                source = "osrm"
+            except RouteNotFound as e:
+                return jsonify({"error": e.message, "details": e.details}), e.status
+            except UpstreamRejectedError as e:
+                return jsonify({"error": str(e)}), 502
+            except UpstreamError as e:
+                current_app.logger.warning("Falling back to matrix estimate: %s", e)
+                chunk_dist, chunk_dur = estimator.estimate_matrix(o_chunk, d_chunk, profile)
+                source = "estimate"
+            sources.add(source)
+
+            for i, (o_lat, o_lng) in enumerate(o_chunk):
+                for j, (d_lat, d_lng) in enumerate(d_chunk):
+                    km, mins = chunk_dist[i][j], chunk_dur[i][j]
+                    distances[o_start + i][d_start + j] = km
+                    durations[o_start + i][d_start + j] = mins
+                    if source == "osrm" and km is not None and mins is not None:
+                        # Let later ?overview=false single-pair lookups hit the cache
+                        key = route_cache.key(o_lat, o_lng, d_lat, d_lng)
+                        route_cache.set(f"{key}|metrics", _metrics_payload(km, mins, "osrm"))
+
+    return jsonify({
+        "distances_km": [[None if v is None else round(v, 2) for v in row] for row in distances],
+        "durations_min": [[None if v is None else round(v, 2) for v in row] for row in durations],
+        "source": sources.pop() if len(sources) == 1 else "mixed",
+    }), 200
+
+
+@maps_bp.route("/cache/stats", methods=["GET"])
+def cache_stats():
+    return jsonify(route_cache.stats()), 200
+
+
+@maps_bp.route("/upstream/stats", methods=["GET"])
+def upstream_stats():
+    return jsonify({"upstreams": upstreams.stats(), "singleflight": singleflight.stats()}), 200
 
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
 
 @maps_bp.route("/reverse-geocode", methods=["GET"])
 def reverse_geocode():
@@ -54,22 +301,33 @@ def reverse_geocode():
         return jsonify({"error": "lat and lng are required"}), 400
 
     try:
-        url = "https://nominatim.openstreetmap.org/reverse"
-        params = {
-            "lat": lat,
-            "lon": lng,
-            "format": "json",
-        }
-        response = requests.get(url, params=params, headers={"User-Agent": "DeliverooApp"})
-        response.raise_for_status()
-        data = response.json()
-        address = data.get("address", {})
+        lat_f, lng_f = float(lat), float(lng)
+    except ValueError:
+        return jsonify({"error": "lat and lng must be numbers"}), 400
 
-        return jsonify({
-            "street": address.get("road") or "",
-            "city": address.get("city") or address.get("town") or address.get("village") or "",
-            "country": address.get("country") or "",
-        })
-    except Exception as e:
-        return jsonify({"error": str(e)}), 500
+    # Known addresses near the point settle city and country
+    local = address_index.lookup(lat_f, lng_f)
+
+    cache_key = geocode_key(lat_f, lng_f)
+    payload = route_cache.get(cache_key)
+    if payload is None:
+        # Without Nominatim a known locality is still answered, streetless
+        try:
+            data = singleflight.do(cache_key, lambda: upstreams.nominatim.get_json("/reverse", params={
+                "lat": lat,
+                "lon": lng,
+                "format": "json",
+            }))
+        except CircuitOpenError as e:
+            if local is None:
+                return jsonify({"error": "Geocoding service unavailable", "details": str(e)}), 503
+        except UpstreamError as e:
+            if local is None:
+                return jsonify({"error": str(e)}), 502
+        else:
+            payload = geocode_payload(data)
+            route_cache.set(cache_key, payload, ttl=current_app.config["GEOCODE_CACHE_TTL"])
 
+    if local is not None:
+        payload = locality_payload(local, payload)
+    return jsonify(payload)
@@ -0,0 +1,250 @@
+import asyncio
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from starlette.middleware.wsgi import WSGIMiddleware
+from app.extensions import route_cache, address_index
+from app.utilis.routing import RouteEstimator
+from app.utilis.route_service import (
+    fetch_route_async, estimate_route, route_tolerance, shape_route, geocode_key, geocode_payload,
+    locality_payload, RouteNotFound,
+)
+from app.utilis.singleflight import AsyncSingleFlight
+from app.utilis.upstream import (
+    AsyncUpstreamClient, CircuitBreaker, UpstreamError, UpstreamRejectedError, CircuitOpenError
+)
+
+GEOMETRY_FORMATS = ("geojson", "polyline")
+
+
+def _error(message, status=400, **extra):
+    return JSONResponse({"error": message, **extra}, status_code=status)
+
+
+def _parse_point(value):
+    lat, lng = map(float, value.split(","))
+    return lat, lng
+
+
+class AsyncMapsState:
+    """Per-process async clients; created lazily inside the running event loop."""
+
+    def __init__(self, config):
+        self.config = config
+        self.osrm = None
+        self.nominatim = None
+        self.flight = AsyncSingleFlight()
+
+    def _client(self, name, base_url, headers=None):
+        return AsyncUpstreamClient(
+            name,
+            base_url,
+            connect_timeout=self.config["UPSTREAM_CONNECT_TIMEOUT"],
+            read_timeout=self.config["UPSTREAM_READ_TIMEOUT"],
+            retries=self.config["UPSTREAM_RETRIES"],
+            backoff=self.config["UPSTREAM_BACKOFF"],
+            pool_size=self.config["ASYNC_UPSTREAM_POOL_SIZE"],
+            headers=headers,
+            breaker=CircuitBreaker(
+                failure_threshold=self.config["CIRCUIT_FAILURE_THRESHOLD"],
+                reset_timeout=self.config["CIRCUIT_RESET_TIMEOUT"],
+            ),
+        )
+
+    def clients(self):
+        if self.osrm is None:
+            self.osrm = self._client("osrm", self.config["OSRM_URL"])
+            self.nominatim = self._client("nominatim", self.config["NOMINATIM_URL"],
+                                          headers={"User-Agent": "DeliverooApp"})
+        return self.osrm, self.nominatim
+
+    async def aclose(self):
+        if self.osrm is not None:
+            await self.osrm.aclose()
+            await self.nominatim.aclose()
+            self.osrm = self.nominatim = None
+
+
+async def _route(state, o_lat, o_lng, d_lat, d_lng, profile):
+    osrm, _ = state.clients()
+    try:
+        return await fetch_route_async(osrm, state.flight, o_lat, o_lng, d_lat, d_lng)
+    except UpstreamRejectedError:
+        raise
+    except UpstreamError:
+        # OSRM down, slow or circuit open: answer with a local estimate
+        return estimate_route(o_lat, o_lng, d_lat, d_lng, profile)
+
+
+async def _reverse_geocode(state, lat, lng):
+    # The first lookup builds the index from the database
+    local = await asyncio.to_thread(address_index.lookup, lat, lng)
+
+    cache_key = geocode_key(lat, lng)
+    payload = await route_cache.get_async(cache_key)
+    if payload is None:
+        _, nominatim = state.clients()
+        try:
+            data = await state.flight.do(cache_key, lambda: nominatim.get_json("/reverse", params={
+                "lat": lat,
+                "lon": lng,
+                "format": "json",
+            }))
+        except UpstreamError:
+            if local is None:
+                raise
+        else:
+            payload = geocode_payload(data)
+            await route_cache.set_async(cache_key, payload, ttl=state.config["GEOCODE_CACHE_TTL"])
+
+    if local is not None:
+        payload = locality_payload(local, payload)
+    return payload
+
+
+def create_maps_api(flask_app):
+    """
+    asyncio implementation of maps_bp as a FastAPI app. It shares the Flask
+    app's config, route cache and address index (via its app context) but
+    talks to OSRM/Nominatim through httpx, so one worker can hold hundreds of
+    upstream calls in flight.
+    """
+    state = AsyncMapsState(flask_app.config)
+
+    @asynccontextmanager
+    async def lifespan(api):
+        yield
+        await state.aclose()
+
+    api = FastAPI(title="Deliveroo maps", docs_url=None, redoc_url=None, openapi_url=None, lifespan=lifespan)
+    api.state.maps = state
+    api.add_middleware(
+        CORSMiddleware,
+        allow_origins=flask_app.config["CORS_ORIGINS"],
+        allow_credentials=True,
+        allow_methods=["GET", "OPTIONS"],
+        allow_headers=["Content-Type", "Authorization"],
+    )
+
+    @api.get("/api/maps/distance")
+    async def get_distance(request: Request):
+        args = request.query_params
+        origin, destination = args.get("origin"), args.get("destination")
+        profile = args.get("profile", "driving")
+        fmt = args.get("format", "geojson")
+        if not origin or not destination:
+            return _error("origin and destination are required")
+        try:
+            o_lat, o_lng = _parse_point(origin)
+            d_lat, d_lng = _parse_point(destination)
+        except ValueError:
+            return _error("origin and destination must be 'lat,lng'")
+        try:
+            tolerance = route_tolerance(args.get("tolerance"), flask_app.config)
+        except ValueError:
+            return _error("tolerance must be a number of metres")
+        if fmt not in GEOMETRY_FORMATS:
+            return _error(f"format must be one of {', '.join(GEOMETRY_FORMATS)}")
+        if profile not in RouteEstimator.from_config(flask_app.config).speed_profiles:
+            return _error(f"Unknown profile: {profile}")
+
+        with flask_app.app_context():
+            if args.get("mode") == "fast":
+                return shape_route(estimate_route(o_lat, o_lng, d_lat, d_lng, profile), tolerance, fmt)
+            try:
+                route = await _route(state, o_lat, o_lng, d_lat, d_lng, profile)
+            except RouteNotFound as e:
+                return _error(e.message, e.status, details=e.details)
+            except UpstreamRejectedError as e:
+                return _error(str(e), 502)
+            # Douglas-Peucker over a full geometry is CPU work; keep it off the loop
+            shaped = await asyncio.to_thread(shape_route, route, tolerance, fmt)
+            if args.get("overview") == "false":
+                shaped.pop("coordinates", None)
+                shaped.pop("polyline", None)
+            return shaped
+
+    @api.get("/api/maps/reverse-geocode")
+    async def reverse_geocode(request: Request):
+        lat, lng = request.query_params.get("lat"), request.query_params.get("lng")
+        if not lat or not lng:
+            return _error("lat and lng are required")
+        try:
+            lat_f, lng_f = float(lat), float(lng)
+        except ValueError:
+            return _error("lat and lng must be numbers")
+
+        with flask_app.app_context():
+            try:
+                return await _reverse_geocode(state, lat_f, lng_f)
+            except CircuitOpenError as e:
+                return _error("Geocoding service unavailable", 503, details=str(e))
+            except UpstreamError as e:
+                return _error(str(e), 502)
+
+    @api.get("/api/maps/trip")
+    async def trip_summary(request: Request):
+        """
+        Route plus reverse geocode of both ends, fetched concurrently. Ends
+        that cannot be geocoded come back as null rather than failing the trip.
+        """
+        args = request.query_params
+        origin, destination = args.get("origin"), args.get("destination")
+        profile = args.get("profile", "driving")
+        if not origin or not destination:
+            return _error("origin and destination are required")
+        try:
+            o_lat, o_lng = _parse_point(origin)
+            d_lat, d_lng = _parse_point(destination)
+        except ValueError:
+            return _error("origin and destination must be 'lat,lng'")
+        if profile not in RouteEstimator.from_config(flask_app.config).speed_profiles:
+            return _error(f"Unknown profile: {profile}")
+
+        with flask_app.app_context():
+            route, pickup, dropoff = await asyncio.gather(
+                _route(state, o_lat, o_lng, d_lat, d_lng, profile),
+                _reverse_geocode(state, o_lat, o_lng),
+                _reverse_geocode(state, d_lat, d_lng),
+                return_exceptions=True,
+            )
+            if isinstance(route, RouteNotFound):
+                return _error(route.message, route.status, details=route.details)
+            if isinstance(route, UpstreamRejectedError):
+                return _error(str(route), 502)
+            if isinstance(route, Exception):
+                raise route
+            tolerance = flask_app.config["ROUTE_SIMPLIFY_TOLERANCE_M"]
+            return {
+                "route": await asyncio.to_thread(shape_route, route, tolerance, args.get("format", "geojson")),
+                "origin": None if isinstance(pickup, Exception) else pickup,
+                "destination": None if isinstance(dropoff, Exception) else dropoff,
+            }
+
+    @api.get("/api/maps/async/stats")
+    async def upstream_stats():
+        osrm, nominatim = state.clients()
+        return {"upstreams": [osrm.stats(), nominatim.stats()], "singleflight": state.flight.stats()}
+
+    return api
+
+
+def create_asgi_app(flask_app):
+    """
+    ASGI application: the async maps endpoints are served by the FastAPI
+    app, every other path (and any maps path it does not implement, such
+    as /matrix) falls through to the regular Flask app.
+    """
+    maps_api = create_maps_api(flask_app)
+    flask_asgi = WSGIMiddleware(flask_app)
+    async_paths = {route.path for route in maps_api.routes}
+
+    async def application(scope, receive, send):
+        if scope["type"] == "lifespan" or scope.get("path") in async_paths:
+            await maps_api(scope, receive, send)
+        else:
+            await flask_asgi(scope, receive, send)
+
+    application.maps_api = maps_api
+    return application
@@ -1,7 +1,10 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from app.extensions import db
-from app.models import Notification, User
+from app.extensions import db, events
+from app.models import User, NotificationType
+from app.utilis import notification_service
+from app.utilis.events import user_channels
+from app.utilis.pagination import decode_cursor, page_limit
 import uuid
 
 notifications_bp = Blueprint("notifications", __name__)
@@ -20,22 +23,103 @@ def get_notifications():
     if not user:
         return jsonify({"error": "User not found"}), 404
 
-    notifications = (
-        Notification.query.filter_by(user_id=user_id)
-        .order_by(Notification.created_at.desc())
-        .all()
-    )
+    # Keyset pagination: ?limit=&before=<cursor> for older items,
+    # ?after=<cursor> for newer ones; filters ?type=&is_read=
+    args = request.args
+    try:
+        limit = page_limit(args, "NOTIFICATIONS_PAGE_SIZE", "NOTIFICATIONS_MAX_PAGE_SIZE")
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if args.get("before") and args.get("after"):
+        return jsonify({"error": "Use either before or after, not both"}), 400
+    try:
+        before = decode_cursor(args["before"]) if args.get("before") else None
+        after = decode_cursor(args["after"]) if args.get("after") else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        type_filter = NotificationType(args["type"].upper()) if args.get("type") else None
+    except ValueError:
+        return jsonify({"error": "Invalid notification type"}), 400
+    is_read = args.get("is_read")
+    if is_read is not None:
+        if is_read.lower() not in ("true", "false"):
+            return jsonify({"error": "is_read must be true or false"}), 400
+        is_read = is_read.lower() == "true"
+
+    items, more = notification_service.feed(user, before=before, after=after, limit=limit,
+                                            type=type_filter, is_read=is_read)
+
+    # The body stays a plain list; cursors for the neighbouring pages go in
+    # headers, only when that page has items. In the paging direction `more`
+    # says so; behind us there is at least the item the cursor points at.
+    response = jsonify(items)
+    if items:
+        older = more if after is None else True
+        newer = more if after is not None else before is not None
+        if older:
+            response.headers["X-Next-Cursor"] = items[-1]["cursor"]
+        if newer:
+            response.headers["X-Prev-Cursor"] = items[0]["cursor"]
+    return response, 200
+
+
+@notifications_bp.get("/unread-count")
+@jwt_required()
+def get_unread_count():
+    user_id_str = get_jwt_identity()
+    try:
+        user_id = uuid.UUID(user_id_str)
+    except ValueError:
+        return jsonify({"error": "Invalid user ID"}), 400
 
-    return jsonify([
-        {
-            "id": str(n.id),
-            "message": n.message,
-            "type": n.type.value,
-            "is_read": n.is_read,
-            "created_at": n.created_at.isoformat(),
-        }
-        for n in notifications
-    ]), 200
+    user = User.query.get(user_id)
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+
+    unread = notification_service.unread_count(user)
+    # Persists the counter the first time it is reconciled
+    db.session.commit()
+
+    return jsonify({"unread": unread}), 200
+
+
+@notifications_bp.get("/stream")
+@jwt_required(locations=["headers", "query_string"])  # EventSource can't send headers
+def stream_notifications():
+    # Flask answers HEAD with the GET view; a stream has no headers-only form
+    if request.method == "HEAD":
+        return jsonify({"error": "Method not allowed"}), 405, {"Allow": "GET"}
+
+    user_id_str = get_jwt_identity()
+    try:
+        user_id = uuid.UUID(user_id_str)
+    except ValueError:
+        return jsonify({"error": "Invalid user ID"}), 400
+
+    user = User.query.get(user_id)
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+
+    # Browsers resend the last id they saw when reconnecting
+    last_event_id = request.headers.get("Last-Event-ID") or request.args.get("last_event_id")
+    if last_event_id is not None:
+        try:
+            last_event_id = int(last_event_id)
+        except ValueError:
+            return jsonify({"error": "Invalid Last-Event-ID"}), 400
+
+    subscription = events.subscribe(user_channels(user))
+    # Not wrapped in stream_with_context: the stream never touches the
+    # database, so the session is released as soon as this view returns
+    response = Response(
+        events.stream(subscription, last_event_id),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    # The stream's own cleanup never runs if its body is never iterated
+    response.call_on_close(subscription.close)
+    return response
 
 
 @notifications_bp.patch("/mark/<uuid:notification_id>/read")
@@ -47,11 +131,10 @@ def mark_notification_read(notification_id):
     except ValueError:
         return jsonify({"error": "Invalid user ID"}), 400
 
-    notif = Notification.query.filter_by(id=notification_id, user_id=user_id).first()
-    if not notif:
+    user = User.query.get(user_id)
+    if not user or not notification_service.mark_read(user, notification_id):
         return jsonify({"error": "Notification not found"}), 404
 
-    notif.is_read = True
     db.session.commit()
 
     return jsonify({"message": "Notification marked as read"}), 200
@@ -66,7 +149,11 @@ def mark_all_notifications_read():
     except ValueError:
         return jsonify({"error": "Invalid user ID"}), 400
 
-    updated = Notification.query.filter_by(user_id=user_id, is_read=False).update({"is_read": True})
+    user = User.query.get(user_id)
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+
+    updated = notification_service.mark_all_read(user)
     db.session.commit()
 
     return jsonify({"message": f"{updated} notifications marked as read"}), 200
@@ -81,11 +168,10 @@ def delete_notification(notification_id):
     except ValueError:
         return jsonify({"error": "Invalid user ID"}), 400
 
-    notif = Notification.query.filter_by(id=notification_id, user_id=user_id).first()
-    if not notif:
+    user = User.query.get(user_id)
+    if not user or not notification_service.delete(user, notification_id):
         return jsonify({"error": "Notification not found"}), 404
 
-    db.session.delete(notif)
     db.session.commit()
 
     return jsonify({"message": "Notification deleted"}), 200
@@ -100,7 +186,11 @@ def delete_all_notifications():
     except ValueError:
         return jsonify({"error": "Invalid user ID"}), 400
 
-    deleted_count = Notification.query.filter_by(user_id=user_id).delete()
+    user = User.query.get(user_id)
+    if not user:
+        return jsonify({"error": "User not found"}), 404
+
+    deleted_count = notification_service.delete_all(user)
     db.session.commit()
 
     return jsonify({"message": f"{deleted_count} notifications deleted"}), 200
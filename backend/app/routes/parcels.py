@@ -1,6 +1,13 @@
 from flask import Blueprint, request, jsonify
 from app.extensions import db
-from app.models import Parcel, ParcelStatus, Notification, NotificationType, User,UserRole
+from app.models import Parcel, ParcelStatus, User,UserRole
+from app.utilis.parcel_events import (
+    parcel_event, PARCEL_CREATED, PARCEL_DESTINATION_CHANGED, PARCEL_STATUS_CHANGED, PARCEL_CANCELLED
+)
+from app.schemas import parcel_route
+from app.utilis.parcel_queries import parcel_page
+from app.utilis.parcel_states import transition_error
+from app.utilis.route_service import schedule_parcel_route, clear_parcel_route
 import uuid
 from flask_jwt_extended import jwt_required, get_jwt_identity
 
@@ -19,6 +26,7 @@ def parcel_to_dict(parcel: Parcel):
         "estimated_delivery_date": str(parcel.estimated_delivery_date) if parcel.estimated_delivery_date else None,
         "created_at": parcel.created_at.isoformat(),
         "updated_at": parcel.updated_at.isoformat(),
+        "route": parcel_route(parcel),
     }
 
 
@@ -56,24 +64,10 @@ def create_parcel():
         db.session.add(new_parcel)
 
 
-        # Notify admins of new parcel
-        admins = User.query.filter(User.role == UserRole.ADMIN).all()
-        for admin in admins:
-            notif = Notification(
-                user_id=admin.id,
-                message=f"New parcel {new_parcel.tracking_id} created by customer {new_parcel.customer_id}",
-                type=NotificationType.ALERT,
-            )
-            db.session.add(notif)
-        # Notify customer
-        notif_customer = Notification(
-            user_id=new_parcel.customer_id,
-            message=f"Your parcel {new_parcel.tracking_id} has been created successfully.",
-            type=NotificationType.PARCEL_UPDATE,
-        )
-        db.session.add(notif_customer)
+        parcel_event(PARCEL_CREATED, new_parcel, user)
         db.session.commit()
 
+        schedule_parcel_route(new_parcel.id)
         return jsonify(parcel_to_dict(new_parcel)), 201
     except Exception as e:
         db.session.rollback()
@@ -112,25 +106,12 @@ def update_destination(parcel_id):
 
     try:
         parcel.delivery_address_id = new_uuid
+        clear_parcel_route(parcel)
 
-        # Notify customer
-        notif_customer = Notification(
-            user_id=parcel.customer_id,
-            message=f"Your parcel {parcel.tracking_id} destination has been updated.",
-            type=NotificationType.PARCEL_UPDATE
-        )
-        db.session.add(notif_customer)
-
-        admins = User.query.filter(User.role == UserRole.ADMIN).all()
-        for admin in admins:
-            notif_admin = Notification(
-                user_id=admin.id,
-                message=f"Parcel {parcel.tracking_id} destination updated by customer {parcel.customer_id}",
-                type=NotificationType.ALERT
-            )
-            db.session.add(notif_admin)
+        parcel_event(PARCEL_DESTINATION_CHANGED, parcel, user)
 
         db.session.commit()
+        schedule_parcel_route(parcel.id)
         return jsonify(parcel_to_dict(parcel)), 200
     except Exception as e:
         db.session.rollback()
@@ -157,23 +138,7 @@ def cancel_parcel(parcel_id):
     try:
         parcel.status = ParcelStatus.CANCELLED
 
-        # Notify admins of cancellation
-        admins = User.query.filter(User.role == UserRole.ADMIN).all()
-        for admin in admins:
-            notif = Notification(
-                user_id=admin.id,
-                message=f"Parcel {parcel.tracking_id} was cancelled by customer {parcel.customer_id}",
-                type=NotificationType.ALERT
-            )
-            db.session.add(notif)
-
-        # Notify customer
-        customer_notif = Notification(
-                    user_id=parcel.customer_id,
-                    message=f"Your parcel {parcel.tracking_id} has been cancelled.",
-                    type=NotificationType.PARCEL_UPDATE,
-                )
-        db.session.add(customer_notif)
+        parcel_event(PARCEL_CANCELLED, parcel, user)
         db.session.commit()
 
         return jsonify(parcel_to_dict(parcel)), 200
@@ -208,30 +173,14 @@ def update_parcel_status(parcel_id):
     except KeyError:
         return jsonify({"error": "Invalid status"}), 400
 
-    valid_transitions = {
-        ParcelStatus.CREATED: [ParcelStatus.PICKED_UP, ParcelStatus.CANCELLED],
-        ParcelStatus.PICKED_UP: [ParcelStatus.IN_TRANSIT, ParcelStatus.CANCELLED],
-        ParcelStatus.IN_TRANSIT: [ParcelStatus.OUT_FOR_DELIVERY],
-        ParcelStatus.OUT_FOR_DELIVERY: [ParcelStatus.DELIVERED],
-        ParcelStatus.DELIVERED: [],
-        ParcelStatus.CANCELLED: []
-    }
-
-    if new_status_enum not in valid_transitions[parcel.status]:
-        return jsonify({
-            "error": f"Cannot change status from {parcel.status.value} to {new_status_enum.value}"
-        }), 400
+    error = transition_error(parcel.status, new_status_enum)
+    if error:
+        return jsonify({"error": error}), 400
 
     try:
         parcel.status = new_status_enum
 
-        # Notify customer of status change
-        notif = Notification(
-            user_id=parcel.customer_id,
-            message=f"Your parcel {parcel.tracking_id} status updated to {parcel.status.value}",
-            type=NotificationType.PARCEL_UPDATE,
-        )
-        db.session.add(notif)
+        parcel_event(PARCEL_STATUS_CHANGED, parcel, user)
         db.session.commit()
 
         return jsonify(parcel_to_dict(parcel)), 200
@@ -259,7 +208,7 @@ def get_parcel(parcel_id):
 @jwt_required()
 def list_parcels():
     user_id = get_jwt_identity()
-    user = User.query.get(user_id)
+    user = User.query.get(uuid.UUID(user_id))
 
     if not user:
         return jsonify({"error":"user not found"}),404
@@ -268,5 +217,13 @@ def list_parcels():
     if user.role == UserRole.CUSTOMER:
         query = query.filter_by(customer_id=user.id)
 
-    parcels =query.all()
-    return jsonify([parcel_to_dict(p) for p in parcels]), 200
+    # Keyset pagination: ?limit=&cursor=, filters ?status=&created_from=&created_to=.
+    # The body stays a plain list; the next page's cursor goes in a header
+    try:
+        parcels, next_cursor = parcel_page(query, request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    response = jsonify([parcel_to_dict(p) for p in parcels])
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return response, 200
@@ -1,6 +1,7 @@
 from marshmallow import Schema, fields, validate, post_dump
 from app.models import Parcel, Address, StatusHistory, ParcelStatus,User
 from marshmallow_sqlalchemy import SQLAlchemyAutoSchema
+from sqlalchemy.orm import joinedload, selectinload
 
 
 class AddressSchema(Schema):
@@ -32,6 +33,19 @@ class StatusHistorySchema(Schema):
         return None
 
 
+def parcel_route(parcel):
+    """Precomputed pickup -> delivery route, or None until it has been computed."""
+    if parcel.route_computed_at is None:
+        return None
+    return {
+        "distance_km": parcel.route_distance_km,
+        "duration_min": parcel.route_duration_min,
+        "polyline": parcel.route_polyline,
+        "computed_at": parcel.route_computed_at.isoformat(),
+        "source": parcel.route_source,
+    }
+
+
 class ParcelSchema(Schema):
     id = fields.UUID()
     tracking_id = fields.Str()
@@ -43,10 +57,14 @@ class ParcelSchema(Schema):
     pickup_address = fields.Nested(AddressSchema)
     delivery_address = fields.Nested(AddressSchema)
     status_history = fields.List(fields.Nested(StatusHistorySchema))
+    route = fields.Method("get_route")
 
     def get_status(self, obj):
         return obj.status.name if isinstance(obj.status, ParcelStatus) else str(obj.status)
 
+    def get_route(self, obj):
+        return parcel_route(obj)
+
 
 class AddressRequestSchema(Schema):
     street = fields.Str(required=True)
@@ -76,3 +94,21 @@ class UserSchema(SQLAlchemyAutoSchema):
         except AttributeError:
             return obj.role
 
+
+
+# Relationships each schema's dump walks, loaded with the query that fetches
+# the rows: a page of parcels costs three queries (parcels + addresses,
+# histories, their actors) instead of 3 + H per parcel
+LOADER_PROFILES = {
+    ParcelSchema: (
+        joinedload(Parcel.pickup_address),
+        joinedload(Parcel.delivery_address),
+        selectinload(Parcel.status_history).joinedload(StatusHistory.user),
+    ),
+}
+
+
+def with_loaders(query, schema):
+    """Applies the loader profile of `schema` (a class or instance) to a query or select()."""
+    schema_class = schema if isinstance(schema, type) else type(schema)
+    return query.options(*LOADER_PROFILES.get(schema_class, ()))
@@ -2,9 +2,17 @@
 import pytest
 import uuid
 import random
+import json
+import socket
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
 from datetime import datetime, timedelta
+from contextlib import contextmanager
+from sqlalchemy import event
 from app import create_app
-from app.extensions import db as _db
+from app.extensions import db as _db, upstreams, outbox as outbox_worker
 from app.models import User, UserRole, Parcel, ParcelStatus, Address
 from flask_jwt_extended import create_access_token
 
@@ -35,6 +43,34 @@ def client(app):
         yield client
 
 
+@pytest.fixture
+def statement_recorder(db):
+    """
+    Context manager collecting the SQL statements sent inside it:
+    `with statement_recorder() as statements: ...`
+    """
+    @contextmanager
+    def recording():
+        statements = []
+
+        def record(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(db.engine, "before_cursor_execute", record)
+        try:
+            yield statements
+        finally:
+            event.remove(db.engine, "before_cursor_execute", record)
+    return recording
+
+
+@pytest.fixture
+def async_outbox(app, monkeypatch):
+    """Outbox in production mode, without starting the worker thread."""
+    monkeypatch.setitem(app.config, "OUTBOX_ASYNC", True)
+    monkeypatch.setattr(type(outbox_worker), "wake", lambda self: None)
+
+
 
 @pytest.fixture
 def customer_user(db):
@@ -124,3 +160,94 @@ def create_parcel(db, customer_user, create_address):
     db.session.add(parcel)
     db.session.commit()
     return parcel
+
+
+# -------------------------
+# STUB UPSTREAM (OSRM / NOMINATIM)
+# -------------------------
+class StubUpstream:
+    """Local HTTP server answering OSRM route and Nominatim reverse calls."""
+
+    def __init__(self):
+        self.calls = []
+        self.status = 200
+        self.delay = 0
+        self.route = {
+            "code": "Ok",
+            "routes": [{
+                "distance": 12345.0,
+                "duration": 1800.0,
+                "geometry": {"coordinates": [[36.8219, -1.2921], [36.9, -1.3], [37.0, -1.35]]},
+            }],
+        }
+        self.reverse = {"address": {"road": "Moi Avenue", "city": "Nairobi", "country": "Kenya"}}
+
+    def response_for(self, path):
+        if path.startswith("/reverse"):
+            return self.reverse
+        if path.startswith("/table"):
+            return self.table(path)
+        return self.route
+
+    def table(self, path):
+        query = parse_qs(urlparse(path).query)
+        sources = query["sources"][0].split(";")
+        destinations = query["destinations"][0].split(";")
+        return {
+            "code": "Ok",
+            "distances": [[1000.0 * (i + 1) for i in range(len(destinations))] for _ in sources],
+            "durations": [[60.0 * (i + 1) for i in range(len(destinations))] for _ in sources],
+        }
+
+
+def _make_handler(stub):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            # Headers and body go out in separate writes; don't let Nagle delay the body
+            self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        def do_GET(self):
+            stub.calls.append(self.path)
+            if stub.delay:
+                time.sleep(stub.delay)
+            body = json.dumps(stub.response_for(self.path)).encode()
+            self.send_response(stub.status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+class _StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # The default listen() backlog of 5 stalls bursts of concurrent connects
+    request_queue_size = 128
+
+
+@pytest.fixture
+def stub_upstream(app):
+    stub = StubUpstream()
+    server = _StubServer(("127.0.0.1", 0), _make_handler(stub))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    original = {key: app.config[key] for key in ("OSRM_URL", "NOMINATIM_URL")}
+    app.config.update(OSRM_URL=url, NOMINATIM_URL=url)
+    upstreams.init_app(app)
+    stub.url = url
+
+    yield stub
+
+    app.config.update(original)
+    upstreams.init_app(app)
+    server.shutdown()
+    server.server_close()
@@ -1,8 +1,10 @@
 # tests/test_admin.py
+import csv
+import io
 import json
 import uuid
 from datetime import datetime, timedelta
-from app.models import Parcel, ParcelStatus, StatusHistory, Notification, User
+from app.models import Address, Parcel, ParcelStatus, StatusHistory, Notification, User
 
 def test_admin_list_parcels(client, admin_token, create_parcel):
     headers = {"Authorization": f"Bearer {admin_token}"}
@@ -90,3 +92,90 @@ def test_admin_stats(client, admin_token):
     assert "total_parcels" in data
     assert "created" in data
     assert "delivered" in data
+
+
+def test_admin_export_streams_flat_rows(app, client, db, admin_token, customer_user, monkeypatch):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    monkeypatch.setitem(app.config, "EXPORT_BATCH_SIZE", 2)
+    pickup = Address(street="Moi Ave", city="Nairobi", country="Kenya", lat=-1.2921, lng=36.8219)
+    delivery = Address(street="Airport Rd", city="Nairobi", country="Kenya")
+    parcels = [
+        Parcel(customer_id=customer_user.id, pickup_address=pickup, delivery_address=delivery, weight_kg=i + 1.0)
+        for i in range(3)
+    ]
+    parcels[0].status = ParcelStatus.DELIVERED
+    parcels[0].description = '=HYPERLINK("http://example.com","open")'
+    db.session.add_all(parcels)
+    db.session.commit()
+    ours = {p.tracking_id for p in parcels}
+
+    response = client.get("api/admin/parcels/export", headers=headers)
+    assert response.status_code == 200
+    assert response.mimetype == "application/x-ndjson"
+    assert response.is_streamed
+    rows = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+    mine = [row for row in rows if row["tracking_id"] in ours]
+    assert len(mine) == 3
+    assert mine[0]["customer_email"] == customer_user.email
+    assert mine[0]["pickup_street"] == "Moi Ave" and mine[0]["pickup_lat"] == -1.2921
+    assert mine[0]["delivery_street"] == "Airport Rd" and mine[0]["delivery_lat"] is None
+    assert mine[0]["description"] == parcels[0].description
+
+    response = client.get("api/admin/parcels/export?format=csv&status=DELIVERED", headers=headers)
+    assert response.mimetype == "text/csv"
+    rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+    assert {row["status"] for row in rows} == {"DELIVERED"}
+    [row] = [row for row in rows if row["tracking_id"] == parcels[0].tracking_id]
+    assert "delivery_postal_code" in row
+    # Formula-like text is neutralised; negative coordinates are numbers and stay as they are
+    assert row["description"] == "'" + parcels[0].description
+    assert row["pickup_lat"] == "-1.2921"
+
+    assert client.get("api/admin/parcels/export?format=xml", headers=headers).status_code == 400
+    assert client.get("api/admin/parcels/export?created_from=yesterday", headers=headers).status_code == 400
+
+
+def test_admin_bulk_status_transition(client, db, admin_token, customer_user, async_outbox, statement_recorder):
+    headers = {"Authorization": f"Bearer {admin_token}"}
+    address = Address(street="Moi Ave", city="Nairobi", country="Kenya")
+    parcels = [
+        Parcel(customer_id=customer_user.id, pickup_address=address, delivery_address=address,
+               weight_kg=1.0, status=status)
+        for status in (ParcelStatus.CREATED, ParcelStatus.PICKED_UP, ParcelStatus.PICKED_UP)
+    ]
+    db.session.add_all(parcels)
+    db.session.commit()
+    tracking_ids = [p.tracking_id for p in parcels]
+
+    payload = {
+        "tracking_ids": tracking_ids + ["PD-NOPE"],
+        "parcel_ids": [str(parcels[1].id), "not-a-uuid"],
+        "status": "IN_TRANSIT",
+        "location": {"lat": 1.5, "lng": 36.5},
+    }
+    for bad in ([payload], {**payload, "location": "Nairobi"}, {**payload, "location": {"lat": "north"}},
+                {**payload, "tracking_ids": [["PD-1"]]}, {**payload, "parcel_ids": [{"id": 1}]}):
+        assert client.post("api/admin/parcels/status", headers=headers, json=bad).status_code == 400
+
+    with statement_recorder() as statements:
+        response = client.post("api/admin/parcels/status", headers=headers, json=payload)
+
+    data = response.get_json()
+    assert response.status_code == 200
+    assert data["updated"] == 2
+    assert [r["outcome"] for r in data["results"]] == [
+        "invalid_transition", "updated", "updated", "not_found", "updated", "not_found",
+    ]
+    assert "CREATED to IN_TRANSIT" in data["results"][0]["error"]
+    writes = [s.split("(")[0].split(" SET")[0].strip() for s in statements if s.startswith(("INSERT", "UPDATE"))]
+    assert sorted(writes) == ["INSERT INTO outbox_events", "INSERT INTO status_history", "UPDATE parcels"]
+    assert StatusHistory.query.filter_by(parcel_id=parcels[2].id, status=ParcelStatus.IN_TRANSIT).count() == 1
+
+    # Rescanning is harmless
+    again = client.post("api/admin/parcels/status", headers=headers,
+                        json={"tracking_ids": tracking_ids[1:], "status": "IN_TRANSIT"}).get_json()
+    assert [r["outcome"] for r in again["results"]] == ["unchanged", "unchanged"]
+
+    # The single endpoint follows the same state machine
+    single = client.post(f"api/admin/parcels/{parcels[0].id}/status", headers=headers, json={"status": "DELIVERED"})
+    assert single.status_code == 400
@@ -1,8 +1,10 @@
 # tests/test_auth.py
 import pytest
+import time
 import uuid
 from app.models import User, UserRole
-from app.extensions import db
+from app.extensions import db, bcrypt
+from app.utilis.hashing import HashPool, HashingBusy, hash_params, _hash, _check
 
 
 def create_user(email=None, password="password123", role=UserRole.CUSTOMER):
@@ -126,3 +128,78 @@ def test_reset_password_failure_wrong_answer(client):
     assert response.status_code == 400
     assert data["success"] is False
     assert "incorrect security answer" in data["msg"].lower()
+
+# Hash pool tests
+def test_login_returns_503_when_hash_pool_saturated(client, app):
+    user = create_user()
+    pool = app.extensions["password_hasher"]
+    max_pending = pool.max_pending
+    pool.max_pending = 0
+    try:
+        response = client.post("/api/auth/login", json={"email": user.email, "password": "password123"})
+    finally:
+        pool.max_pending = max_pending
+
+    assert response.status_code == 503
+    assert int(response.headers["Retry-After"]) >= 1
+    assert response.get_json()["success"] is False
+    assert pool.stats()["rejected"] >= 1
+
+
+def test_hashing_stats(client, admin_token):
+    create_user()
+    response = client.get("/api/auth/hashing/stats", headers={"Authorization": f"Bearer {admin_token}"})
+    data = response.get_json()
+    assert response.status_code == 200
+    assert data["pending"] == 0
+    assert data["submitted"] >= 2
+    assert "p95" in data["latency_ms"]
+    assert data["policy"] == {"scheme": "2b", "rounds": 4}
+    assert data["stored_costs"]["4"] >= 1
+
+
+def test_hash_pool_process_workers_match_flask_bcrypt():
+    pool = HashPool(workers=1)
+    try:
+        hashed = pool.run(_hash, "password123", 4)
+        assert bcrypt.check_password_hash(hashed, "password123")
+        assert pool.run(_check, "password123", hashed) is True
+        assert pool.run(_check, "wrong", hashed) is False
+    finally:
+        pool.shutdown()
+
+
+def test_hash_pool_timed_out_job_holds_its_slot():
+    pool = HashPool(workers=1, max_pending=1, timeout=0.01)
+    try:
+        with pytest.raises(HashingBusy):
+            pool.run(_hash, "password123", 10)
+        # The hash is still running in the worker, so it still counts
+        assert pool.stats()["pending"] == 1
+        with pytest.raises(HashingBusy):
+            pool.run(_hash, "password123", 4)
+        assert pool.rejected == 1
+
+        deadline = time.monotonic() + 30
+        while pool.stats()["pending"] and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert pool.stats()["pending"] == 0
+    finally:
+        pool.shutdown()
+
+
+def test_login_rehashes_outdated_cost(client, app):
+    rounds = app.config["BCRYPT_LOG_ROUNDS"]
+    app.config["BCRYPT_LOG_ROUNDS"] = rounds + 1
+    try:
+        user = create_user()
+    finally:
+        app.config["BCRYPT_LOG_ROUNDS"] = rounds
+    assert hash_params(user._password_hash) == ("2b", rounds + 1)
+
+    response = client.post("/api/auth/login", json={"email": user.email, "password": "password123"})
+    assert response.status_code == 200
+
+    db.session.refresh(user)
+    assert hash_params(user._password_hash) == ("2b", rounds)
+    assert user.check_password("password123")
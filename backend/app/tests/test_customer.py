@@ -1,7 +1,12 @@
 # tests/test_customer.py
 
 import json
-from app.models import Parcel, ParcelStatus
+from types import SimpleNamespace
+from sqlalchemy import delete
+from app.extensions import identity_cache
+from app.models import Address, Notification, OutboxEvent, Parcel, ParcelStatus, StatusHistory, User, UserRole
+from app.utilis import outbox, route_service
+from app.utilis.parcel_events import PARCELS_BULK_CREATED
 
 def test_customer_create_parcel(client, customer_token, sample_address):
     headers = {"Authorization": f"Bearer {customer_token}"}
@@ -17,3 +22,218 @@ def test_customer_create_parcel(client, customer_token, sample_address):
     assert response.status_code == 201
     assert data["success"] is True
     assert "tracking_id" in data["data"]
+
+
+def test_customer_create_parcel_stores_route(client, customer_token, stub_upstream):
+    headers = {"Authorization": f"Bearer {customer_token}"}
+    payload = {
+        "pickup_address": {"street": "Moi Ave", "city": "Nairobi", "country": "Kenya",
+                           "postal_code": "00100", "lat": -1.2921, "lng": 36.8219},
+        "delivery_address": {"street": "Airport Rd", "city": "Nairobi", "country": "Kenya",
+                             "postal_code": "00501", "lat": -1.35, "lng": 37.0},
+        "weight_kg": 1.0
+    }
+
+    response = client.post("/api/customer/parcels", headers=headers, json=payload)
+    data = response.get_json()["data"]
+
+    assert response.status_code == 201
+    assert data["route"]["distance_km"] == 12.35
+    assert data["route"]["duration_min"] == 30.0
+    assert data["route"]["polyline"]
+
+    # Changing the delivery coordinates recomputes the route
+    stub_upstream.route["routes"][0]["distance"] = 20000.0
+    update = {**payload["delivery_address"], "lat": -1.40, "lng": 37.1}
+    response = client.patch(f"/api/customer/parcels/{data['id']}", headers=headers, json=update)
+    assert response.get_json()["data"]["route"]["distance_km"] == 20.0
+
+    # Same coordinates: no upstream call
+    calls = len(stub_upstream.calls)
+    response = client.patch(f"/api/customer/parcels/{data['id']}", headers=headers, json={**update, "street": "Airport North Rd"})
+    assert response.status_code == 200
+    assert len(stub_upstream.calls) == calls
+
+
+def test_customer_routes_skip_user_lookup(client, customer_token, admin_token, statement_recorder):
+    headers = {"Authorization": f"Bearer {customer_token}"}
+    client.get("/api/customer/parcels", headers=headers)  # caches the identity
+    with statement_recorder() as statements:
+        response = client.get("/api/customer/parcels", headers=headers)
+        denied = client.get("/api/customer/parcels", headers={"Authorization": f"Bearer {admin_token}"})
+
+    assert response.status_code == 200
+    assert denied.status_code == 403
+    assert not [s for s in statements if "FROM users" in s]
+
+
+def test_deleted_or_demoted_users_lose_access(client, db, customer_user, customer_token, sample_address):
+    headers = {"Authorization": f"Bearer {customer_token}"}
+    assert client.get("/api/customer/parcels", headers=headers).status_code == 200
+
+    customer_user.role = UserRole.ADMIN
+    db.session.commit()
+    assert client.get("/api/customer/parcels", headers=headers).status_code == 403
+
+    customer_user.role = UserRole.CUSTOMER
+    db.session.commit()
+    assert client.get("/api/customer/parcels", headers=headers).status_code == 200
+
+    # Another worker's cache may still hold the user: writes read the row
+    db.session.execute(delete(User).where(User.id == customer_user.id))
+    db.session.commit()
+    assert identity_cache.get(customer_user.id) is not None
+    payload = {"pickup_address": sample_address, "delivery_address": sample_address, "weight_kg": 1.0}
+    response = client.post("/api/customer/parcels", headers=headers, json=payload)
+    assert response.status_code == 401
+    assert Parcel.query.filter_by(customer_id=customer_user.id).count() == 0
+
+
+def _add_parcels(db, user, count):
+    for _ in range(count):
+        pickup = Address(street="Moi Ave", city="Nairobi", country="Kenya")
+        delivery = Address(street="Airport Rd", city="Nairobi", country="Kenya")
+        parcel = Parcel(customer_id=user.id, pickup_address=pickup, delivery_address=delivery, weight_kg=1.0)
+        parcel.status_history = [
+            StatusHistory(status=status, actor_id=user.id)
+            for status in (ParcelStatus.CREATED, ParcelStatus.PICKED_UP, ParcelStatus.IN_TRANSIT)
+        ]
+        db.session.add(parcel)
+    db.session.commit()
+
+
+def test_parcel_list_query_count_is_constant(client, db, customer_user, customer_token, statement_recorder):
+    headers = {"Authorization": f"Bearer {customer_token}"}
+
+    def list_parcels():
+        with statement_recorder() as statements:
+            response = client.get("/api/customer/parcels", headers=headers)
+        assert response.status_code == 200
+        return response.get_json()["data"], len(statements)
+
+    list_parcels()  # caches the identity
+    _add_parcels(db, customer_user, 2)
+    parcels, few = list_parcels()
+    assert len(parcels) == 2
+
+    _add_parcels(db, customer_user, 8)
+    parcels, many = list_parcels()
+    assert len(parcels) == 10
+    assert all(len(p["status_history"]) == 3 and p["pickup_address"]["street"] == "Moi Ave" for p in parcels)
+    assert parcels[0]["status_history"][0]["updated_by"] == customer_user.name
+    assert many == few <= 4
+
+
+def test_profile_update_invalidates_identity_cache(client, customer_user, customer_token):
+    headers = {"Authorization": f"Bearer {customer_token}"}
+    assert client.get("/api/customer/profile", headers=headers).status_code == 200
+    assert identity_cache.get(customer_user.id)["name"] == "Customer User"
+
+    response = client.patch("/api/customer/profile", headers=headers, json={"name": "Renamed User"})
+    assert response.status_code == 200
+    assert identity_cache.get(customer_user.id) is None
+
+    client.get("/api/customer/profile", headers=headers)
+    assert identity_cache.get(customer_user.id)["name"] == "Renamed User"
+
+
+def test_identity_cache_is_invalidated_by_the_outer_commit(client, db, customer_user, customer_token):
+    headers = {"Authorization": f"Bearer {customer_token}"}
+    client.get("/api/customer/profile", headers=headers)
+    assert identity_cache.get(customer_user.id) is not None
+
+    customer_user.name = "Savepoint User"
+    db.session.flush()
+    try:
+        with db.session.begin_nested():
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+    with db.session.begin_nested():
+        pass
+    # Released savepoints are not a commit: a reader could cache the old row again
+    identity_cache.set(customer_user)
+    db.session.commit()
+    assert identity_cache.get(customer_user.id) is None
+
+
+def test_parcel_lists_are_keyset_paginated(client, db, customer_user, customer_token):
+    headers = {"Authorization": f"Bearer {customer_token}"}
+    _add_parcels(db, customer_user, 5)
+    Parcel.query.filter_by(customer_id=customer_user.id).first().status = ParcelStatus.DELIVERED
+    db.session.commit()
+
+    seen, cursor = [], None
+    while True:
+        url = "/api/customer/parcels?limit=2" + (f"&cursor={cursor}" if cursor else "")
+        body = client.get(url, headers=headers).get_json()
+        assert len(body["data"]) <= 2
+        seen += body["data"]
+        cursor = body["next_cursor"]
+        if cursor is None:
+            break
+    assert len(seen) == 5 and len({p["id"] for p in seen}) == 5
+    assert [p["created_at"] for p in seen] == sorted((p["created_at"] for p in seen), reverse=True)
+
+    delivered = client.get("/api/customer/parcels?status=delivered", headers=headers).get_json()["data"]
+    assert [p["status"] for p in delivered] == ["DELIVERED"]
+    future = client.get("/api/customer/parcels?created_from=2999-01-01", headers=headers).get_json()["data"]
+    assert future == []
+
+    response = client.get("/api/parcels?limit=3", headers=headers)
+    assert len(response.get_json()) == 3
+    rest = client.get(f"/api/parcels?cursor={response.headers['X-Next-Cursor']}", headers=headers)
+    assert len(rest.get_json()) == 2 and "X-Next-Cursor" not in rest.headers
+
+    assert client.get("/api/customer/parcels?limit=1000", headers=headers).status_code == 400
+    assert client.get("/api/parcels?cursor=bogus", headers=headers).status_code == 400
+
+
+def test_bulk_create_routes_parcels_in_one_job(app, client, customer_token, sample_address, monkeypatch):
+    jobs = []
+    monkeypatch.setitem(app.config, "PARCEL_ROUTE_ASYNC", True)
+    monkeypatch.setattr(route_service, "_get_executor",
+                        lambda app: SimpleNamespace(submit=lambda fn, app, parcel_ids: jobs.append(parcel_ids)))
+    headers = {"Authorization": f"Bearer {customer_token}"}
+    item = {"pickup_address": sample_address, "delivery_address": sample_address, "weight_kg": 1.5}
+
+    response = client.post("/api/customer/parcels/bulk", headers=headers, json={"parcels": [item] * 5})
+    assert response.status_code == 201
+    assert [len(parcel_ids) for parcel_ids in jobs] == [5]
+
+
+def test_bulk_create_batches_inserts(client, customer_user, customer_token, sample_address,
+                                    async_outbox, statement_recorder):
+    headers = {"Authorization": f"Bearer {customer_token}"}
+    item = {"pickup_address": sample_address, "delivery_address": sample_address, "weight_kg": 1.5}
+
+    response = client.post("/api/customer/parcels/bulk", headers=headers,
+                           json={"parcels": [item, {**item, "weight_kg": 0}, item]})
+    assert response.status_code == 400
+    assert list(response.get_json()["errors"]) == ["1"]
+    assert Parcel.query.filter_by(customer_id=customer_user.id).count() == 0
+    assert client.post("/api/customer/parcels/bulk", headers=headers, json=[1]).status_code == 400
+
+    # Handlers run later in the worker, as in production
+    with statement_recorder() as statements:
+        response = client.post("/api/customer/parcels/bulk", headers=headers, json={"parcels": [item] * 25})
+
+    assert response.status_code == 201
+    created = response.get_json()["data"]
+    assert len({p["tracking_id"] for p in created}) == 25
+    assert Parcel.query.filter_by(customer_id=customer_user.id).count() == 25
+    inserts = [s.split("(")[0].strip() for s in statements if s.startswith("INSERT")]
+    assert sorted(inserts) == [
+        "INSERT INTO addresses", "INSERT INTO outbox_events", "INSERT INTO parcels", "INSERT INTO status_history",
+    ]
+
+    # The whole batch is one event: one admin alert and one customer notification
+    [bulk] = OutboxEvent.query.filter(OutboxEvent.processed_at.is_(None),
+                                      OutboxEvent.payload["customer_id"].as_string() == str(customer_user.id)).all()
+    assert bulk.type == PARCELS_BULK_CREATED and len(bulk.payload["tracking_ids"]) == 25
+    processed, failed = outbox.drain()
+    assert processed >= 1 and failed == 0
+    [alert] = Notification.query.filter(Notification.message.contains(created[0]["tracking_id"])).all()
+    assert alert.audience == UserRole.ADMIN and alert.message.startswith("25 parcels created by")
+    [notice] = Notification.query.filter_by(user_id=customer_user.id).all()
+    assert notice.message == "Your 25 parcels have been created successfully."
@@ -0,0 +1,476 @@
+# tests/test_maps.py
+import json
+import math
+import pytest
+import threading
+import time
+import uuid
+from sqlalchemy import insert
+from app.extensions import route_cache, upstreams, address_index
+from app.models import Address
+from app.schemas import parcel_route
+from app.utilis.geoindex import GridIndex
+from app.utilis.cache import MemoryCache, SQLiteCache, route_key
+from app.utilis.polyline import simplify, encode, decode
+from app.utilis.singleflight import SingleFlight
+from app.utilis.routing import RouteEstimator
+from app.utilis.route_service import retry_estimated_routes, schedule_parcel_route
+from app.utilis.upstream import CircuitBreaker, UpstreamClient, UpstreamError
+
+
+@pytest.fixture(autouse=True)
+def clear_route_cache(app):
+    route_cache.clear()
+    yield
+    route_cache.clear()
+
+
+def test_distance_is_cached(client, stub_upstream):
+    params = {"origin": "-1.2921,36.8219", "destination": "-1.35,37.0"}
+    first = client.get("/api/maps/distance", query_string=params)
+    second = client.get("/api/maps/distance", query_string=params)
+
+    assert first.status_code == 200
+    assert second.get_json() == first.get_json()
+    assert first.get_json()["distance"] == "12.35 km"
+    assert len(stub_upstream.calls) == 1
+
+    stats = client.get("/api/maps/cache/stats").get_json()
+    assert stats["hits"] == 1
+    assert stats["misses"] == 2  # variant key, then full-geometry key
+
+
+def test_distance_cache_buckets_nearby_coordinates(client, stub_upstream):
+    client.get("/api/maps/distance", query_string={"origin": "-1.29210,36.82190", "destination": "-1.35,37.0"})
+    client.get("/api/maps/distance", query_string={"origin": "-1.29212,36.82191", "destination": "-1.35,37.0"})
+    assert len(stub_upstream.calls) == 1
+
+
+def test_memory_cache_lru_and_ttl():
+    cache = MemoryCache(max_entries=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)  # evicts "b", the least recently used
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.stats()["evictions"] == 1
+
+    cache.set("d", 4, ttl=0)
+    assert cache.get("d") is None
+
+
+def test_sqlite_cache_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "routes.sqlite3")
+    writer = SQLiteCache(path, max_entries=2, ttl=60, trim_every=1)
+    reader = SQLiteCache(path, max_entries=2, ttl=60, trim_every=1)
+    key = route_key(-1.2921, 36.8219, -1.35, 37.0)
+
+    writer.set(key, {"distance": "1 km"})
+    assert reader.get(key) == {"distance": "1 km"}
+
+    writer.set("x", 1)
+    writer.set("y", 2)
+    assert len(writer) == 2
+
+
+def test_sqlite_cache_trims_every_few_writes(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "routes.sqlite3"), max_entries=2, ttl=60, trim_every=3)
+    for key in ("a", "b", "c"):
+        cache.set(key, key)
+    assert len(cache) == 2 and cache.get("a") is None  # third write trims
+
+    cache.set("d", "d")
+    cache.get("b")
+    assert len(cache) == 3  # over the limit until the next trim
+    cache.set("e", "e")
+    cache.set("f", "f")
+    assert len(cache) == 2
+    assert cache.get("e") == "e" and cache.get("f") == "f"
+    assert cache.stats()["evictions"] == 4
+
+
+def test_reverse_geocode_uses_upstream_client(client, stub_upstream):
+    response = client.get("/api/maps/reverse-geocode", query_string={"lat": "-1.28", "lng": "36.82"})
+    assert response.status_code == 200
+    assert response.get_json() == {"street": "Moi Avenue", "city": "Nairobi", "country": "Kenya"}
+    assert stub_upstream.calls[0].startswith("/reverse?")
+
+    again = client.get("/api/maps/reverse-geocode", query_string={"lat": "-1.28", "lng": "36.82"})
+    assert again.get_json() == response.get_json()
+    assert len(stub_upstream.calls) == 1
+
+
+def test_upstream_retries_then_opens_circuit(stub_upstream):
+    stub_upstream.status = 503
+    client = UpstreamClient("osrm", stub_upstream.url, retries=2, backoff=0,
+                            breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+
+    for _ in range(2):
+        with pytest.raises(UpstreamError):
+            client.get_json("/route/v1/driving/1,1;2,2")
+    assert len(stub_upstream.calls) == 6
+    assert client.breaker.state == CircuitBreaker.OPEN
+
+    # Open circuit fails fast without touching the network
+    with pytest.raises(UpstreamError):
+        client.get_json("/route/v1/driving/1,1;2,2")
+    assert len(stub_upstream.calls) == 6
+
+
+def test_upstream_server_errors_count_against_the_circuit(stub_upstream):
+    client = UpstreamClient("osrm", stub_upstream.url, retries=2, backoff=0,
+                            breaker=CircuitBreaker(failure_threshold=2, reset_timeout=60))
+    stub_upstream.status = 501
+    with pytest.raises(UpstreamError):
+        client.get_json("/route/v1/driving/1,1;2,2")
+    assert len(stub_upstream.calls) == 1  # not retried
+    assert client.breaker.failures == 1
+
+    stub_upstream.status = 505
+    with pytest.raises(UpstreamError):
+        client.get_json("/route/v1/driving/1,1;2,2")
+    assert client.breaker.state == CircuitBreaker.OPEN
+
+
+def test_upstream_read_timeout(stub_upstream):
+    stub_upstream.delay = 0.5
+    client = UpstreamClient("osrm", stub_upstream.url, read_timeout=0.1, retries=0)
+    with pytest.raises(UpstreamError):
+        client.get_json("/route/v1/driving/1,1;2,2")
+
+
+def test_distance_falls_back_to_estimate_when_circuit_open(client, stub_upstream):
+    for _ in range(upstreams.osrm.breaker.failure_threshold):
+        upstreams.osrm.breaker.record_failure()
+
+    response = client.get("/api/maps/distance", query_string={"origin": "-1.29,36.82", "destination": "-1.35,37.0"})
+    data = response.get_json()
+    assert response.status_code == 200
+    assert data["source"] == "estimate"
+    assert data["coordinates"] == [[-1.29, 36.82], [-1.35, 37.0]]
+    assert stub_upstream.calls == []
+
+
+def test_distance_fast_mode_skips_upstream(client, stub_upstream):
+    response = client.get("/api/maps/distance", query_string={
+        "origin": "-1.2921,36.8219", "destination": "-1.35,37.0", "mode": "fast", "profile": "walking",
+    })
+    data = response.get_json()
+    assert response.status_code == 200
+    assert data["source"] == "estimate"
+    assert data["distance"].endswith(" km")
+    assert data["duration"].endswith(" mins")
+    assert stub_upstream.calls == []
+
+
+def test_route_estimator_accuracy():
+    estimator = RouteEstimator(circuity=1.0)
+    # Nairobi CBD -> JKIA is ~13 km as the crow flies
+    distance_km, duration_min = estimator.estimate(-1.2864, 36.8172, -1.3192, 36.9278)
+    assert 12.5 < distance_km < 13.5
+    assert duration_min == pytest.approx(distance_km / 35.0 * 60)
+
+    distances, _ = estimator.estimate_matrix([(-1.2864, 36.8172)], [(-1.2864, 36.8172), (-1.3192, 36.9278)])
+    assert distances[0][0] == 0
+    assert distances[0][1] == pytest.approx(distance_km)
+
+
+def test_polyline_encode_matches_reference():
+    points = [[38.5, -120.2], [40.7, -120.95], [43.252, -126.453]]
+    encoded = encode(points)
+    assert encoded == "_p~iF~ps|U_ulLnnqC_mqNvxq`@"
+    assert decode(encoded) == points
+
+
+def test_simplify_shrinks_dense_route():
+    # ~20 km gently curving road sampled every ~2 m
+    dense = [[-1.29 + i * 1e-5, 36.82 + 0.01 * math.sin(i / 2000)] for i in range(10000)]
+    simplified = simplify(dense, 5)
+
+    assert simplified[0] == dense[0] and simplified[-1] == dense[-1]
+    assert len(simplified) * 10 < len(dense)
+    assert len(encode(simplified)) * 10 < len(json.dumps(dense))
+    assert simplify(dense, 0) == dense
+
+
+def test_distance_polyline_format(client, stub_upstream):
+    response = client.get("/api/maps/distance", query_string={
+        "origin": "-1.2921,36.8219", "destination": "-1.35,37.0", "format": "polyline", "tolerance": "0",
+    })
+    data = response.get_json()
+    assert response.status_code == 200
+    assert "coordinates" not in data
+    assert decode(data["polyline"]) == [[-1.2921, 36.8219], [-1.3, 36.9], [-1.35, 37.0]]
+
+    bad = client.get("/api/maps/distance", query_string={
+        "origin": "-1.2921,36.8219", "destination": "-1.35,37.0", "format": "kml",
+    })
+    assert bad.status_code == 400
+
+
+def test_distance_tolerance_is_bucketed(client, stub_upstream):
+    params = {"origin": "-1.2921,36.8219", "destination": "-1.35,37.0"}
+    for value in ("nan", "inf", "-1", "abc"):
+        assert client.get("/api/maps/distance", query_string={**params, "tolerance": value}).status_code == 400
+
+    keys_before = len(route_cache.backend)
+    for value in ("5", "5.1", "7.25", "9.999"):
+        assert client.get("/api/maps/distance", query_string={**params, "tolerance": value}).status_code == 200
+    # The full route plus a single tolerance=5 variant
+    assert len(route_cache.backend) - keys_before == 2
+
+
+def test_distance_without_a_route(client, stub_upstream):
+    params = {"origin": "-1.2921,36.8219", "destination": "-1.35,37.0"}
+    stub_upstream.route = {"code": "NoRoute", "routes": []}
+    assert client.get("/api/maps/distance", query_string=params).status_code == 404
+    assert client.get("/api/maps/distance", query_string={**params, "overview": "false"}).status_code == 404
+
+    stub_upstream.route = {"code": "Ok", "routes": []}
+    response = client.get("/api/maps/distance", query_string={**params, "destination": "-1.36,37.1"})
+    assert response.status_code == 502
+    assert response.get_json()["error"] == "OSRM request failed"
+
+
+def test_matrix_chunks_and_fills_cache(app, client, stub_upstream, create_address, admin_token, monkeypatch):
+    create_address.lat, create_address.lng = -1.30, 36.80
+    monkeypatch.setitem(app.config, "MATRIX_MAX_COORDINATES", 4)
+    response = client.post("/api/maps/matrix", headers={"Authorization": f"Bearer {admin_token}"}, json={
+        "origins": [str(create_address.id), [-1.29, 36.82], [-1.28, 36.83]],
+        "destinations": [[-1.35, 37.0], [-1.36, 37.1]],
+    })
+    data = response.get_json()
+
+    assert response.status_code == 200
+    assert data["source"] == "osrm"
+    assert data["distances_km"] == [[1.0, 2.0]] * 3
+    assert data["durations_min"] == [[1.0, 2.0]] * 3
+    assert len(stub_upstream.calls) == 2  # 3 origins split into chunks of 2
+
+    single = client.get("/api/maps/distance", query_string={
+        "origin": "-1.28,36.83", "destination": "-1.36,37.1", "overview": "false",
+    })
+    assert single.get_json() == {"distance": "2.0 km", "duration": "2.0 mins", "source": "osrm"}
+    assert len(stub_upstream.calls) == 2
+
+
+def test_matrix_rejects_incomplete_osrm_table(client, stub_upstream, monkeypatch):
+    # `annotations` not honoured: durations only
+    monkeypatch.setattr(stub_upstream, "table", lambda path: {"code": "Ok", "durations": [[60.0]]})
+    response = client.post("/api/maps/matrix", json={"origins": [[-1.29, 36.82]], "destinations": [[-1.35, 37.0]]})
+    assert response.status_code == 502
+    assert response.get_json()["error"] == "OSRM request failed"
+
+
+def test_matrix_falls_back_to_estimate(client, stub_upstream):
+    stub_upstream.status = 503
+    response = client.post("/api/maps/matrix", json={
+        "origins": [[-1.29, 36.82]], "destinations": [[-1.29, 36.82], [-1.35, 37.0]],
+    })
+    data = response.get_json()
+    assert response.status_code == 200
+    assert data["source"] == "estimate"
+    assert data["distances_km"][0][0] == 0
+
+
+def test_osrm_rejection_is_not_estimated(client, stub_upstream):
+    stub_upstream.status = 400
+    distance = client.get("/api/maps/distance", query_string={
+        "origin": "-1.2921,36.8219", "destination": "-1.35,37.0",
+    })
+    assert distance.status_code == 502
+    assert distance.get_json() == {"error": "osrm returned 400"}
+
+    matrix = client.post("/api/maps/matrix", json={
+        "origins": [[-1.29, 36.82]], "destinations": [[-1.35, 37.0]],
+    })
+    assert matrix.status_code == 502
+    assert len(stub_upstream.calls) == 2  # 4xx is not retried
+
+
+def test_matrix_rejects_unknown_address(client, admin_token):
+    response = client.post("/api/maps/matrix", headers={"Authorization": f"Bearer {admin_token}"}, json={
+        "origins": ["00000000-0000-0000-0000-000000000000"], "destinations": [[-1.35, 37.0]],
+    })
+    assert response.status_code == 400
+
+
+def test_matrix_address_ids_are_scoped_to_the_caller(db, client, stub_upstream, create_parcel, customer_token):
+    own = create_parcel.pickup_address
+    own.lat, own.lng = -1.30, 36.80
+    other = Address(street="Kenyatta Avenue", city="Nairobi", country="Kenya", lat=-1.28, lng=36.82)
+    db.session.add(other)
+    db.session.commit()
+    headers = {"Authorization": f"Bearer {customer_token}"}
+
+    anonymous = client.post("/api/maps/matrix", json={"origins": [str(own.id)], "destinations": [[-1.35, 37.0]]})
+    assert anonymous.status_code == 401
+
+    mine = client.post("/api/maps/matrix", headers=headers, json={
+        "origins": [str(own.id)], "destinations": [[-1.35, 37.0]],
+    })
+    assert mine.status_code == 200
+
+    theirs = client.post("/api/maps/matrix", headers=headers, json={
+        "origins": [str(other.id)], "destinations": [[-1.35, 37.0]],
+    })
+    missing = client.post("/api/maps/matrix", headers=headers, json={
+        "origins": ["00000000-0000-0000-0000-000000000000"], "destinations": [[-1.35, 37.0]],
+    })
+    assert theirs.status_code == missing.status_code == 400
+    assert theirs.get_json()["error"].replace(str(other.id), "") == missing.get_json()["error"].replace(
+        "00000000-0000-0000-0000-000000000000", "")
+
+    # Plain coordinates stay public
+    assert client.post("/api/maps/matrix", json={"origins": [[-1.29, 36.82]], "destinations": [[-1.35, 37.0]]}).status_code == 200
+
+
+def test_matrix_rejects_non_object_body(client):
+    assert client.post("/api/maps/matrix", json=[1]).status_code == 400
+
+
+def test_reverse_geocode_answers_from_known_addresses(client, db_session, stub_upstream):
+    address_index.get_index()  # build before the insert so the commit hook updates it
+    address = Address(street="Kenyatta Ave", city="Westlands", country="Kenya",
+                      postal_code="00100", lat=-1.2833, lng=36.8219)
+    db_session.add(address)
+    db_session.commit()
+
+    # ~20 m away: locality from the known address, street from (cached) Nominatim
+    params = {"lat": "-1.28345", "lng": "36.82195"}
+    response = client.get("/api/maps/reverse-geocode", query_string=params)
+    assert response.get_json() == {"street": "Moi Avenue", "city": "Westlands", "country": "Kenya"}
+    assert client.get("/api/maps/reverse-geocode", query_string=params).get_json() == response.get_json()
+    assert len(stub_upstream.calls) == 1
+
+    # Nominatim down: the locality is still answered, never the customer's street
+    stub_upstream.status = 503
+    response = client.get("/api/maps/reverse-geocode", query_string={"lat": "-1.28335", "lng": "36.82195"})
+    assert response.status_code == 200
+    assert response.get_json() == {"street": "", "city": "Westlands", "country": "Kenya"}
+    stub_upstream.status = 200
+
+    db_session.delete(address)
+    db_session.commit()
+    response = client.get("/api/maps/reverse-geocode", query_string={"lat": "-1.28325", "lng": "36.82195"})
+    assert response.get_json() == {"street": "Moi Avenue", "city": "Nairobi", "country": "Kenya"}
+
+
+def test_address_index_refresh_picks_up_other_writers(app, db_session, monkeypatch):
+    address_index.get_index()
+    # A Core insert skips the ORM commit hook, like a write from another worker
+    db_session.execute(insert(Address).values(
+        id=uuid.uuid4(), street="Kenyatta Ave", city="Nairobi", country="Kenya", lat=-1.2833, lng=36.8219,
+    ))
+    db_session.commit()
+    assert address_index.lookup(-1.2833, 36.8219) is None
+
+    monkeypatch.setitem(app.config, "GEOCODE_INDEX_REFRESH", -1)
+    assert address_index.lookup(-1.2833, 36.8219) == {"city": "Nairobi", "country": "Kenya"}
+
+
+def test_address_index_follows_savepoints(db_session):
+    address_index.get_index()
+    kept = Address(street="Moi Ave", city="Mombasa", country="Kenya", lat=-4.0435, lng=39.6682)
+    db_session.add(kept)
+    db_session.flush()
+    try:
+        with db_session.begin_nested():
+            db_session.add(Address(street="Oginga Odinga St", city="Kisumu", country="Kenya", lat=-0.0917, lng=34.768))
+            db_session.flush()
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+    assert address_index.lookup(-4.0435, 39.6682) is None
+    db_session.commit()
+
+    assert address_index.lookup(-4.0435, 39.6682)["city"] == "Mombasa"
+    assert address_index.lookup(-0.0917, 34.768) is None
+    db_session.delete(kept)
+    db_session.commit()
+
+
+def test_grid_index_radius():
+    index = GridIndex(cell_m=100)
+    index.add("a", 60.0, 10.0, "north")
+    assert index.nearest(60.0, 10.0015, 100)[1] == "north"  # ~84 m east at 60N
+    assert index.nearest(60.0, 10.003, 100) is None
+
+
+def test_singleflight_shares_one_call():
+    flight = SingleFlight()
+    calls = []
+    release = threading.Event()
+    results = []
+
+    def slow():
+        calls.append(1)
+        release.wait(2)
+        return {"ok": True}
+
+    threads = [threading.Thread(target=lambda: results.append(flight.do("k", slow))) for _ in range(8)]
+    for t in threads:
+        t.start()
+    while flight.coalesced < 7:
+        time.sleep(0.001)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+    assert results == [{"ok": True}] * 8
+    assert flight.stats() == {"executed": 1, "coalesced": 7, "in_flight": 0}
+
+
+def test_singleflight_propagates_errors():
+    flight = SingleFlight()
+
+    def boom():
+        raise ValueError("upstream down")
+
+    with pytest.raises(ValueError):
+        flight.do("k", boom)
+    assert flight.in_flight() == 0
+
+
+def test_concurrent_route_requests_coalesce(app, stub_upstream):
+    stub_upstream.delay = 0.3
+    params = {"origin": "-1.2921,36.8219", "destination": "-1.35,37.0"}
+    statuses = []
+
+    def view_route():
+        with app.test_client() as c:
+            statuses.append(c.get("/api/maps/distance", query_string=params).status_code)
+
+    threads = [threading.Thread(target=view_route) for _ in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert statuses == [200] * 5
+    assert len(stub_upstream.calls) == 1
+
+
+def test_estimated_parcel_routes_are_retried(app, db_session, create_parcel, stub_upstream, monkeypatch):
+    address = create_parcel.pickup_address
+    address.lat, address.lng = -1.2611, 36.8023
+    db_session.commit()
+
+    # The production path: computed on the background executor while OSRM is down
+    monkeypatch.setitem(app.config, "PARCEL_ROUTE_ASYNC", True)
+    stub_upstream.status = 503
+    schedule_parcel_route(create_parcel.id).result(timeout=10)
+    db_session.expire_all()
+    assert create_parcel.route_source == "estimate"
+    assert parcel_route(create_parcel)["source"] == "estimate"
+
+    stub_upstream.status = 200
+    monkeypatch.setitem(app.config, "PARCEL_ROUTE_RETRY_AFTER", 0)
+    retried, _ = retry_estimated_routes()
+    assert retried >= 1
+    db_session.expire_all()
+    assert create_parcel.route_source == "osrm"
+    assert create_parcel.route_distance_km == 12.35
@@ -0,0 +1,124 @@
+# tests/test_maps_async.py
+import asyncio
+import time
+import httpx
+import pytest
+from app.extensions import route_cache
+from app.routes.maps_async import create_asgi_app
+from app.utilis.singleflight import AsyncSingleFlight
+from app.utilis.upstream import AsyncUpstreamClient, CircuitBreaker, UpstreamError
+
+
+@pytest.fixture(autouse=True)
+def clear_route_cache(app):
+    route_cache.clear()
+    yield
+    route_cache.clear()
+
+
+def run_requests(app, requests):
+    """Runs (path, params) GETs concurrently against the ASGI app."""
+    application = create_asgi_app(app)
+
+    async def main():
+        transport = httpx.ASGITransport(app=application)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            responses = await asyncio.gather(*[client.get(path, params=params) for path, params in requests])
+        await application.maps_api.state.maps.aclose()
+        return responses
+
+    return asyncio.run(main())
+
+
+def test_async_distance_matches_sync_shape(app, client, stub_upstream):
+    params = {"origin": "-1.2921,36.8219", "destination": "-1.35,37.0", "tolerance": "0"}
+    [response] = run_requests(app, [("/api/maps/distance", params)])
+
+    assert response.status_code == 200
+    assert response.json() == client.get("/api/maps/distance", query_string=params).get_json()
+
+
+def test_async_distance_runs_upstream_calls_concurrently(app, stub_upstream):
+    stub_upstream.delay = 0.2
+    requests = [
+        ("/api/maps/distance", {"origin": f"-1.{2900 + i},36.8219", "destination": "-1.35,37.0"})
+        for i in range(20)
+    ]
+
+    start = time.perf_counter()
+    responses = run_requests(app, requests)
+    elapsed = time.perf_counter() - start
+
+    assert [r.status_code for r in responses] == [200] * 20
+    assert len(stub_upstream.calls) == 20
+    assert elapsed < 20 * 0.2 / 4
+
+
+def test_async_trip_fans_out_route_and_geocodes(app, stub_upstream):
+    stub_upstream.delay = 0.2
+    start = time.perf_counter()
+    # Ends away from any saved address, so both geocodes go upstream
+    [response] = run_requests(app, [("/api/maps/trip", {"origin": "-1.1,36.7", "destination": "-1.45,37.1"})])
+    elapsed = time.perf_counter() - start
+    data = response.json()
+
+    assert response.status_code == 200
+    assert data["route"]["distance"] == "12.35 km"
+    assert data["origin"]["city"] == "Nairobi"
+    assert data["destination"]["city"] == "Nairobi"
+    assert len(stub_upstream.calls) == 3
+    assert elapsed < 3 * 0.2
+
+
+def test_unhandled_paths_fall_through_to_flask(app):
+    [index, stats] = run_requests(app, [("/", {}), ("/api/maps/cache/stats", {})])
+    assert index.json() == {"msg": "API is running"}
+    assert stats.status_code == 200
+    assert "hits" in stats.json()
+
+
+def test_async_osrm_rejection_is_not_estimated(app, stub_upstream):
+    stub_upstream.status = 400
+    [response] = run_requests(app, [("/api/maps/distance", {"origin": "-1.2921,36.8219", "destination": "-1.35,37.0"})])
+    assert response.status_code == 502
+    assert response.json() == {"error": "osrm returned 400"}
+
+
+def test_async_server_errors_count_against_the_circuit(stub_upstream):
+    stub_upstream.status = 501
+    client = AsyncUpstreamClient("osrm", stub_upstream.url, retries=2, backoff=0,
+                                 breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60))
+
+    async def main():
+        try:
+            with pytest.raises(UpstreamError):
+                await client.get_json("/route/v1/driving/1,1;2,2")
+        finally:
+            await client.aclose()
+
+    asyncio.run(main())
+    assert len(stub_upstream.calls) == 1
+    assert client.breaker.state == CircuitBreaker.OPEN
+
+
+def test_async_singleflight_cancelled_leader_releases_waiters():
+    flight = AsyncSingleFlight()
+
+    async def main():
+        started = asyncio.Event()
+
+        async def slow():
+            started.set()
+            await asyncio.sleep(10)
+
+        leader = asyncio.create_task(flight.do("k", slow))
+        await started.wait()
+        waiter = asyncio.create_task(flight.do("k", slow))
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        with pytest.raises(asyncio.CancelledError):
+            await asyncio.wait_for(waiter, timeout=1)
+        assert flight.stats() == {"executed": 1, "coalesced": 1, "in_flight": 0}
+
+    asyncio.run(main())
@@ -1,5 +1,11 @@
 import uuid
-from app.models import Notification
+from datetime import datetime, timedelta, timezone
+from flask_jwt_extended import create_access_token
+from sqlalchemy import delete, select
+from app.config import TestingConfig
+from app.extensions import events
+from app.models import Notification, NotificationCounter, NotificationType, User, UserRole
+from app.utilis.notification_service import broadcast, ensure_counter, notify
 
 def test_get_notifications(client, customer_token, create_parcel):
     headers = {"Authorization": f"Bearer {customer_token}"}
@@ -26,3 +32,315 @@ def test_delete_notification(client, customer_token, create_parcel, db_session):
     response = client.delete(f"api/notifications/delete/{notif.id}", headers=headers)
     assert response.status_code == 200
     assert Notification.query.get(notif.id) is None
+
+
+def _admin(db):
+    admin = User(
+        name="Second Admin",
+        email=f"admin_{uuid.uuid4().hex[:6]}@example.com",
+        phone_number=f"13{uuid.uuid4().int % 10**8:08d}",
+        password="password123",
+        role=UserRole.ADMIN,
+    )
+    db.session.add(admin)
+    db.session.commit()
+    return admin, create_access_token(identity=str(admin.id), additional_claims={"role": "ADMIN"})
+
+
+def _feed(client, token):
+    response = client.get("api/notifications/get/notifications", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_parcel_events_broadcast_one_row_to_all_admins(client, db, admin_token, customer_token, sample_address):
+    other_admin, other_token = _admin(db)
+    headers = {"Authorization": f"Bearer {customer_token}"}
+    payload = {"pickup_address": sample_address, "delivery_address": sample_address, "weight_kg": 1.0}
+    tracking_id = client.post("/api/customer/parcels", headers=headers, json=payload).get_json()["data"]["tracking_id"]
+
+    # One ALERT row for the event, however many admins there are
+    alerts = Notification.query.filter(
+        Notification.message.contains(tracking_id), Notification.type == NotificationType.ALERT
+    ).all()
+    assert [(n.audience, n.user_id) for n in alerts] == [(UserRole.ADMIN, None)]
+
+    [alert] = [n for n in _feed(client, admin_token) if tracking_id in n["message"]]
+    assert alert["broadcast"] is True and alert["is_read"] is False
+    assert [n["id"] for n in _feed(client, other_token) if tracking_id in n["message"]] == [alert["id"]]
+
+    # Read and delete markers are per admin
+    admin_headers = {"Authorization": f"Bearer {admin_token}"}
+    assert client.patch(f"api/notifications/mark/{alert['id']}/read", headers=admin_headers).status_code == 200
+    assert [n["is_read"] for n in _feed(client, admin_token) if n["id"] == alert["id"]] == [True]
+    assert [n["is_read"] for n in _feed(client, other_token) if n["id"] == alert["id"]] == [False]
+
+    assert client.delete(f"api/notifications/delete/{alert['id']}", headers=admin_headers).status_code == 200
+    assert alert["id"] not in [n["id"] for n in _feed(client, admin_token)]
+    assert alert["id"] in [n["id"] for n in _feed(client, other_token)]
+
+    # Customers can't see or touch admin broadcasts
+    assert alert["id"] not in [n["id"] for n in _feed(client, customer_token)]
+    assert client.patch(f"api/notifications/mark/{alert['id']}/read", headers=headers).status_code == 404
+
+
+def test_mark_all_read_covers_broadcasts(client, db, admin_token):
+    _, other_token = _admin(db)
+    broadcast(UserRole.ADMIN, "Depot closing early", NotificationType.INFO)
+    db.session.commit()
+
+    response = client.patch("api/notifications/mark/read-all", headers={"Authorization": f"Bearer {other_token}"})
+    assert response.status_code == 200
+    assert all(n["is_read"] for n in _feed(client, other_token))
+    assert not all(n["is_read"] for n in _feed(client, admin_token))
+
+
+def test_feed_keyset_pagination_and_filters(client, db, customer_user, customer_token):
+    headers = {"Authorization": f"Bearer {customer_token}"}
+    start = datetime.now(timezone.utc) + timedelta(minutes=1)
+    for i in range(5):
+        db.session.add(Notification(user_id=customer_user.id, message=f"personal {i}", is_read=i % 2 == 0,
+                                    type=NotificationType.PARCEL_UPDATE, created_at=start + timedelta(seconds=2 * i)))
+    for i in range(3):
+        db.session.add(Notification(audience=UserRole.CUSTOMER, message=f"broadcast {i}",
+                                    type=NotificationType.INFO, created_at=start + timedelta(seconds=2 * i + 1)))
+    db.session.commit()
+
+    seen, pages, cursor = [], [], None
+    while True:
+        url = "api/notifications/get/notifications?limit=3" + (f"&before={cursor}" if cursor else "")
+        response = client.get(url, headers=headers)
+        page = response.get_json()
+        assert len(page) <= 3
+        seen += [n["message"] for n in page]
+        pages.append(response.headers)
+        cursor = response.headers.get("X-Next-Cursor")
+        if not cursor:
+            break
+    expected = ["personal 4", "personal 3", "broadcast 2", "personal 2", "broadcast 1", "personal 1", "broadcast 0", "personal 0"]
+    assert seen == expected
+    assert "X-Prev-Cursor" not in pages[0]
+    assert all("X-Prev-Cursor" in headers for headers in pages[1:])
+
+    # Newer than "personal 2", still newest first
+    [item] = [n for n in _feed(client, customer_token) if n["message"] == "personal 2"]
+    newer = client.get(f"api/notifications/get/notifications?after={item['cursor']}", headers=headers)
+    assert [n["message"] for n in newer.get_json()] == expected[:3]
+    assert "X-Prev-Cursor" not in newer.headers and "X-Next-Cursor" in newer.headers
+
+    # A page of exactly `limit` items only links onwards when there are more
+    closest = client.get(f"api/notifications/get/notifications?after={item['cursor']}&limit=2", headers=headers)
+    assert [n["message"] for n in closest.get_json()] == ["personal 3", "broadcast 2"]
+    newest = client.get(f"api/notifications/get/notifications?after={closest.headers['X-Prev-Cursor']}&limit=1",
+                        headers=headers)
+    assert [n["message"] for n in newest.get_json()] == ["personal 4"]
+    assert "X-Prev-Cursor" not in newest.headers
+
+    unread = client.get("api/notifications/get/notifications?is_read=false&type=PARCEL_UPDATE", headers=headers).get_json()
+    assert [n["message"] for n in unread] == ["personal 3", "personal 1"]
+
+    assert client.get("api/notifications/get/notifications?before=nope", headers=headers).status_code == 400
+    assert client.get("api/notifications/get/notifications?limit=0", headers=headers).status_code == 400
+
+
+def _unread(client, token):
+    response = client.get("api/notifications/unread-count", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    return response.get_json()["unread"]
+
+
+def test_unread_count_tracks_reads_deletes_and_broadcasts(client, db, customer_user, customer_token):
+    headers = {"Authorization": f"Bearer {customer_token}"}
+    # Earlier tests may have left customer broadcasts behind
+    base = len([n for n in _feed(client, customer_token) if not n["is_read"]])
+    personal = [Notification(user_id=customer_user.id, message=f"n{i}", type=NotificationType.INFO) for i in range(3)]
+    db.session.add_all(personal)
+    db.session.commit()
+    # First read reconciles from the table
+    assert _unread(client, customer_token) == base + 3
+
+    first, second = broadcast(UserRole.CUSTOMER, "Holiday hours"), broadcast(UserRole.CUSTOMER, "New depot")
+    db.session.commit()
+    assert _unread(client, customer_token) == base + 5
+
+    client.patch(f"api/notifications/mark/{personal[0].id}/read", headers=headers)
+    client.patch(f"api/notifications/mark/{personal[0].id}/read", headers=headers)
+    client.patch(f"api/notifications/mark/{first.id}/read", headers=headers)
+    assert _unread(client, customer_token) == base + 3
+
+    client.delete(f"api/notifications/delete/{personal[1].id}", headers=headers)
+    client.delete(f"api/notifications/delete/{first.id}", headers=headers)  # already read
+    client.delete(f"api/notifications/delete/{second.id}", headers=headers)
+    assert _unread(client, customer_token) == base + 1
+
+    # Anything left unread after mark-all is dated after its watermark
+    client.patch("api/notifications/mark/read-all", headers=headers)
+    assert _unread(client, customer_token) == len([n for n in _feed(client, customer_token) if not n["is_read"]])
+
+
+def test_unread_count_skips_notifications_table_once_counted(client, customer_token, statement_recorder):
+    _unread(client, customer_token)
+    with statement_recorder() as statements:
+        _unread(client, customer_token)
+    assert statements
+    assert not [s for s in statements if "FROM notifications" in s or "JOIN notifications" in s]
+
+
+def test_broadcast_creates_a_missing_counter_once(db):
+    savepoint = db.session.begin_nested()
+    db.session.execute(delete(NotificationCounter).where(NotificationCounter.audience == UserRole.ADMIN))
+    broadcast(UserRole.ADMIN, "First alert")
+    # Another worker creating the row first is not an error
+    ensure_counter(UserRole.ADMIN)
+    broadcast(UserRole.ADMIN, "Second alert")
+    total = db.session.execute(
+        select(NotificationCounter.broadcast_total).where(NotificationCounter.audience == UserRole.ADMIN)
+    ).scalar_one()
+    assert total == 2
+    savepoint.rollback()
+
+
+def _events(chunks, count):
+    """Next `count` SSE events (id, event, data) from a streaming response, skipping heartbeats."""
+    found = []
+    for chunk in chunks:
+        fields = dict(line.split(": ", 1) for line in chunk.decode().strip().split("\n") if not line.startswith(":"))
+        if "event" in fields:
+            found.append((fields.get("id"), fields["event"], fields["data"]))
+            if len(found) == count:
+                return found
+    return found
+
+
+def test_stream_pushes_committed_notifications_and_status_changes(
+    app, client, db, customer_user, customer_token, admin_token, create_parcel
+):
+    app.config["SSE_HEARTBEAT"] = 0.05
+    headers = {"Authorization": f"Bearer {customer_token}"}
+    response = client.get("api/notifications/stream", headers=headers, buffered=False)
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+    chunks = iter(response.response)
+    assert next(chunks).startswith(b"retry:")
+
+    # Rolled back work is never published
+    notify(customer_user.id, "Never sent")
+    db.session.rollback()
+
+    client.post(f"/api/admin/parcels/{create_parcel.id}/status",
+                headers={"Authorization": f"Bearer {admin_token}"}, json={"status": "PICKED_UP"})
+    received = _events(chunks, 2)
+    assert sorted(event for _, event, _ in received) == ["notification", "parcel_status"]
+    assert "Never sent" not in str(received)
+    assert f'"status": "PICKED_UP"' in str(received)
+    response.close()
+
+    # Resuming replays only what came after Last-Event-ID
+    first_id = min(int(event_id) for event_id, _, _ in received)
+    response = client.get("api/notifications/stream", headers={**headers, "Last-Event-ID": str(first_id)},
+                          buffered=False)
+    chunks = iter(response.response)
+    next(chunks)
+    [(event_id, _, _)] = _events(chunks, 1)
+    assert int(event_id) == max(int(event_id) for event_id, _, _ in received)
+    response.close()
+    assert events.stats()["connections"] == 0
+    app.config["SSE_HEARTBEAT"] = TestingConfig.SSE_HEARTBEAT
+
+
+def test_stream_connection_cap(app, client, customer_token):
+    app.config["SSE_MAX_CONNECTIONS"] = 1
+    events.init_app(app)
+    try:
+        headers = {"Authorization": f"Bearer {customer_token}"}
+        first = client.get("api/notifications/stream", headers=headers, buffered=False)
+        assert first.status_code == 200
+        second = client.get(f"api/notifications/stream?jwt={customer_token}")
+        assert second.status_code == 503
+        assert second.headers["Retry-After"]
+        first.close()
+        third = client.get(f"api/notifications/stream?jwt={customer_token}", buffered=False)
+        assert third.status_code == 200
+        third.close()
+    finally:
+        app.config["SSE_MAX_CONNECTIONS"] = TestingConfig.SSE_MAX_CONNECTIONS
+        events.init_app(app)
+
+
+def test_stream_slots_are_freed_without_reading_the_body(app, client, customer_token):
+    headers = {"Authorization": f"Bearer {customer_token}"}
+    baseline = events.stats()["connections"]
+    for _ in range(3):
+        response = client.head("api/notifications/stream", headers=headers)
+        assert response.status_code == 405
+    assert events.stats()["connections"] == baseline
+
+    # Closed before the generator's first step, so its finally never runs
+    with app.test_request_context("/api/notifications/stream", headers=headers):
+        response = app.full_dispatch_request()
+        assert events.stats()["connections"] == baseline + 1
+        response.close()
+    assert events.stats()["connections"] == baseline
+
+
+def test_parcel_updates_coalesce_into_one_notification(client, db, customer_token, admin_token, create_parcel):
+    admin_headers = {"Authorization": f"Bearer {admin_token}"}
+    for status in ("PICKED_UP", "IN_TRANSIT", "OUT_FOR_DELIVERY"):
+        response = client.post(f"/api/admin/parcels/{create_parcel.id}/status", headers=admin_headers,
+                               json={"status": status})
+        assert response.status_code == 200
+
+    [item] = [n for n in _feed(client, customer_token) if create_parcel.tracking_id in n["message"]]
+    assert item["message"].endswith("OUT_FOR_DELIVERY") and item["event_count"] == 3
+    before = _unread(client, customer_token)
+
+    # Once read, the next update starts a new notification
+    client.patch(f"api/notifications/mark/{item['id']}/read", headers={"Authorization": f"Bearer {customer_token}"})
+    client.post(f"/api/admin/parcels/{create_parcel.id}/status", headers=admin_headers, json={"status": "DELIVERED"})
+    items = [n for n in _feed(client, customer_token) if create_parcel.tracking_id in n["message"]]
+    assert [n["event_count"] for n in items] == [1, 3]
+    assert _unread(client, customer_token) == before
+
+
+def test_admin_digest_summarises_parcel_events(app, client, db, admin_token, customer_token, sample_address, monkeypatch):
+    from app.utilis.parcel_events import send_admin_digest
+
+    monkeypatch.setitem(app.config, "ADMIN_DIGEST_INTERVAL", 900)
+    monkeypatch.setitem(app.config, "ADMIN_DIGEST_LAG", 0)
+    send_admin_digest(force=True)  # start from a clean watermark
+
+    headers = {"Authorization": f"Bearer {customer_token}"}
+    payload = {"pickup_address": sample_address, "delivery_address": sample_address, "weight_kg": 1.0}
+    tracking_ids = [client.post("/api/customer/parcels", headers=headers, json=payload).get_json()["data"]["tracking_id"]
+                    for _ in range(3)]
+    # No per-event alerts while digests are on
+    assert not [n for n in _feed(client, admin_token) if any(t in n["message"] for t in tracking_ids)]
+
+    assert send_admin_digest() is None  # interval not over yet
+    digest = send_admin_digest(force=True)
+    assert digest.event_count == 3 and digest.message.startswith("3 parcel events: 3 created")
+    assert all(t in digest.message for t in tracking_ids)
+    assert send_admin_digest(force=True) is None
+
+
+def test_first_admin_digest_covers_one_interval(app, client, db, customer_token, sample_address, monkeypatch):
+    from app.models import OutboxEvent
+    from app.utilis.parcel_events import send_admin_digest
+
+    monkeypatch.setitem(app.config, "ADMIN_DIGEST_INTERVAL", 900)
+    monkeypatch.setitem(app.config, "ADMIN_DIGEST_LAG", 0)
+    headers = {"Authorization": f"Bearer {customer_token}"}
+    payload = {"pickup_address": sample_address, "delivery_address": sample_address, "weight_kg": 1.0}
+    old, recent = [client.post("/api/customer/parcels", headers=headers, json=payload).get_json()["data"]
+                   for _ in range(2)]
+    # Everything but the recent parcel predates the interval
+    for event in OutboxEvent.query.all():
+        if recent["tracking_id"] not in str(event.payload):
+            event.created_at = datetime.now(timezone.utc) - timedelta(days=2)
+    ensure_counter(UserRole.ADMIN)
+    db.session.get(NotificationCounter, UserRole.ADMIN).digested_until = None
+    db.session.commit()
+
+    digest = send_admin_digest()
+    assert digest.event_count == 1
+    assert recent["tracking_id"] in digest.message and old["tracking_id"] not in digest.message
@@ -0,0 +1,114 @@
+from datetime import timedelta
+from app.extensions import events
+from app.models import Notification, OutboxEvent
+from app.utilis import outbox
+from app.utilis.notification_service import notify
+from app.utilis.parcel_events import PARCEL_STATUS_CHANGED
+
+
+def _notifications(tracking_id):
+    return Notification.query.filter(Notification.message.contains(tracking_id)).all()
+
+
+def test_parcel_events_are_applied_by_the_worker(async_outbox, client, admin_token, create_parcel):
+    response = client.post(f"/api/admin/parcels/{create_parcel.id}/status",
+                           headers={"Authorization": f"Bearer {admin_token}"}, json={"status": "PICKED_UP"})
+    assert response.status_code == 200
+
+    # Committed with the status change, notifications not created yet
+    [event] = OutboxEvent.query.filter(OutboxEvent.payload["parcel_id"].as_string() == str(create_parcel.id)).all()
+    assert event.type == PARCEL_STATUS_CHANGED and event.processed_at is None
+    assert _notifications(create_parcel.tracking_id) == []
+
+    processed, failed = outbox.drain()
+    assert processed >= 1 and failed == 0
+    [notification] = _notifications(create_parcel.tracking_id)
+    assert notification.user_id == create_parcel.customer_id
+    assert "PICKED_UP" in notification.message
+    assert OutboxEvent.query.get(event.id).processed_at is not None
+
+    # Already processed events are not delivered twice
+    outbox.drain()
+    assert len(_notifications(create_parcel.tracking_id)) == 1
+
+
+def test_failed_events_are_retried_with_backoff(async_outbox, db, monkeypatch):
+    calls = []
+
+    def flaky(payload):
+        calls.append(payload)
+        if len(calls) == 1:
+            raise RuntimeError("mail server down")
+
+    monkeypatch.setitem(outbox.HANDLERS, "test.flaky", flaky)
+    event = outbox.record("test.flaky", {"n": 1})
+    db.session.commit()
+
+    assert outbox.process_batch() == (0, 1)
+    db.session.refresh(event)
+    assert event.attempts == 1 and "mail server down" in event.last_error
+    assert event.processed_at is None
+
+    # Not due again until its backoff has passed
+    assert outbox.process_batch() == (0, 0)
+    event.available_at = event.created_at
+    db.session.commit()
+    assert outbox.process_batch() == (1, 0)
+    assert len(calls) == 2
+
+
+def test_failed_event_keeps_earlier_events_stream_updates(async_outbox, app, db, customer_user, monkeypatch):
+    def sends(payload):
+        notify(customer_user.id, payload["message"])
+
+    def fails(payload):
+        notify(customer_user.id, payload["message"])
+        raise RuntimeError("boom")
+
+    monkeypatch.setitem(outbox.HANDLERS, "test.sends", sends)
+    monkeypatch.setitem(outbox.HANDLERS, "test.fails", fails)
+    delivered = outbox.record("test.sends", {"message": "Delivered"})
+    failing = outbox.record("test.fails", {"message": "Rolled back"})
+    db.session.flush()
+    # Run the failing handler second, in the same batch
+    delivered.available_at = failing.available_at - timedelta(seconds=1)
+    db.session.commit()
+
+    subscription = events.subscribe([f"user:{customer_user.id}"])
+    try:
+        # A released savepoint is not a commit
+        with db.session.begin_nested():
+            notify(customer_user.id, "Outer rollback")
+        db.session.rollback()
+
+        processed, failed = outbox.drain()
+        assert processed >= 1 and failed >= 1
+        received = []
+        while (evt := subscription.get(timeout=0.5)) is not None:
+            received.append(str(evt))
+    finally:
+        subscription.close()
+        db.session.delete(failing)
+        db.session.commit()
+    assert any("Delivered" in evt for evt in received)
+    assert not any("Rolled back" in evt or "Outer rollback" in evt for evt in received)
+
+
+def test_failed_savepoint_still_wakes_the_worker(async_outbox, db, monkeypatch):
+    wakes = []
+    monkeypatch.setattr(outbox.OutboxWorker, "wake", lambda self: wakes.append(True))
+    monkeypatch.setitem(outbox.HANDLERS, "test.noop", lambda payload: None)
+
+    event = outbox.record("test.noop", {})
+    db.session.flush()
+    try:
+        with db.session.begin_nested():
+            db.session.add(OutboxEvent(type="test.noop", payload={}))
+            raise RuntimeError("boom")
+    except RuntimeError:
+        pass
+    assert wakes == []
+    db.session.commit()
+    assert wakes == [True]
+    outbox.drain()
+    assert OutboxEvent.query.get(event.id).processed_at is not None
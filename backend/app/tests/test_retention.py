@@ -0,0 +1,64 @@
+import gzip
+import json
+from datetime import datetime, timedelta, timezone
+from app.models import Notification, NotificationArchive, NotificationType, UserRole
+from app.utilis import notification_service
+from app.utilis.retention import prune_notifications
+
+OLD = datetime.now(timezone.utc) - timedelta(days=400)
+
+
+def _seed(db, user):
+    user.created_at = OLD - timedelta(days=1)  # old enough to see the old broadcast
+    rows = {
+        "old_read": Notification(user_id=user.id, message="old read", type=NotificationType.INFO,
+                                 is_read=True, created_at=OLD),
+        "old_unread": Notification(user_id=user.id, message="old unread", type=NotificationType.INFO,
+                                   is_read=False, created_at=OLD),
+        "old_kept_type": Notification(user_id=user.id, message="old parcel", type=NotificationType.PARCEL_UPDATE,
+                                      is_read=True, created_at=OLD),
+        "new_read": Notification(user_id=user.id, message="new read", type=NotificationType.INFO, is_read=True),
+        "old_broadcast": Notification(audience=UserRole.CUSTOMER, message="old broadcast",
+                                      type=NotificationType.INFO, created_at=OLD),
+    }
+    db.session.add_all(rows.values())
+    db.session.commit()
+    return {name: n.id for name, n in rows.items()}
+
+
+def test_prune_archives_expired_read_notifications_in_batches(app, db, customer_user, monkeypatch):
+    monkeypatch.setitem(app.config, "NOTIFICATION_RETENTION_DAYS", {"INFO": 30, "PARCEL_UPDATE": None})
+    ids = _seed(db, customer_user)
+    unread_before = notification_service.unread_count(customer_user)
+
+    dry = prune_notifications(dry_run=True)
+    assert dry["archived"]["INFO"] >= 2
+    assert Notification.query.get(ids["old_read"]) is not None
+
+    report = prune_notifications(batch_size=1)
+    assert report["archived"]["INFO"] == dry["archived"]["INFO"]
+    assert report["batches"] == report["rows_removed"]
+    assert report["rows_before"] >= 5
+
+    remaining = {n.id for n in Notification.query.filter(Notification.id.in_(ids.values()))}
+    assert remaining == {ids["old_unread"], ids["old_kept_type"], ids["new_read"]}
+    archived = NotificationArchive.query.get(ids["old_read"])
+    assert archived.message == "old read" and archived.user_id == customer_user.id
+    assert NotificationArchive.query.get(ids["old_broadcast"]).audience == UserRole.CUSTOMER
+
+    # The user's badge stays consistent after their broadcast was dropped
+    assert notification_service.unread_count(customer_user) == unread_before - 1
+
+
+def test_prune_to_file_archive(app, db, customer_user, monkeypatch, tmp_path):
+    monkeypatch.setitem(app.config, "NOTIFICATION_ARCHIVE", "file")
+    monkeypatch.setitem(app.config, "NOTIFICATION_ARCHIVE_PATH", str(tmp_path))
+    ids = _seed(db, customer_user)
+
+    report = prune_notifications()
+    assert report["archive"] == "file"
+    [path] = tmp_path.iterdir()
+    with gzip.open(path, "rt") as f:
+        archived = {json.loads(line)["id"] for line in f}
+    assert {str(ids["old_read"]), str(ids["old_kept_type"]), str(ids["old_broadcast"])} <= archived
+    assert NotificationArchive.query.get(ids["old_read"]) is None
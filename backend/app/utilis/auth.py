@@ -1,48 +1,107 @@
 # app/utils/auth.py
 import uuid
 from functools import wraps
+from flask import abort, make_response, request
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
+from ..extensions import identity_cache
 from ..models import User, UserRole
+from .identity import IDENTITY_FIELDS
+
+class CurrentUser:
+    """
+    The authenticated user handed to protected views. `id` and `role` are
+    checked by _authorize, profile fields come from the identity cache; the
+    User row itself is only loaded when the view calls get() or reads
+    anything else.
+    """
+
+    def __init__(self, user_id, role, user=None):
+        self.id = user_id
+        self.role = role
+        self._user = user
+
+    def get(self):
+        if self._user is None:
+            user = User.query.get(self.id)
+            if user is None:
+                abort(make_response({"msg": "User not found"}, 401))
+            identity_cache.set(user)
+            self._user = user
+        return self._user
+
+    def __getattr__(self, name):
+        if name in IDENTITY_FIELDS:
+            if self._user is not None:
+                return getattr(self._user, name)
+            snapshot = identity_cache.get(self.id)
+            if snapshot is not None:
+                return snapshot[name]
+        return getattr(self.get(), name)
+
+
+def _authorize(role, load=False):
+    """
+    Returns (CurrentUser, None) or (None, error response). A token whose role
+    claim doesn't match is denied without a lookup. Otherwise the role is
+    checked against the user's identity snapshot: cached, or loaded (and
+    cached) from the database on a miss, so a deleted or demoted user loses
+    access once the change is committed (in other workers within
+    IDENTITY_CACHE_TTL). With `load` the row is always read, so writes never
+    act for a user that no longer exists.
+    """
+    try:
+        user_uuid = uuid.UUID(get_jwt_identity())
+    except (ValueError, TypeError):
+        return None, ({"msg": "Invalid user ID"}, 400)
+
+    denied = {"msg": f"{role.value.capitalize()} access only"}, 403
+    claim = get_jwt().get("role")
+    if claim is not None and claim != role.value:
+        return None, denied
+
+    user = None
+    snapshot = None if load else identity_cache.get(user_uuid)
+    if snapshot is None:
+        user = User.query.get(user_uuid)
+        if user is None:
+            return None, ({"msg": "User not found"}, 401)
+        snapshot = identity_cache.set(user)
+    if snapshot["role"] != role.value:
+        return None, denied
+    return CurrentUser(user_uuid, role, user), None
+
+
+def _is_write():
+    return request.method not in ("GET", "HEAD", "OPTIONS")
+
 
 def jwt_required_customer(fn):
     """
     Protects routes so only CUSTOMER role can access.
-    Passes current_user to the route function.
+    Passes current_user (a lazily loaded CurrentUser) to the route function.
     """
     @wraps(fn)
     @jwt_required()
     def wrapper(*args, **kwargs):
-        user_id = get_jwt_identity()
-        try:
-            user_uuid = uuid.UUID(user_id)
-        except (ValueError, TypeError):
-            return {"msg": "Invalid user ID"}, 400
-
-        user = User.query.get(user_uuid)
-        if not user or user.role != UserRole.CUSTOMER:
-            return {"msg": "Customer access only"}, 403
-        return fn(user, *args, **kwargs)
+        current_user, error = _authorize(UserRole.CUSTOMER, load=_is_write())
+        if error:
+            return error
+        return fn(current_user, *args, **kwargs)
     return wrapper
 
 
 def jwt_required_admin(fn):
     """
     Protects routes so only ADMIN role can access.
-    Passes current_user to the route function.
+    Passes current_user (a lazily loaded CurrentUser) to the route function.
     """
     @wraps(fn)
     @jwt_required()
     def wrapper(*args, **kwargs):
-        user_id = get_jwt_identity()
-        try:
-            user_uuid = uuid.UUID(user_id)
-        except (ValueError, TypeError):
-            return {"msg": "Invalid user ID"}, 400
-
-        user = User.query.get(user_uuid)
-        if not user or user.role != UserRole.ADMIN:
-            return {"msg": "Admin access only"}, 403
-        return fn(user, *args, **kwargs)
+        current_user, error = _authorize(UserRole.ADMIN, load=_is_write())
+        if error:
+            return error
+        return fn(current_user, *args, **kwargs)
     return wrapper
 
 
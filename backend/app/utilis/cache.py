@@ -0,0 +1,247 @@
+# app/utilis/cache.py
+import asyncio
+import itertools
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+
+
+class MemoryCache:
+    """
+    In-process LRU cache with a per-entry TTL.
+    Each gunicorn worker holds its own copy.
+    """
+
+    blocking = False
+
+    def __init__(self, max_entries=1024, ttl=3600):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, ttl=None):
+        expires_at = time.monotonic() + (ttl if ttl is not None else self.ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self):
+        return {
+            "backend": "memory",
+            "entries": len(self._data),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class SQLiteCache:
+    """
+    LRU + TTL cache stored in a local SQLite file, so every gunicorn
+    worker on the host shares the same entries. Values must be JSON
+    serializable. Hit/miss counters are per process. Least recently used
+    entries are trimmed every `trim_every` writes of a process, so the file
+    may briefly hold a few entries over max_entries.
+    """
+
+    # Disk I/O: asyncio callers run it on a thread
+    blocking = True
+
+    def __init__(self, path, max_entries=10000, ttl=3600, trim_every=64):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.trim_every = trim_every
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._writes = itertools.count(1)
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " key TEXT PRIMARY KEY,"
+                " value TEXT NOT NULL,"
+                " expires_at REAL NOT NULL,"
+                " accessed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_cache_accessed_at ON cache (accessed_at)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute("SELECT value, expires_at FROM cache WHERE key = ?", (key,)).fetchone()
+        if row is None or row[1] <= now:
+            if row is not None:
+                conn.execute("DELETE FROM cache WHERE key = ?", (key,))
+            self.misses += 1
+            return None
+        conn.execute("UPDATE cache SET accessed_at = ? WHERE key = ?", (now, key))
+        self.hits += 1
+        return json.loads(row[0])
+
+    def set(self, key, value, ttl=None):
+        conn = self._connect()
+        now = time.time()
+        expires_at = now + (ttl if ttl is not None else self.ttl)
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(value), expires_at, now),
+        )
+        if next(self._writes) % self.trim_every == 0:
+            self.trim()
+
+    def trim(self):
+        """Drops all but the max_entries most recently used entries."""
+        evicted = self._connect().execute(
+            "DELETE FROM cache WHERE key NOT IN "
+            "(SELECT key FROM cache ORDER BY accessed_at DESC LIMIT ?)",
+            (self.max_entries,),
+        ).rowcount
+        self.evictions += max(evicted, 0)
+
+    def delete(self, key):
+        self._connect().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def clear(self):
+        self._connect().execute("DELETE FROM cache")
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+
+    def stats(self):
+        return {
+            "backend": "sqlite",
+            "entries": len(self),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+CACHE_BACKENDS = {
+    "memory": MemoryCache,
+    "sqlite": SQLiteCache,
+}
+
+
+def route_key(o_lat, o_lng, d_lat, d_lng, precision=4):
+    """
+    Buckets origin/destination onto a grid of `precision` decimal places
+    (4 places ~ 11 m), so nearby repeat lookups share one cache entry.
+    """
+    return "route:{:.{p}f},{:.{p}f};{:.{p}f},{:.{p}f}".format(
+        o_lat, o_lng, d_lat, d_lng, p=precision
+    )
+
+
+class RouteCache:
+    """
+    Flask extension holding the route cache backend selected by
+    ROUTE_CACHE_BACKEND ("memory" or "sqlite").
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        backend_name = app.config.get("ROUTE_CACHE_BACKEND", "memory")
+        try:
+            backend_cls = CACHE_BACKENDS[backend_name]
+        except KeyError:
+            raise ValueError(f"Unknown ROUTE_CACHE_BACKEND: {backend_name}")
+
+        kwargs = {
+            "max_entries": app.config.get("ROUTE_CACHE_MAX_ENTRIES", 1024),
+            "ttl": app.config.get("ROUTE_CACHE_TTL", 3600),
+        }
+        if backend_cls is SQLiteCache:
+            kwargs["path"] = app.config.get("ROUTE_CACHE_PATH") or os.path.join(
+                app.instance_path, "route_cache.sqlite3"
+            )
+        app.extensions["route_cache"] = backend_cls(**kwargs)
+
+    @property
+    def backend(self):
+        return current_app.extensions["route_cache"]
+
+    def key(self, o_lat, o_lng, d_lat, d_lng):
+        precision = current_app.config.get("ROUTE_CACHE_PRECISION", 4)
+        return route_key(o_lat, o_lng, d_lat, d_lng, precision)
+
+    def get(self, key):
+        return self.backend.get(key)
+
+    def set(self, key, value, ttl=None):
+        self.backend.set(key, value, ttl)
+
+    async def get_async(self, key):
+        """get() for the asyncio maps API; blocking backends run on a thread."""
+        backend = self.backend
+        if backend.blocking:
+            return await asyncio.to_thread(backend.get, key)
+        return backend.get(key)
+
+    async def set_async(self, key, value, ttl=None):
+        backend = self.backend
+        if backend.blocking:
+            return await asyncio.to_thread(backend.set, key, value, ttl)
+        return backend.set(key, value, ttl)
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        return self.backend.stats()
@@ -0,0 +1,430 @@
+# app/utilis/events.py
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from flask import current_app, has_app_context
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+
+class StreamLimitReached(Exception):
+    """Raised when this worker already holds SSE_MAX_CONNECTIONS streams."""
+
+    def __init__(self, message, retry_after=5):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def user_channels(user):
+    """Channels a user's stream listens on: their own and their role's."""
+    return (f"user:{user.id}", f"role:{user.role.value}")
+
+
+class Subscription:
+    """
+    One open stream. The broker puts matching events on its queue; if the
+    client falls QUEUE_SIZE events behind the subscription is marked
+    overflowed and the stream ends so the client resumes with Last-Event-ID.
+    """
+
+    QUEUE_SIZE = 256
+
+    def __init__(self, broker, channels):
+        self.broker = broker
+        self.channels = frozenset(channels)
+        self.overflowed = False
+        self._queue = queue.Queue(maxsize=self.QUEUE_SIZE)
+
+    def put(self, evt):
+        try:
+            self._queue.put_nowait(evt)
+        except queue.Full:
+            self.overflowed = True
+
+    def get(self, timeout):
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        # Safe to call twice: from the stream's finally and the response's close
+        self.broker.unsubscribe(self)
+
+
+class _Fanout:
+    """Delivers published events to this worker's subscriptions, up to max_connections."""
+
+    def __init__(self, max_connections=50):
+        self.max_connections = max_connections
+        self.published = 0
+        self.delivered = 0
+        self.rejected = 0
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self, channels):
+        with self._lock:
+            if len(self._subscribers) >= self.max_connections:
+                self.rejected += 1
+                raise StreamLimitReached("Too many open notification streams")
+            subscription = Subscription(self, channels)
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def _dispatch(self, evt):
+        with self._lock:
+            targets = [s for s in self._subscribers if evt["channel"] in s.channels]
+            self.delivered += len(targets)
+        for subscription in targets:
+            subscription.put(evt)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "connections": len(self._subscribers),
+                "max_connections": self.max_connections,
+                "published": self.published,
+                "delivered": self.delivered,
+                "rejected": self.rejected,
+            }
+
+
+class MemoryBroker(_Fanout):
+    """
+    In-process broker: events only reach streams held by the same worker.
+    The last `history` events are kept for Last-Event-ID replay.
+    """
+
+    def __init__(self, history=1000, max_connections=50):
+        super().__init__(max_connections)
+        self._history = deque(maxlen=history)
+        self._last_id = 0
+
+    def publish(self, channel, event_type, data):
+        with self._lock:
+            self._last_id += 1
+            evt = {"id": self._last_id, "channel": channel, "event": event_type, "data": data}
+            self._history.append(evt)
+            self.published += 1
+        self._dispatch(evt)
+        return evt
+
+    def replay(self, channels, after_id):
+        """
+        Events on `channels` newer than `after_id`, or None if some were
+        already dropped or `after_id` came from before a restart.
+        """
+        with self._lock:
+            history = list(self._history)
+            last_id = self._last_id
+        if after_id > last_id or (history and history[0]["id"] > after_id + 1):
+            return None
+        return [evt for evt in history if evt["id"] > after_id and evt["channel"] in channels]
+
+    def stats(self):
+        return {"backend": "memory", **super().stats(), "history": len(self._history)}
+
+    def shutdown(self):
+        pass
+
+
+class SQLiteBroker(_Fanout):
+    """
+    Broker backed by an append-only table in a local SQLite file, so every
+    gunicorn worker on the host sees every event. Each worker tails the
+    table from one background thread (started on its first subscriber)
+    every `poll_interval` seconds. Event ids come from the table and are
+    shared by all workers, so Last-Event-ID resumes on any of them.
+    """
+
+    def __init__(self, path, history=1000, max_connections=50, poll_interval=0.5):
+        super().__init__(max_connections)
+        self.path = path
+        self.history = history
+        self.poll_interval = poll_interval
+        self._local = threading.local()
+        self._poller = None
+        self._pid = None
+        self._stop = threading.Event()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS events ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " channel TEXT NOT NULL,"
+            " type TEXT NOT NULL,"
+            " data TEXT NOT NULL,"
+            " created_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS ix_events_channel_id ON events (channel, id)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _row(row):
+        return {"id": row[0], "channel": row[1], "event": row[2], "data": json.loads(row[3])}
+
+    def publish(self, channel, event_type, data):
+        conn = self._connect()
+        cursor = conn.execute(
+            "INSERT INTO events (channel, type, data, created_at) VALUES (?, ?, ?, ?)",
+            (channel, event_type, json.dumps(data), time.time()),
+        )
+        event_id = cursor.lastrowid
+        if event_id % 100 == 0:
+            conn.execute("DELETE FROM events WHERE id <= ?", (event_id - self.history,))
+        with self._lock:
+            self.published += 1
+        # Delivered to local streams by the poller, like everyone else's events
+        return {"id": event_id, "channel": channel, "event": event_type, "data": data}
+
+    def replay(self, channels, after_id):
+        conn = self._connect()
+        oldest, newest = conn.execute("SELECT MIN(id), COALESCE(MAX(id), 0) FROM events").fetchone()
+        if after_id > newest or (oldest is not None and oldest > after_id + 1):
+            return None
+        placeholders = ",".join("?" * len(channels))
+        rows = conn.execute(
+            f"SELECT id, channel, type, data FROM events WHERE id > ? AND channel IN ({placeholders}) ORDER BY id",
+            (after_id, *channels),
+        ).fetchall()
+        return [self._row(row) for row in rows]
+
+    def subscribe(self, channels):
+        subscription = super().subscribe(channels)
+        with self._lock:
+            # A poller inherited across gunicorn's fork is not running here
+            if self._poller is None or self._pid != os.getpid():
+                self._stop.clear()
+                self._pid = os.getpid()
+                start_id = self._connect().execute("SELECT COALESCE(MAX(id), 0) FROM events").fetchone()[0]
+                self._poller = threading.Thread(
+                    target=self._poll, args=(start_id,), name="event-broker-poll", daemon=True
+                )
+                self._poller.start()
+        return subscription
+
+    def _poll(self, last_id):
+        conn = self._connect()
+        while not self._stop.wait(self.poll_interval):
+            rows = conn.execute(
+                "SELECT id, channel, type, data FROM events WHERE id > ? ORDER BY id", (last_id,)
+            ).fetchall()
+            for row in rows:
+                self._dispatch(self._row(row))
+                last_id = row[0]
+
+    def stats(self):
+        return {"backend": "sqlite", **super().stats()}
+
+    def shutdown(self):
+        self._stop.set()
+
+
+BROKER_BACKENDS = {
+    "memory": MemoryBroker,
+    "sqlite": SQLiteBroker,
+}
+
+
+def _format(evt):
+    return f"id: {evt['id']}\nevent: {evt['event']}\ndata: {json.dumps(evt['data'])}\n\n"
+
+
+def sse_stream(subscription, last_event_id=None, heartbeat=15, max_duration=300, retry_ms=3000):
+    """
+    Yields a text/event-stream for `subscription`: anything missed since
+    `last_event_id` first (or a "resync" event if that is no longer
+    retained), then live events, with a comment line every `heartbeat`
+    seconds of silence. Ends after `max_duration` seconds so the client
+    reconnects and the worker thread is recycled. Needs no app context.
+    """
+    deadline = time.monotonic() + max_duration
+    sent = last_event_id or 0
+    try:
+        yield f"retry: {retry_ms}\n\n"
+        if last_event_id is not None:
+            missed = subscription.broker.replay(subscription.channels, last_event_id)
+            if missed is None:
+                # Client should refetch its feed; ids may have restarted
+                yield "event: resync\ndata: {}\n\n"
+                sent, missed = 0, []
+            for evt in missed:
+                sent = evt["id"]
+                yield _format(evt)
+        while not subscription.overflowed:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            evt = subscription.get(timeout=min(heartbeat, remaining))
+            if evt is None:
+                yield ": heartbeat\n\n"
+            elif evt["id"] > sent:
+                sent = evt["id"]
+                yield _format(evt)
+    finally:
+        subscription.close()
+
+
+class EventBroker:
+    """
+    Flask extension holding the broker selected by EVENT_BROKER_BACKEND
+    ("memory" for one worker, "sqlite" to share events between the workers
+    on a host).
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        backend_name = app.config.get("EVENT_BROKER_BACKEND", "memory")
+        try:
+            backend_cls = BROKER_BACKENDS[backend_name]
+        except KeyError:
+            raise ValueError(f"Unknown EVENT_BROKER_BACKEND: {backend_name}")
+
+        kwargs = {
+            "history": app.config.get("EVENT_HISTORY", 1000),
+            "max_connections": app.config.get("SSE_MAX_CONNECTIONS", 50),
+        }
+        if backend_cls is SQLiteBroker:
+            kwargs["path"] = app.config.get("EVENT_BROKER_PATH") or os.path.join(
+                app.instance_path, "events.sqlite3"
+            )
+            kwargs["poll_interval"] = app.config.get("EVENT_POLL_INTERVAL", 0.5)
+        old = app.extensions.get("event_broker")
+        if old:
+            old.shutdown()
+        app.extensions["event_broker"] = backend_cls(**kwargs)
+
+    @property
+    def backend(self):
+        return current_app.extensions["event_broker"]
+
+    def publish(self, channel, event_type, data):
+        return self.backend.publish(channel, event_type, data)
+
+    def subscribe(self, channels):
+        return self.backend.subscribe(channels)
+
+    def stream(self, subscription, last_event_id=None):
+        config = current_app.config
+        return sse_stream(
+            subscription,
+            last_event_id,
+            heartbeat=config.get("SSE_HEARTBEAT", 15),
+            max_duration=config.get("SSE_MAX_DURATION", 300),
+            retry_ms=config.get("SSE_RETRY_MS", 3000),
+        )
+
+    def stats(self):
+        return self.backend.stats()
+
+
+# Publish new notifications and parcel status changes only once committed.
+# Payloads are captured at flush time since commit expires the rows.
+def _pending(target):
+    session = Session.object_session(target)
+    return session.info.setdefault("events_pending", []) if session is not None else None
+
+
+def _notification_updated(mapper, connection, target):
+    # Only a coalesced notification being rewritten is news to the client
+    if inspect(target).attrs.message.history.has_changes():
+        _notification_inserted(mapper, connection, target)
+
+
+def _notification_inserted(mapper, connection, target):
+    pending = _pending(target)
+    if pending is None:
+        return
+    # Enum columns may still hold the raw string they were assigned
+    audience = getattr(target.audience, "value", target.audience)
+    channel = f"user:{target.user_id}" if target.user_id else f"role:{audience}"
+    pending.append((channel, "notification", {
+        "id": str(target.id),
+        "message": target.message,
+        "type": getattr(target.type, "value", target.type),
+        "is_read": False,
+        "created_at": (target.created_at or datetime.now(timezone.utc)).isoformat(),
+        "broadcast": target.user_id is None,
+        "event_count": target.event_count or 1,
+    }))
+
+
+def _parcel_updated(mapper, connection, target):
+    if not inspect(target).attrs.status.history.has_changes():
+        return
+    pending = _pending(target)
+    if pending is None:
+        return
+    data = {
+        "parcel_id": str(target.id),
+        "tracking_id": target.tracking_id,
+        "status": target.status.value,
+        "updated_at": target.updated_at.isoformat() if target.updated_at else None,
+    }
+    pending.append((f"user:{target.customer_id}", "parcel_status", data))
+    pending.append(("role:ADMIN", "parcel_status", data))
+
+
+def _mark_savepoint(session, transaction):
+    # Remember where a savepoint started so rolling it back only drops its own events
+    if transaction.nested:
+        marks = session.info.setdefault("events_savepoints", {})
+        marks[transaction] = len(session.info.get("events_pending", ()))
+
+
+def _apply_pending(session):
+    # Also called when a savepoint is released; wait for the outer commit
+    if session.in_nested_transaction():
+        return
+    session.info.pop("events_savepoints", None)
+    pending = session.info.pop("events_pending", None)
+    if pending and has_app_context() and "event_broker" in current_app.extensions:
+        broker = EventBroker()
+        for channel, event_type, data in pending:
+            try:
+                broker.publish(channel, event_type, data)
+            except Exception:
+                # Clients still see the change on their next fetch
+                current_app.logger.exception("Failed to publish %s event", event_type)
+
+
+def _discard_pending(session, previous_transaction):
+    if previous_transaction.nested:
+        mark = session.info.get("events_savepoints", {}).pop(previous_transaction, None)
+        if mark is not None:
+            del session.info.get("events_pending", [])[mark:]
+        return
+    session.info.pop("events_savepoints", None)
+    session.info.pop("events_pending", None)
+
+
+def register_stream_events(notification_model, parcel_model):
+    event.listen(notification_model, "after_insert", _notification_inserted)
+    event.listen(notification_model, "after_update", _notification_updated)
+    event.listen(parcel_model, "after_update", _parcel_updated)
+    event.listen(Session, "after_transaction_create", _mark_savepoint)
+    event.listen(Session, "after_commit", _apply_pending)
+    event.listen(Session, "after_soft_rollback", _discard_pending)
@@ -0,0 +1,234 @@
+# app/utilis/geoindex.py
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from math import cos, radians, floor, ceil
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.utilis.routing import haversine_km
+
+METERS_PER_DEG = 111320.0
+
+
+class GridIndex:
+    """
+    Uniform lat/lng grid of points. Cells are `cell_m` metres tall, so a
+    radius query only scans the handful of cells around the target.
+    """
+
+    def __init__(self, cell_m=100):
+        self.cell_deg = cell_m / METERS_PER_DEG
+        self._cells = {}
+        self._by_id = {}
+        self._lock = threading.Lock()
+
+    def _cell(self, lat, lng):
+        return floor(lat / self.cell_deg), floor(lng / self.cell_deg)
+
+    def add(self, key, lat, lng, value):
+        with self._lock:
+            self._remove(key)
+            cell = self._cell(lat, lng)
+            self._cells.setdefault(cell, {})[key] = (lat, lng, value)
+            self._by_id[key] = cell
+
+    def remove(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key):
+        cell = self._by_id.pop(key, None)
+        if cell is not None:
+            bucket = self._cells.get(cell)
+            bucket.pop(key, None)
+            if not bucket:
+                del self._cells[cell]
+
+    def nearest(self, lat, lng, radius_m):
+        """Closest (distance_m, value) within radius_m, or None."""
+        row, col = self._cell(lat, lng)
+        span_lat = ceil(radius_m / METERS_PER_DEG / self.cell_deg)
+        # Longitude degrees shrink towards the poles, so widen the column span
+        span_lng = ceil(span_lat / max(cos(radians(lat)), 0.01))
+
+        best = None
+        with self._lock:
+            for r in range(row - span_lat, row + span_lat + 1):
+                for c in range(col - span_lng, col + span_lng + 1):
+                    for p_lat, p_lng, value in self._cells.get((r, c), {}).values():
+                        dist_m = haversine_km(lat, lng, p_lat, p_lng) * 1000
+                        if dist_m <= radius_m and (best is None or dist_m < best[0]):
+                            best = (dist_m, value)
+        return best
+
+    def __len__(self):
+        return len(self._by_id)
+
+
+def _address_entry(address):
+    # Locality only: street text of customer addresses must not leak through
+    # the public endpoint
+    return {
+        "city": address.city or "",
+        "country": address.country or "",
+    }
+
+
+_refresher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="address-index")
+
+
+class AddressIndex:
+    """
+    Flask extension keeping a per-worker GridIndex of geocoded Address rows
+    for local reverse geocoding. Built on first use, updated as addresses are
+    committed in this worker, and rebuilt off the request thread every
+    GEOCODE_INDEX_REFRESH seconds to pick up rows written by other workers;
+    lookups keep using the current index meanwhile.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions["address_index"] = {
+            "index": None, "built_at": 0.0, "refreshing": False, "lock": threading.Lock(),
+        }
+
+    @property
+    def _state(self):
+        return current_app.extensions["address_index"]
+
+    def _build(self):
+        from app.models import Address
+
+        index = GridIndex(cell_m=current_app.config.get("GEOCODE_LOCAL_RADIUS_M", 50) * 2)
+        rows = Address.query.with_entities(
+            Address.id, Address.city, Address.country, Address.lat, Address.lng
+        ).filter(Address.lat.isnot(None), Address.lng.isnot(None))
+        for row in rows:
+            index.add(row.id, float(row.lat), float(row.lng), _address_entry(row))
+        return index
+
+    def get_index(self):
+        state = self._state
+        if state["index"] is None:
+            with state["lock"]:
+                if state["index"] is None:
+                    state["index"] = self._build()
+                    state["built_at"] = time.monotonic()
+        elif time.monotonic() - state["built_at"] > current_app.config.get("GEOCODE_INDEX_REFRESH", 600):
+            self._schedule_refresh()
+        return state["index"]
+
+    def _schedule_refresh(self):
+        """
+        Rebuilds the index off the request thread, one rebuild at a time.
+        With GEOCODE_INDEX_REFRESH_ASYNC disabled (tests) it runs inline.
+        """
+        state = self._state
+        with state["lock"]:
+            if state["refreshing"]:
+                return None
+            state["refreshing"] = True
+        app = current_app._get_current_object()
+        if not app.config.get("GEOCODE_INDEX_REFRESH_ASYNC", True):
+            return self._refresh()
+        return _refresher.submit(self._refresh_in_background, app)
+
+    def _refresh(self):
+        state = self._state
+        try:
+            state["index"] = self._build()
+        finally:
+            # On failure, keep serving the old index until the next interval
+            state["built_at"] = time.monotonic()
+            state["refreshing"] = False
+
+    def _refresh_in_background(self, app):
+        from app.extensions import db
+
+        with app.app_context():
+            try:
+                self._refresh()
+            except Exception:
+                app.logger.exception("Failed to rebuild the address index")
+            finally:
+                db.session.remove()
+
+    def lookup(self, lat, lng):
+        radius = current_app.config.get("GEOCODE_LOCAL_RADIUS_M", 50)
+        hit = self.get_index().nearest(lat, lng, radius)
+        return hit[1] if hit else None
+
+    def apply(self, changes):
+        """Applies committed (id, lat, lng, entry) changes to an already-built index."""
+        index = self._state["index"]
+        if index is None:
+            return
+        for address_id, lat, lng, entry in changes:
+            if entry is None:
+                index.remove(address_id)
+            else:
+                index.add(address_id, lat, lng, entry)
+
+    def reset(self):
+        self._state["index"] = None
+
+
+# Track address writes per session and apply them to the index only once
+# committed. Values are captured at flush time since commit expires the rows.
+def _track(target, deleted):
+    session = Session.object_session(target)
+    if session is None:
+        return
+    if deleted or target.lat is None or target.lng is None:
+        change = (target.id, None, None, None)
+    else:
+        change = (target.id, float(target.lat), float(target.lng), _address_entry(target))
+    session.info.setdefault("geoindex_pending", []).append(change)
+
+
+def _after_write(mapper, connection, target):
+    _track(target, deleted=False)
+
+
+def _after_delete(mapper, connection, target):
+    _track(target, deleted=True)
+
+
+def _mark_savepoint(session, transaction):
+    # Remember where a savepoint started so rolling it back only drops its own changes
+    if transaction.nested:
+        marks = session.info.setdefault("geoindex_savepoints", {})
+        marks[transaction] = len(session.info.get("geoindex_pending", ()))
+
+
+def _apply_pending(session):
+    # Also called when a savepoint is released; wait for the outer commit
+    if session.in_nested_transaction():
+        return
+    session.info.pop("geoindex_savepoints", None)
+    pending = session.info.pop("geoindex_pending", None)
+    if pending and has_app_context() and "address_index" in current_app.extensions:
+        AddressIndex().apply(pending)
+
+
+def _discard_pending(session, previous_transaction):
+    if previous_transaction.nested:
+        mark = session.info.get("geoindex_savepoints", {}).pop(previous_transaction, None)
+        if mark is not None:
+            del session.info.get("geoindex_pending", [])[mark:]
+        return
+    session.info.pop("geoindex_savepoints", None)
+    session.info.pop("geoindex_pending", None)
+
+
+def register_address_events(address_model):
+    event.listen(address_model, "after_insert", _after_write)
+    event.listen(address_model, "after_update", _after_write)
+    event.listen(address_model, "after_delete", _after_delete)
+    event.listen(Session, "after_transaction_create", _mark_savepoint)
+    event.listen(Session, "after_commit", _apply_pending)
+    event.listen(Session, "after_soft_rollback", _discard_pending)
@@ -0,0 +1,200 @@
+# app/utilis/hashing.py
+import math
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import bcrypt
+from flask import current_app
+
+LATENCY_SAMPLES = 512
+HASH_SCHEME = "2b"
+
+
+class HashingBusy(Exception):
+    """Raised instead of queueing when the hash pool is saturated."""
+
+    def __init__(self, message, retry_after=1):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# Run inside pool processes, so they must stay importable module-level functions
+
+def _hash(password, rounds):
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+def _check(password, hashed):
+    return bcrypt.checkpw(password.encode("utf-8"), hashed.encode("utf-8"))
+
+
+def hash_params(hashed):
+    """(scheme, cost) recorded in a bcrypt hash such as "$2b$12$...", or None."""
+    try:
+        _, scheme, cost, _ = hashed.split("$", 3)
+        return scheme, int(cost)
+    except (AttributeError, ValueError):
+        return None
+
+
+class HashPool:
+    """
+    Runs bcrypt in a process pool so request threads only wait on it, and
+    caps how many jobs (running plus queued) a worker accepts. With
+    workers=0 jobs run inline on the calling thread but are still counted
+    against the same limit.
+    """
+
+    def __init__(self, workers=2, max_pending=32, timeout=10):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.submitted = 0
+        self.rejected = 0
+        self.failed = 0
+        self.pending = 0
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # A pool inherited across gunicorn's fork belongs to the parent
+        if self._executor is None or self._pid != os.getpid():
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+            self._pid = os.getpid()
+        return self._executor
+
+    def retry_after(self):
+        """Seconds until the current backlog should have drained."""
+        with self._lock:
+            latencies = list(self._latencies)
+            pending = self.pending
+        if not latencies:
+            return 1
+        mean = sum(latencies) / len(latencies)
+        return max(1, math.ceil(mean * pending / max(self.workers, 1)))
+
+    def run(self, fn, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                busy = True
+            else:
+                self.pending += 1
+                self.submitted += 1
+                busy = False
+        if busy:
+            raise HashingBusy("Password hashing is busy", retry_after=self.retry_after())
+
+        start = time.perf_counter()
+        future = None
+        try:
+            if not self.workers:
+                return fn(*args)
+            with self._lock:
+                executor = self._get_executor()
+            try:
+                future = executor.submit(fn, *args)
+                # Free the slot when the hash finishes, not when we stop
+                # waiting: a timed-out hash still occupies its worker
+                future.add_done_callback(lambda _: self._finished(start))
+                return future.result(timeout=self.timeout)
+            except BrokenProcessPool:
+                with self._lock:
+                    self._executor = None
+                raise HashingBusy("Password hashing pool restarted")
+            except FutureTimeoutError:
+                raise HashingBusy("Password hashing timed out", retry_after=self.retry_after())
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            if future is None:
+                self._finished(start)
+
+    def _finished(self, start):
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.pending -= 1
+            self._latencies.append(elapsed)
+
+    def stats(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+            stats = {
+                "workers": self.workers,
+                "max_pending": self.max_pending,
+                "pending": self.pending,
+                "submitted": self.submitted,
+                "rejected": self.rejected,
+                "failed": self.failed,
+            }
+        if latencies:
+            stats["latency_ms"] = {
+                "p50": round(latencies[len(latencies) // 2] * 1000, 2),
+                "p95": round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1000, 2),
+                "max": round(latencies[-1] * 1000, 2),
+            }
+        return stats
+
+    def shutdown(self):
+        if self._executor is not None and self._pid == os.getpid():
+            self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = None
+
+
+class PasswordHasher:
+    """
+    Flask extension wrapping a HashPool sized by HASH_POOL_WORKERS and
+    HASH_POOL_MAX_PENDING. New hashes use the current policy (bcrypt 2b at
+    BCRYPT_LOG_ROUNDS) and stay compatible with Flask-Bcrypt; hashes made
+    under an older policy still verify and report needs_rehash().
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        old = app.extensions.get("password_hasher")
+        if old:
+            old.shutdown()
+        app.extensions["password_hasher"] = HashPool(
+            workers=app.config.get("HASH_POOL_WORKERS", 2),
+            max_pending=app.config.get("HASH_POOL_MAX_PENDING", 32),
+            timeout=app.config.get("HASH_TIMEOUT", 10),
+        )
+
+    @property
+    def pool(self):
+        return current_app.extensions["password_hasher"]
+
+    @property
+    def rounds(self):
+        return current_app.config.get("BCRYPT_LOG_ROUNDS", 12)
+
+    def policy(self):
+        return {"scheme": HASH_SCHEME, "rounds": self.rounds}
+
+    def needs_rehash(self, hashed):
+        """True when a hash was made with other parameters than the current policy."""
+        params = hash_params(hashed)
+        return params is not None and params != (HASH_SCHEME, self.rounds)
+
+    def hash(self, password):
+        return self.pool.run(_hash, password, self.rounds)
+
+    def check(self, password, hashed):
+        return self.pool.run(_check, password, hashed)
+
+    def stats(self):
+        return self.pool.stats()
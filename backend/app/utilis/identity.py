@@ -0,0 +1,89 @@
+# app/utilis/identity.py
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from app.utilis.cache import MemoryCache
+
+# User columns kept in the identity snapshot; id and role come from the JWT
+IDENTITY_FIELDS = ("name", "email", "phone_number")
+
+
+def user_snapshot(user):
+    return {
+        "id": str(user.id),
+        "role": user.role.value,
+        **{field: getattr(user, field) for field in IDENTITY_FIELDS},
+    }
+
+
+class IdentityCache:
+    """
+    Flask extension: per-worker snapshot of each user's identity fields so
+    authenticated views can read a name or email without a users query.
+    Entries expire after IDENTITY_CACHE_TTL seconds and are dropped as soon
+    as a change to the user is committed in this worker.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.extensions["identity_cache"] = MemoryCache(
+            max_entries=app.config.get("IDENTITY_CACHE_MAX_ENTRIES", 10000),
+            ttl=app.config.get("IDENTITY_CACHE_TTL", 300),
+        )
+
+    @property
+    def backend(self):
+        return current_app.extensions["identity_cache"]
+
+    def get(self, user_id):
+        return self.backend.get(str(user_id))
+
+    def set(self, user):
+        snapshot = user_snapshot(user)
+        self.backend.set(snapshot["id"], snapshot)
+        return snapshot
+
+    def invalidate(self, user_id):
+        self.backend.delete(str(user_id))
+
+    def clear(self):
+        self.backend.clear()
+
+    def stats(self):
+        return self.backend.stats()
+
+
+# --- keep the cache in step with committed User changes ---
+
+def _track(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        session.info.setdefault("identity_pending", set()).add(str(target.id))
+
+
+def _apply_pending(session):
+    # Also called when a savepoint is released; wait for the outer commit
+    if session.in_nested_transaction():
+        return
+    pending = session.info.pop("identity_pending", None)
+    if pending and has_app_context() and "identity_cache" in current_app.extensions:
+        cache = IdentityCache()
+        for user_id in pending:
+            cache.invalidate(user_id)
+
+
+def _discard_pending(session, previous_transaction):
+    # Users changed before a failed savepoint still commit with the outer transaction
+    if previous_transaction.nested:
+        return
+    session.info.pop("identity_pending", None)
+
+
+def register_user_events(user_model):
+    event.listen(user_model, "after_update", _track)
+    event.listen(user_model, "after_delete", _track)
+    event.listen(Session, "after_commit", _apply_pending)
+    event.listen(Session, "after_soft_rollback", _discard_pending)
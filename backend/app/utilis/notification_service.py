@@ -0,0 +1,369 @@
+# app/utilis/notification_service.py
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy import and_, func, literal, or_, select, union_all, update
+from sqlalchemy.dialects import postgresql, sqlite
+from app.extensions import db
+from app.models import (
+    Notification, NotificationCounter, NotificationReceipt, NotificationState, NotificationType, User
+)
+from app.utilis.pagination import encode_cursor
+
+# Dialect inserts supporting ON CONFLICT
+_INSERTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+
+def notify(user_id, message, type=NotificationType.INFO, parcel_id=None):
+    """
+    Adds a personal notification to the current session. For a parcel, an
+    unread notification of the same type updated within the last
+    NOTIFICATION_COALESCE_WINDOW seconds is rewritten instead: it takes the
+    new message, moves to the top of the feed and counts one more event.
+    """
+    window = current_app.config.get("NOTIFICATION_COALESCE_WINDOW", 0)
+    now = datetime.now(timezone.utc)
+    if parcel_id is not None and window:
+        recent = db.session.execute(
+            select(Notification)
+            .where(
+                Notification.user_id == user_id,
+                Notification.created_at >= now - timedelta(seconds=window),
+                Notification.parcel_id == parcel_id,
+                Notification.type == type,
+                Notification.is_read.is_(False),
+            )
+            .order_by(Notification.created_at.desc())
+            .limit(1)
+        ).scalar()
+        if recent is not None:
+            recent.message = message
+            recent.created_at = now
+            recent.event_count += 1
+            return recent
+
+    notification = Notification(user_id=user_id, message=message, type=type, parcel_id=parcel_id)
+    db.session.add(notification)
+    _adjust_unread(user_id, 1)
+    return notification
+
+
+def broadcast(role, message, type=NotificationType.ALERT, event_count=1):
+    """
+    Adds one notification addressed to every user with `role`. Users see it
+    in their feed without a row of their own; reads and deletes are kept as
+    NotificationReceipt markers.
+    """
+    notification = Notification(audience=role, message=message, type=type, event_count=event_count)
+    db.session.add(notification)
+    bump = (
+        update(NotificationCounter)
+        .where(NotificationCounter.audience == role)
+        .values(broadcast_total=NotificationCounter.broadcast_total + 1)
+    )
+    if not db.session.execute(bump).rowcount:
+        ensure_counter(role)
+        db.session.execute(bump)
+    return notification
+
+
+def ensure_counter(role):
+    """
+    Creates the NotificationCounter row of `role` if it is missing. Uses
+    INSERT ... ON CONFLICT DO NOTHING, so two workers creating it at once
+    don't fail each other's transaction.
+    """
+    insert = _INSERTS[db.session.get_bind().dialect.name]
+    db.session.execute(
+        insert(NotificationCounter)
+        .values(audience=role, broadcast_total=0)
+        .on_conflict_do_nothing(index_elements=[NotificationCounter.audience])
+    )
+
+
+def _state(user_id, create=False):
+    state = db.session.get(NotificationState, user_id)
+    if state is None and create:
+        state = NotificationState(user_id=user_id)
+        db.session.add(state)
+    return state
+
+
+def _receipt(notification_id, user_id):
+    receipt = db.session.get(NotificationReceipt, (notification_id, user_id))
+    if receipt is None:
+        receipt = NotificationReceipt(notification_id=notification_id, user_id=user_id)
+        db.session.add(receipt)
+    return receipt
+
+
+def _adjust_unread(user_id, delta):
+    """Moves a user's personal unread counter, if it has been counted yet."""
+    db.session.execute(
+        update(NotificationState)
+        .where(NotificationState.user_id == user_id, NotificationState.unread_count.isnot(None))
+        .values(unread_count=NotificationState.unread_count + delta)
+    )
+
+
+def _handle_broadcast(user_id):
+    """Records that one unread broadcast was read or deleted individually."""
+    db.session.execute(
+        update(NotificationState)
+        .where(NotificationState.user_id == user_id)
+        .values(broadcast_handled=NotificationState.broadcast_handled + 1)
+    )
+
+
+def _broadcast_total(role):
+    counter = db.session.get(NotificationCounter, role)
+    return counter.broadcast_total if counter else 0
+
+
+def _visible_broadcasts(stmt, user, state):
+    """
+    Restricts a select over Notification to broadcasts `user` can see: sent
+    to their role since they signed up, and neither cleared nor deleted.
+    """
+    conditions = [
+        Notification.audience == user.role,
+        Notification.created_at >= user.created_at,
+        NotificationReceipt.deleted_at.is_(None),
+    ]
+    if state is not None and state.broadcasts_cleared_before is not None:
+        conditions.append(Notification.created_at > state.broadcasts_cleared_before)
+    return stmt.outerjoin(NotificationReceipt, and_(
+        NotificationReceipt.notification_id == Notification.id,
+        NotificationReceipt.user_id == user.id,
+    )).where(*conditions)
+
+
+def _broadcast_read(state):
+    read = NotificationReceipt.read_at.isnot(None)
+    if state is not None and state.broadcasts_read_before is not None:
+        read = or_(read, Notification.created_at <= state.broadcasts_read_before)
+    return read
+
+
+def _page(stmt, before=None, after=None, limit=None):
+    """Keyset page of one feed branch on (created_at, id), newest first unless `after`."""
+    key = (Notification.created_at, Notification.id)
+    if before is not None:
+        stmt = stmt.where(or_(key[0] < before[0], and_(key[0] == before[0], key[1] < before[1])))
+    if after is not None:
+        stmt = stmt.where(or_(key[0] > after[0], and_(key[0] == after[0], key[1] > after[1])))
+        stmt = stmt.order_by(key[0].asc(), key[1].asc())
+    else:
+        stmt = stmt.order_by(key[0].desc(), key[1].desc())
+    return select(stmt.limit(limit).subquery()) if limit else stmt
+
+
+def feed_query(user, before=None, after=None, limit=None, type=None, is_read=None):
+    """
+    Personal and broadcast notifications of `user` as one UNION ALL. Each
+    branch is filtered, keyset-paginated and limited on its own index
+    ((user_id | audience), created_at, id) before the two are merged, so a
+    page costs O(limit) however long the history is.
+    """
+    state = _state(user.id)
+    broadcast_read = _broadcast_read(state)
+
+    personal = select(
+        Notification.id, Notification.message, Notification.type,
+        Notification.is_read.label("is_read"), Notification.created_at, Notification.event_count,
+        literal(False).label("broadcast"),
+    ).where(Notification.user_id == user.id)
+
+    broadcasts = _visible_broadcasts(select(
+        Notification.id, Notification.message, Notification.type,
+        broadcast_read.label("is_read"), Notification.created_at, Notification.event_count,
+        literal(True).label("broadcast"),
+    ), user, state)
+
+    if type is not None:
+        personal = personal.where(Notification.type == type)
+        broadcasts = broadcasts.where(Notification.type == type)
+    if is_read is not None:
+        personal = personal.where(Notification.is_read == is_read)
+        broadcasts = broadcasts.where(broadcast_read if is_read else ~broadcast_read)
+
+    return union_all(
+        _page(personal, before, after, limit),
+        _page(broadcasts, before, after, limit),
+    ).subquery("feed")
+
+
+def feed(user, before=None, after=None, limit=None, type=None, is_read=None):
+    """
+    One page of the user's feed, newest first, and whether more items lie
+    beyond it. `before` / `after` are decoded cursors: older than / newer
+    than that item; "beyond" is older for `before` and newer for `after`.
+    Fetches one row extra instead of counting, like keyset_page.
+    """
+    fetch = limit + 1 if limit else None
+    feed = feed_query(user, before, after, fetch, type, is_read)
+    if after is not None:
+        stmt = select(feed).order_by(feed.c.created_at.asc(), feed.c.id.asc())
+    else:
+        stmt = select(feed).order_by(feed.c.created_at.desc(), feed.c.id.desc())
+    rows = db.session.execute(stmt.limit(fetch) if fetch else stmt).all()
+    more = bool(limit) and len(rows) > limit
+    if more:
+        rows = rows[:limit]
+    if after is not None:
+        rows.reverse()
+    items = [
+        {
+            "id": str(row.id),
+            "message": row.message,
+            "type": row.type.value,
+            "is_read": bool(row.is_read),
+            "created_at": row.created_at.isoformat(),
+            "broadcast": bool(row.broadcast),
+            "event_count": row.event_count,
+            "cursor": encode_cursor(row.created_at, row.id),
+        }
+        for row in rows
+    ]
+    return items, more
+
+
+def _visible(user, notification_id):
+    """The notification if `user` can see it, else None."""
+    notification = db.session.get(Notification, notification_id)
+    if notification is None:
+        return None
+    if notification.user_id == user.id:
+        return notification
+    if notification.is_broadcast:
+        state = _state(user.id)
+        visible = db.session.execute(_visible_broadcasts(
+            select(Notification.id).where(Notification.id == notification_id), user, state
+        )).first()
+        if visible:
+            return notification
+    return None
+
+
+def mark_read(user, notification_id):
+    """Returns False if the user has no such notification. Caller commits."""
+    notification = _visible(user, notification_id)
+    if notification is None:
+        return False
+    if notification.is_broadcast:
+        if not _broadcast_is_read(user, notification):
+            _receipt(notification.id, user.id).read_at = datetime.now(timezone.utc)
+            _handle_broadcast(user.id)
+    elif not notification.is_read:
+        notification.is_read = True
+        _adjust_unread(user.id, -1)
+    return True
+
+
+def mark_all_read(user):
+    """Marks every notification of `user` read; returns how many were unread. Caller commits."""
+    state = _state(user.id)
+    unread_broadcasts = db.session.execute(_visible_broadcasts(
+        select(func.count(Notification.id)).where(~_broadcast_read(state)), user, state
+    )).scalar()
+
+    updated = Notification.query.filter_by(user_id=user.id, is_read=False).update({"is_read": True})
+    state = _state(user.id, create=True)
+    state.broadcasts_read_before = datetime.now(timezone.utc)
+    reconcile_unread(user)
+    return updated + unread_broadcasts
+
+
+def delete(user, notification_id):
+    """Returns False if the user has no such notification. Caller commits."""
+    notification = _visible(user, notification_id)
+    if notification is None:
+        return False
+    if notification.is_broadcast:
+        if not _broadcast_is_read(user, notification):
+            _handle_broadcast(user.id)
+        _receipt(notification.id, user.id).deleted_at = datetime.now(timezone.utc)
+    else:
+        if not notification.is_read:
+            _adjust_unread(user.id, -1)
+        db.session.delete(notification)
+    return True
+
+
+def delete_all(user):
+    """Deletes every notification of `user`; returns how many. Caller commits."""
+    state = _state(user.id)
+    visible_broadcasts = db.session.execute(_visible_broadcasts(
+        select(func.count(Notification.id)), user, state
+    )).scalar()
+
+    deleted = Notification.query.filter_by(user_id=user.id).delete()
+    state = _state(user.id, create=True)
+    state.broadcasts_cleared_before = datetime.now(timezone.utc)
+    reconcile_unread(user)
+    return deleted + visible_broadcasts
+
+
+# -------------------------
+# UNREAD COUNTER
+# -------------------------
+def _broadcast_is_read(user, notification):
+    read = db.session.execute(
+        select(_broadcast_read(_state(user.id)))
+        .select_from(Notification)
+        .outerjoin(NotificationReceipt, and_(
+            NotificationReceipt.notification_id == Notification.id,
+            NotificationReceipt.user_id == user.id,
+        ))
+        .where(Notification.id == notification.id)
+    ).scalar()
+    return bool(read)
+
+
+def reconcile_unread(user):
+    """Recounts a user's unread notifications from the table. Caller commits."""
+    state = _state(user.id, create=True)
+    db.session.flush()
+    personal = db.session.execute(
+        select(func.count(Notification.id)).where(Notification.user_id == user.id, Notification.is_read.is_(False))
+    ).scalar()
+    broadcasts = db.session.execute(_visible_broadcasts(
+        select(func.count(Notification.id)).where(~_broadcast_read(state)), user, state
+    )).scalar()
+    state.unread_count = personal
+    state.broadcast_base = _broadcast_total(user.role) - broadcasts
+    state.broadcast_handled = 0
+    state.counted_at = datetime.now(timezone.utc)
+    return state
+
+
+def unread_count(user):
+    """
+    Unread badge from two primary-key reads (the user's state and their
+    role's broadcast counter); the table is only counted the first time.
+    Caller commits.
+    """
+    state = _state(user.id)
+    if state is None or state.unread_count is None:
+        state = reconcile_unread(user)
+    broadcasts = _broadcast_total(user.role) - state.broadcast_base - state.broadcast_handled
+    return state.unread_count + max(broadcasts, 0)
+
+
+def reconcile_all(batch_size=500, role=None):
+    """Recounts every user (of `role`) that has a counter, in batches. Returns users recounted."""
+    done = 0
+    last_id = None
+    while True:
+        stmt = select(User).join(NotificationState, NotificationState.user_id == User.id).order_by(User.id).limit(batch_size)
+        if role is not None:
+            stmt = stmt.where(User.role == role)
+        if last_id is not None:
+            stmt = stmt.where(User.id > last_id)
+        users = db.session.execute(stmt).scalars().all()
+        if not users:
+            return done
+        for user in users:
+            reconcile_unread(user)
+        db.session.commit()
+        done += len(users)
+        last_id = users[-1].id
@@ -0,0 +1,222 @@
+# app/utilis/outbox.py
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from flask import current_app, has_app_context
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+# event type -> handler(payload), registered with @handles
+HANDLERS = {}
+# Periodic jobs run by the worker after each poll, registered with @on_poll
+POLL_JOBS = []
+
+
+def handles(event_type):
+    def register(fn):
+        HANDLERS[event_type] = fn
+        return fn
+    return register
+
+
+def on_poll(fn):
+    POLL_JOBS.append(fn)
+    return fn
+
+
+def _apply(outbox_event):
+    handler = HANDLERS.get(outbox_event.type)
+    if handler is None:
+        raise LookupError(f"No outbox handler for {outbox_event.type}")
+    handler(outbox_event.payload)
+    outbox_event.processed_at = datetime.now(timezone.utc)
+
+
+def record(event_type, payload):
+    """
+    Adds a domain event to the current session, so it commits or rolls back
+    with the caller's change. With OUTBOX_ASYNC disabled (tests) its handler
+    runs right away, in the same transaction.
+    """
+    from app.extensions import db
+    from app.models import OutboxEvent
+
+    outbox_event = OutboxEvent(type=event_type, payload=payload)
+    db.session.add(outbox_event)
+    if not current_app.config.get("OUTBOX_ASYNC", True):
+        _apply(outbox_event)
+    return outbox_event
+
+
+def process_batch(batch_size=None):
+    """
+    Claims up to `batch_size` due events (SKIP LOCKED where the database
+    supports it, so workers never share an event), runs each handler in a
+    savepoint and commits the batch once: an event's side effects and its
+    processed_at land together. A failing event is retried after an
+    exponential backoff, up to OUTBOX_MAX_ATTEMPTS times. Returns
+    (processed, failed).
+    """
+    from app.extensions import db
+    from app.models import OutboxEvent
+
+    config = current_app.config
+    batch_size = batch_size or config.get("OUTBOX_BATCH_SIZE", 100)
+    backoff = config.get("OUTBOX_RETRY_BACKOFF", 2)
+    now = datetime.now(timezone.utc)
+
+    due = db.session.execute(
+        select(OutboxEvent)
+        .where(
+            OutboxEvent.processed_at.is_(None),
+            OutboxEvent.available_at <= now,
+            OutboxEvent.attempts < config.get("OUTBOX_MAX_ATTEMPTS", 5),
+        )
+        .order_by(OutboxEvent.available_at)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    ).scalars().all()
+
+    processed = failed = 0
+    for outbox_event in due:
+        try:
+            with db.session.begin_nested():
+                _apply(outbox_event)
+            processed += 1
+        except Exception as e:
+            outbox_event.attempts += 1
+            outbox_event.last_error = str(e)[:500]
+            outbox_event.available_at = now + timedelta(seconds=backoff * 2 ** (outbox_event.attempts - 1))
+            failed += 1
+            current_app.logger.warning("Outbox event %s (%s) failed: %s", outbox_event.id, outbox_event.type, e)
+    db.session.commit()
+    return processed, failed
+
+
+def drain(batch_size=None):
+    """Processes batches until no due event is left. Returns (processed, failed)."""
+    batch_size = batch_size or current_app.config.get("OUTBOX_BATCH_SIZE", 100)
+    processed = failed = 0
+    while True:
+        done, errors = process_batch(batch_size)
+        processed += done
+        failed += errors
+        if done + errors < batch_size:
+            return processed, failed
+
+
+class _Worker:
+    """Background thread of one process, woken by commits and every poll_interval."""
+
+    def __init__(self, app):
+        self.app = app
+        self.poll_interval = app.config.get("OUTBOX_POLL_INTERVAL", 5)
+        self.processed = 0
+        self.failed = 0
+        self._thread = None
+        self._pid = None
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def wake(self):
+        with self._lock:
+            # A thread inherited across gunicorn's fork is not running here
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._stop.clear()
+                self._thread = threading.Thread(target=self._run, name="outbox-worker", daemon=True)
+                self._thread.start()
+        self._wake.set()
+
+    def _run(self):
+        from app.extensions import db
+
+        while not self._stop.is_set():
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+            if self._stop.is_set():
+                return
+            with self.app.app_context():
+                try:
+                    processed, failed = drain()
+                    self.processed += processed
+                    self.failed += failed
+                    for job in POLL_JOBS:
+                        job()
+                except Exception:
+                    db.session.rollback()
+                    self.app.logger.exception("Outbox worker batch failed")
+                finally:
+                    db.session.remove()
+
+    def stats(self):
+        return {
+            "running": self._thread is not None and self._thread.is_alive() and self._pid == os.getpid(),
+            "processed": self.processed,
+            "failed": self.failed,
+        }
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+
+
+class OutboxWorker:
+    """
+    Flask extension running the outbox worker thread of each process. It is
+    started by the first commit that records an event and then polls every
+    OUTBOX_POLL_INTERVAL seconds; `flask outbox drain` processes the backlog
+    from the command line.
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        old = app.extensions.get("outbox")
+        if old:
+            old.stop()
+        app.extensions["outbox"] = _Worker(app)
+
+    @property
+    def worker(self):
+        return current_app.extensions["outbox"]
+
+    def wake(self):
+        if current_app.config.get("OUTBOX_ASYNC", True):
+            self.worker.wake()
+
+    def stats(self):
+        return self.worker.stats()
+
+
+# --- wake the worker once events are committed ---
+
+def _track(mapper, connection, target):
+    session = Session.object_session(target)
+    if session is not None:
+        session.info["outbox_pending"] = True
+
+
+def _apply_pending(session):
+    # Also called when a savepoint is released; wait for the outer commit
+    if session.in_nested_transaction():
+        return
+    pending = session.info.pop("outbox_pending", None)
+    if pending and has_app_context() and "outbox" in current_app.extensions:
+        OutboxWorker().wake()
+
+
+def _discard_pending(session, previous_transaction):
+    # A failed savepoint leaves the events recorded before it in place
+    if previous_transaction.nested:
+        return
+    session.info.pop("outbox_pending", None)
+
+
+def register_outbox_events(outbox_model):
+    event.listen(outbox_model, "after_insert", _track)
+    event.listen(Session, "after_commit", _apply_pending)
+    event.listen(Session, "after_soft_rollback", _discard_pending)
@@ -0,0 +1,58 @@
+# app/utilis/pagination.py
+import base64
+import uuid
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import and_, or_
+
+
+def encode_cursor(created_at, row_id):
+    raw = f"{created_at.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    """(created_at, id) from an opaque cursor; ValueError if malformed."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        created_at, row_id = raw.split("|")
+        return datetime.fromisoformat(created_at), uuid.UUID(row_id)
+    except (TypeError, ValueError):
+        raise ValueError("Invalid cursor")
+
+
+def page_limit(args, default_key, max_key):
+    """?limit= bounded by the `max_key` config; ValueError with a client-facing message."""
+    maximum = current_app.config[max_key]
+    try:
+        limit = int(args.get("limit", current_app.config[default_key]))
+    except ValueError:
+        raise ValueError("limit must be an integer")
+    if not 1 <= limit <= maximum:
+        raise ValueError(f"limit must be between 1 and {maximum}")
+    return limit
+
+
+def parse_datetime(value, name):
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"{name} must be an ISO 8601 date or datetime")
+
+
+def keyset_page(query, created_col, id_col, limit, before=None):
+    """
+    Up to `limit` rows of `query`, newest first on (created_at, id), that
+    come after the decoded cursor `before`, and the cursor of the next page
+    (None on the last one). Fetches one row extra instead of counting.
+    """
+    if before is not None:
+        query = query.filter(or_(
+            created_col < before[0], and_(created_col == before[0], id_col < before[1])
+        ))
+    rows = query.order_by(created_col.desc(), id_col.desc()).limit(limit + 1).all()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+    return rows, next_cursor
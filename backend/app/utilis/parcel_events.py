@@ -0,0 +1,180 @@
+# app/utilis/parcel_events.py
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy import select
+from app.extensions import db
+from app.models import NotificationCounter, NotificationType, OutboxEvent, ParcelStatus, UserRole
+from app.utilis.notification_service import notify, broadcast, ensure_counter
+from app.utilis.outbox import handles, on_poll, record
+
+PARCEL_CREATED = "parcel.created"
+PARCEL_DESTINATION_CHANGED = "parcel.destination_changed"
+PARCEL_STATUS_CHANGED = "parcel.status_changed"
+PARCEL_CANCELLED = "parcel.cancelled"
+PARCELS_BULK_CREATED = "parcel.bulk_created"
+
+
+def parcel_event(event_type, parcel, actor):
+    """
+    Records a parcel domain event in the current transaction; the
+    notifications it implies are created by the outbox worker.
+    """
+    if parcel.id is None:
+        db.session.flush()
+    return record(event_type, {
+        "parcel_id": str(parcel.id),
+        "tracking_id": parcel.tracking_id,
+        "customer_id": str(parcel.customer_id),
+        "status": (parcel.status or ParcelStatus.CREATED).value,
+        "actor_id": str(actor.id),
+        "actor_name": actor.name,
+        "actor_role": actor.role.value,
+    })
+
+
+def bulk_created_event(tracking_ids, customer_id, actor):
+    """
+    Records one event for a batch of parcels created together, so a bulk
+    request costs one outbox row and one admin alert however large it is.
+    """
+    return record(PARCELS_BULK_CREATED, {
+        "tracking_ids": list(tracking_ids),
+        "customer_id": str(customer_id),
+        "actor_id": str(actor.id),
+        "actor_name": actor.name,
+        "actor_role": actor.role.value,
+    })
+
+
+def _tracking_ids(payload):
+    """Parcels an event is about: one, or a whole batch."""
+    return payload.get("tracking_ids") or [payload["tracking_id"]]
+
+
+def _shown(tracking_ids, limit=5):
+    shown = ", ".join(tracking_ids[:limit])
+    if len(tracking_ids) > limit:
+        shown += f" and {len(tracking_ids) - limit} more"
+    return shown
+
+
+# -------------------------
+# HANDLERS
+# -------------------------
+def _notify_customer(payload, message, type=NotificationType.PARCEL_UPDATE):
+    notify(uuid.UUID(payload["customer_id"]), message, type, parcel_id=uuid.UUID(payload["parcel_id"]))
+
+
+def _alert_admins(message):
+    """One ALERT per event, unless admins get periodic digests instead."""
+    if not current_app.config.get("ADMIN_DIGEST_INTERVAL"):
+        broadcast(UserRole.ADMIN, message, NotificationType.ALERT)
+
+
+@handles(PARCEL_CREATED)
+def _parcel_created(payload):
+    _alert_admins(f"New parcel {payload['tracking_id']} created by {payload['actor_name']}")
+    _notify_customer(payload, f"Your parcel {payload['tracking_id']} has been created successfully.")
+
+
+@handles(PARCELS_BULK_CREATED)
+def _parcels_bulk_created(payload):
+    tracking_ids = payload["tracking_ids"]
+    _alert_admins(f"{len(tracking_ids)} parcels created by {payload['actor_name']} ({_shown(tracking_ids)})")
+    notify(uuid.UUID(payload["customer_id"]),
+           f"Your {len(tracking_ids)} parcels have been created successfully.", NotificationType.PARCEL_UPDATE)
+
+
+@handles(PARCEL_DESTINATION_CHANGED)
+def _parcel_destination_changed(payload):
+    _notify_customer(payload, f"Your parcel {payload['tracking_id']} delivery address has been updated.")
+    _alert_admins(f"Parcel {payload['tracking_id']} destination updated by {payload['actor_name']}")
+
+
+@handles(PARCEL_STATUS_CHANGED)
+def _parcel_status_changed(payload):
+    _notify_customer(payload, f"Your parcel {payload['tracking_id']} is now {payload['status']}")
+
+
+@handles(PARCEL_CANCELLED)
+def _parcel_cancelled(payload):
+    if payload["actor_role"] == UserRole.ADMIN.value:
+        _notify_customer(payload, f"Your parcel {payload['tracking_id']} was cancelled by admin", NotificationType.ALERT)
+        return
+    _alert_admins(f"Parcel {payload['tracking_id']} was cancelled by {payload['actor_name']}")
+    _notify_customer(payload, f"Your parcel {payload['tracking_id']} has been cancelled.")
+
+
+# -------------------------
+# ADMIN DIGEST
+# -------------------------
+_DIGEST_LABELS = {
+    PARCEL_CREATED: "created",
+    PARCELS_BULK_CREATED: "created",
+    PARCEL_DESTINATION_CHANGED: "destination changes",
+    PARCEL_CANCELLED: "cancelled",
+}
+
+
+def _digest_message(events):
+    # A bulk event counts once per parcel it created
+    kinds = Counter()
+    for event in events:
+        kinds[_DIGEST_LABELS[event.type]] += len(_tracking_ids(event.payload))
+    labels = dict.fromkeys(_DIGEST_LABELS.values())
+    summary = ", ".join(f"{kinds[label]} {label}" for label in labels if kinds[label])
+    tracking_ids = list(dict.fromkeys(t for event in events for t in _tracking_ids(event.payload)))
+    return f"{sum(kinds.values())} parcel events: {summary} ({_shown(tracking_ids)})"
+
+
+def send_admin_digest(now=None, force=False):
+    """
+    Broadcasts one ALERT summarising the parcel events admins would have
+    been alerted about since the last digest, once ADMIN_DIGEST_INTERVAL
+    seconds have passed (or at once with `force`). Reads the outbox, so no
+    event is counted twice or missed. Commits; returns the notification or
+    None if nothing was due.
+    """
+    interval = current_app.config.get("ADMIN_DIGEST_INTERVAL") or 0
+    now = now or datetime.now(timezone.utc)
+    # Leave room for transactions still committing their events
+    until = now - timedelta(seconds=current_app.config.get("ADMIN_DIGEST_LAG", 10))
+
+    # The admin counter row doubles as the digest lock between workers
+    ensure_counter(UserRole.ADMIN)
+    counter = db.session.execute(
+        select(NotificationCounter).where(NotificationCounter.audience == UserRole.ADMIN).with_for_update()
+    ).scalar_one()
+    since = counter.digested_until
+    if since is None:
+        # First digest: one interval back, not every event ever recorded
+        since = until - timedelta(seconds=interval)
+    elif since.tzinfo is None:
+        since = since.replace(tzinfo=timezone.utc)  # SQLite returns naive datetimes
+    if not force and until - since < timedelta(seconds=interval):
+        db.session.rollback()
+        return None
+
+    stmt = select(OutboxEvent).where(
+        OutboxEvent.type.in_(_DIGEST_LABELS), OutboxEvent.created_at > since, OutboxEvent.created_at <= until
+    ).order_by(OutboxEvent.created_at)
+    events = [
+        event for event in db.session.execute(stmt).scalars()
+        if not (event.type == PARCEL_CANCELLED and event.payload["actor_role"] == UserRole.ADMIN.value)
+    ]
+
+    counter.digested_until = until
+    notification = None
+    if events:
+        notification = broadcast(UserRole.ADMIN, _digest_message(events), NotificationType.ALERT,
+                                 event_count=sum(len(_tracking_ids(event.payload)) for event in events))
+    db.session.commit()
+    return notification
+
+
+@on_poll
+def _digest_when_due():
+    if current_app.config.get("ADMIN_DIGEST_INTERVAL"):
+        send_admin_digest()
@@ -0,0 +1,95 @@
+# app/utilis/parcel_export.py
+import csv
+import io
+import json
+from decimal import Decimal
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+from app.extensions import db
+from app.models import Address, Parcel, User
+from app.utilis.parcel_queries import filter_parcels
+
+_ADDRESS_FIELDS = ("street", "city", "county", "country", "postal_code", "lat", "lng")
+# Spreadsheets evaluate cells starting with these as formulas
+_FORMULA_PREFIXES = ("=", "+", "-", "@", "\t", "\r")
+
+
+def export_query(args):
+    """
+    One flat row per parcel, with the customer and both addresses joined,
+    oldest first; same filters as the parcel lists. ValueError on bad input.
+    """
+    pickup = aliased(Address)
+    delivery = aliased(Address)
+    columns = [
+        Parcel.id, Parcel.tracking_id, Parcel.status,
+        Parcel.customer_id, User.name.label("customer_name"), User.email.label("customer_email"),
+        Parcel.weight_kg, Parcel.description, Parcel.estimated_delivery_date,
+        Parcel.route_distance_km, Parcel.route_duration_min,
+        Parcel.created_at, Parcel.updated_at,
+    ]
+    columns += [getattr(pickup, field).label(f"pickup_{field}") for field in _ADDRESS_FIELDS]
+    columns += [getattr(delivery, field).label(f"delivery_{field}") for field in _ADDRESS_FIELDS]
+    stmt = (
+        select(*columns)
+        .join(User, User.id == Parcel.customer_id)
+        .join(pickup, pickup.id == Parcel.pickup_address_id)
+        .join(delivery, delivery.id == Parcel.delivery_address_id)
+    )
+    return filter_parcels(stmt, args).order_by(Parcel.created_at, Parcel.id)
+
+
+def _value(value):
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, Decimal):
+        return float(value)
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return getattr(value, "value", str(value))
+
+
+def _batches(stmt):
+    """
+    Rows of `stmt` in lists of EXPORT_BATCH_SIZE. yield_per streams from a
+    server-side cursor on Postgres, so only one batch is ever in memory.
+    """
+    size = current_app.config.get("EXPORT_BATCH_SIZE", 1000)
+    result = db.session.execute(stmt.execution_options(yield_per=size))
+    try:
+        for partition in result.partitions():
+            yield [{key: _value(value) for key, value in row._mapping.items()} for row in partition]
+    finally:
+        result.close()
+
+
+def _csv_cell(value):
+    """Customer-entered text, quoted so a spreadsheet shows it instead of running it."""
+    if isinstance(value, str) and value.startswith(_FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def ndjson_stream(stmt):
+    for batch in _batches(stmt):
+        yield "".join(json.dumps(row) + "\n" for row in batch)
+
+
+def csv_stream(stmt):
+    header = [column.name for column in stmt.selected_columns]
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=header)
+    writer.writeheader()
+    yield buffer.getvalue()
+    for batch in _batches(stmt):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows({key: _csv_cell(value) for key, value in row.items()} for row in batch)
+        yield buffer.getvalue()
+
+
+FORMATS = {
+    "ndjson": (ndjson_stream, "application/x-ndjson"),
+    "csv": (csv_stream, "text/csv"),
+}
@@ -0,0 +1,32 @@
+# app/utilis/parcel_queries.py
+from app.models import Parcel, ParcelStatus
+from app.utilis.pagination import decode_cursor, keyset_page, page_limit, parse_datetime
+
+
+def filter_parcels(query, args):
+    """
+    Applies the ?status=&created_from=&created_to= filters of a parcel list
+    (created_from inclusive, created_to exclusive). ValueError with a
+    client-facing message on bad input.
+    """
+    if args.get("status"):
+        try:
+            query = query.filter(Parcel.status == ParcelStatus(args["status"].upper()))
+        except ValueError:
+            raise ValueError("Invalid status filter")
+    if args.get("created_from"):
+        query = query.filter(Parcel.created_at >= parse_datetime(args["created_from"], "created_from"))
+    if args.get("created_to"):
+        query = query.filter(Parcel.created_at < parse_datetime(args["created_to"], "created_to"))
+    return query
+
+
+def parcel_page(query, args):
+    """
+    One page of a parcel list, newest first: ?limit= (at most
+    PARCELS_MAX_PAGE_SIZE), ?cursor= from the previous page, plus the
+    filters above. Returns (parcels, next_cursor).
+    """
+    limit = page_limit(args, "PARCELS_PAGE_SIZE", "PARCELS_MAX_PAGE_SIZE")
+    before = decode_cursor(args["cursor"]) if args.get("cursor") else None
+    return keyset_page(filter_parcels(query, args), Parcel.created_at, Parcel.id, limit, before)
@@ -0,0 +1,19 @@
+# app/utilis/parcel_states.py
+from app.models import ParcelStatus
+
+# Parcel lifecycle: the statuses each status may move to
+TRANSITIONS = {
+    ParcelStatus.CREATED: [ParcelStatus.PICKED_UP, ParcelStatus.CANCELLED],
+    ParcelStatus.PICKED_UP: [ParcelStatus.IN_TRANSIT, ParcelStatus.CANCELLED],
+    ParcelStatus.IN_TRANSIT: [ParcelStatus.OUT_FOR_DELIVERY],
+    ParcelStatus.OUT_FOR_DELIVERY: [ParcelStatus.DELIVERED],
+    ParcelStatus.DELIVERED: [],
+    ParcelStatus.CANCELLED: [],
+}
+
+
+def transition_error(current, target):
+    """Why a parcel can't move from `current` to `target`, or None if it can."""
+    if target in TRANSITIONS[current]:
+        return None
+    return f"Cannot change status from {current.value} to {target.value}"
@@ -0,0 +1,47 @@
+# app/utilis/password_service.py
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+from sqlalchemy import update
+from app.extensions import db, password_hasher
+
+_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="password-rehash")
+
+
+def rehash_password(user_cls, user_id, password, old_hash):
+    """
+    Stores a hash of `password` made under the current policy. Only replaces
+    `old_hash`, so a password changed meanwhile is left alone. Returns True
+    if the row was updated.
+    """
+    new_hash = password_hasher.hash(password)
+    result = db.session.execute(
+        update(user_cls)
+        .where(user_cls.id == user_id, user_cls._password_hash == old_hash)
+        .values(_password_hash=new_hash)
+    )
+    db.session.commit()
+    return result.rowcount == 1
+
+
+def _rehash_in_background(app, user_cls, user_id, password, old_hash):
+    with app.app_context():
+        try:
+            rehash_password(user_cls, user_id, password, old_hash)
+        except Exception:
+            db.session.rollback()
+            app.logger.exception("Failed to rehash password for user %s", user_id)
+        finally:
+            db.session.remove()
+
+
+def schedule_rehash(user, password):
+    """
+    Upgrades `user`'s password hash to the current policy after a successful
+    login, off the request thread. With PASSWORD_REHASH_ASYNC disabled
+    (tests) it runs inline instead.
+    """
+    app = current_app._get_current_object()
+    args = (type(user), user.id, password, user._password_hash)
+    if not app.config.get("PASSWORD_REHASH_ASYNC", True):
+        return rehash_password(*args)
+    return _executor.submit(_rehash_in_background, app, *args)
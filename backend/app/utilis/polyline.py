@@ -0,0 +1,92 @@
+# app/utilis/polyline.py
+from math import cos, radians, hypot
+
+METERS_PER_DEG_LAT = 110540.0
+METERS_PER_DEG_LNG = 111320.0
+
+
+def _project(points):
+    """Equirectangular projection of [lat, lng] points to metres; fine at route scale."""
+    ref_cos = cos(radians(sum(p[0] for p in points) / len(points)))
+    return [(lng * METERS_PER_DEG_LNG * ref_cos, lat * METERS_PER_DEG_LAT) for lat, lng in points]
+
+
+def _segment_distance(px, py, ax, ay, bx, by):
+    dx, dy = bx - ax, by - ay
+    if dx == 0 and dy == 0:
+        return hypot(px - ax, py - ay)
+    t = ((px - ax) * dx + (py - ay) * dy) / (dx * dx + dy * dy)
+    t = max(0.0, min(1.0, t))
+    return hypot(px - (ax + t * dx), py - (ay + t * dy))
+
+
+def simplify(points, tolerance_m):
+    """
+    Douglas-Peucker simplification of a [lat, lng] polyline. Points closer
+    than `tolerance_m` metres to the simplified line are dropped; the first
+    and last points are always kept.
+    """
+    if tolerance_m <= 0 or len(points) < 3:
+        return list(points)
+
+    xy = _project(points)
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+
+    # Iterative to avoid recursion limits on very long routes
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        ax, ay = xy[start]
+        bx, by = xy[end]
+        max_dist, index = 0.0, None
+        for i in range(start + 1, end):
+            dist = _segment_distance(xy[i][0], xy[i][1], ax, ay, bx, by)
+            if dist > max_dist:
+                max_dist, index = dist, i
+        if index is not None and max_dist > tolerance_m:
+            keep[index] = True
+            stack.append((start, index))
+            stack.append((index, end))
+
+    return [p for p, k in zip(points, keep) if k]
+
+
+def encode(points, precision=5):
+    """Google encoded-polyline string for a list of [lat, lng] points."""
+    factor = 10 ** precision
+    chunks = []
+    prev_lat = prev_lng = 0
+    for lat, lng in points:
+        lat_i, lng_i = int(round(lat * factor)), int(round(lng * factor))
+        for delta in (lat_i - prev_lat, lng_i - prev_lng):
+            value = ~(delta << 1) if delta < 0 else delta << 1
+            while value >= 0x20:
+                chunks.append(chr((0x20 | (value & 0x1f)) + 63))
+                value >>= 5
+            chunks.append(chr(value + 63))
+        prev_lat, prev_lng = lat_i, lng_i
+    return "".join(chunks)
+
+
+def decode(encoded, precision=5):
+    """Inverse of encode(); returns a list of [lat, lng] points."""
+    factor = 10 ** precision
+    points = []
+    index = lat = lng = 0
+    while index < len(encoded):
+        deltas = []
+        for _ in range(2):
+            shift = result = 0
+            while True:
+                b = ord(encoded[index]) - 63
+                index += 1
+                result |= (b & 0x1f) << shift
+                shift += 5
+                if b < 0x20:
+                    break
+            deltas.append(~(result >> 1) if result & 1 else result >> 1)
+        lat += deltas[0]
+        lng += deltas[1]
+        points.append([lat / factor, lng / factor])
+    return points
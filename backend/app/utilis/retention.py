@@ -0,0 +1,232 @@
+# app/utilis/retention.py
+import gzip
+import json
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy import and_, delete, func, insert, or_, select, text
+from app.extensions import db
+from app.models import (
+    Notification, NotificationArchive, NotificationReceipt, NotificationType, OutboxEvent, UserRole
+)
+from app.utilis import notification_service
+
+_ARCHIVE_COLUMNS = (
+    Notification.id, Notification.user_id, Notification.audience, Notification.message,
+    Notification.type, Notification.is_read, Notification.created_at,
+)
+
+
+# -------------------------
+# ARCHIVES
+# -------------------------
+class TableArchive:
+    """Copies rows into notification_archive, in the same transaction as their delete."""
+
+    name = "table"
+
+    def write(self, rows):
+        db.session.execute(insert(NotificationArchive), [dict(row._mapping) for row in rows])
+
+
+class FileArchive:
+    """
+    Appends rows as JSON lines to one gzip file per month under `directory`.
+    Each batch is flushed to disk before its delete commits, so a crash can
+    repeat lines but never lose them.
+    """
+
+    name = "file"
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def write(self, rows):
+        path = os.path.join(self.directory, f"notifications-{datetime.now(timezone.utc):%Y-%m}.jsonl.gz")
+        with gzip.open(path, "at", encoding="utf-8") as f:
+            for row in rows:
+                f.write(json.dumps({
+                    "id": str(row.id),
+                    "user_id": str(row.user_id) if row.user_id else None,
+                    "audience": row.audience.value if row.audience else None,
+                    "message": row.message,
+                    "type": row.type.value,
+                    "is_read": row.is_read,
+                    "created_at": row.created_at.isoformat(),
+                }) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class NoArchive:
+    name = "none"
+
+    def write(self, rows):
+        pass
+
+
+def get_archive(config):
+    backend = config.get("NOTIFICATION_ARCHIVE", "table")
+    if backend == "table":
+        return TableArchive()
+    if backend == "file":
+        return FileArchive(config.get("NOTIFICATION_ARCHIVE_PATH") or os.path.join(
+            current_app.instance_path, "notification_archive"
+        ))
+    if backend == "none":
+        return NoArchive()
+    raise ValueError(f"Unknown NOTIFICATION_ARCHIVE: {backend}")
+
+
+# -------------------------
+# SIZES
+# -------------------------
+def index_bytes(table="notifications"):
+    """On-disk size of a table's indexes, or None where the database can't tell."""
+    conn = db.session.connection()
+    dialect = conn.dialect.name
+    try:
+        if dialect == "postgresql":
+            return conn.execute(text("SELECT pg_indexes_size(CAST(:t AS regclass))"), {"t": table}).scalar()
+        if dialect == "sqlite":
+            return conn.execute(text(
+                "SELECT COALESCE(SUM(pgsize), 0) FROM dbstat WHERE name IN "
+                "(SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = :t)"
+            ), {"t": table}).scalar()
+    except Exception:
+        # SQLite builds without the dbstat table
+        db.session.rollback()
+    return None
+
+
+# -------------------------
+# PRUNING
+# -------------------------
+def _expired(notification_type, cutoff):
+    """Read personal notifications, and broadcasts of any read state, older than `cutoff`."""
+    return and_(
+        Notification.type == notification_type,
+        Notification.created_at < cutoff,
+        or_(
+            and_(Notification.user_id.isnot(None), Notification.is_read.is_(True)),
+            Notification.audience.isnot(None),
+        ),
+    )
+
+
+def prune_notifications(now=None, batch_size=None, max_batches=None, dry_run=False):
+    """
+    Moves notifications past their type's NOTIFICATION_RETENTION_DAYS into
+    the archive and deletes them, `batch_size` rows per transaction, so no
+    lock is held for long; NOTIFICATION_RETENTION_PAUSE seconds between
+    batches leave room for request traffic. Unread personal notifications
+    are kept. Processed outbox events past OUTBOX_RETENTION_DAYS are
+    deleted the same way. Returns a report dict.
+    """
+    config = current_app.config
+    now = now or datetime.now(timezone.utc)
+    batch_size = batch_size or config.get("NOTIFICATION_RETENTION_BATCH_SIZE", 1000)
+    pause = config.get("NOTIFICATION_RETENTION_PAUSE", 0)
+    ttls = config.get("NOTIFICATION_RETENTION_DAYS", {})
+    archive = get_archive(config)
+    started = time.perf_counter()
+
+    rows_before = db.session.execute(select(func.count(Notification.id))).scalar()
+    bytes_before = index_bytes()
+    report = {
+        "dry_run": dry_run,
+        "archive": archive.name,
+        "rows_before": rows_before,
+        "archived": {},
+        "batches": 0,
+        "outbox_deleted": 0,
+    }
+    pruned_audiences = set()
+
+    for type_name, days in ttls.items():
+        if days is None:
+            continue
+        notification_type = NotificationType(type_name)
+        expired = _expired(notification_type, now - timedelta(days=days))
+        if dry_run:
+            report["archived"][type_name] = db.session.execute(
+                select(func.count(Notification.id)).where(expired)
+            ).scalar()
+            continue
+
+        moved = 0
+        while max_batches is None or report["batches"] < max_batches:
+            rows = db.session.execute(
+                select(*_ARCHIVE_COLUMNS).where(expired).order_by(Notification.created_at).limit(batch_size)
+            ).all()
+            if not rows:
+                break
+            ids = [row.id for row in rows]
+            archive.write(rows)
+            db.session.execute(delete(NotificationReceipt).where(NotificationReceipt.notification_id.in_(ids)))
+            db.session.execute(delete(Notification).where(Notification.id.in_(ids)))
+            db.session.commit()
+            moved += len(rows)
+            report["batches"] += 1
+            pruned_audiences.update(row.audience for row in rows if row.audience is not None)
+            if pause:
+                time.sleep(pause)
+        report["archived"][type_name] = moved
+
+    outbox_days = config.get("OUTBOX_RETENTION_DAYS")
+    if outbox_days is not None and not dry_run:
+        report["outbox_deleted"] = _prune_outbox(now - timedelta(days=outbox_days), batch_size, pause)
+
+    # Dropped broadcasts may have been unread by someone; recount their role
+    for audience in pruned_audiences:
+        notification_service.reconcile_all(role=UserRole(audience))
+
+    removed = sum(report["archived"].values())
+    report["rows_removed"] = removed
+    report["index_bytes_before"] = bytes_before
+    report["index_bytes_after"] = index_bytes()
+    # Pages freed by the delete are reused by new inserts; the files only
+    # shrink after VACUUM FULL / REINDEX, so report the share freed
+    report["index_bytes_reclaimed"] = (
+        round(bytes_before * removed / rows_before) if bytes_before and rows_before else None
+    )
+    report["duration_s"] = round(time.perf_counter() - started, 3)
+    return report
+
+
+def _prune_outbox(cutoff, batch_size, pause):
+    deleted = 0
+    while True:
+        ids = db.session.execute(
+            select(OutboxEvent.id)
+            .where(OutboxEvent.processed_at.isnot(None), OutboxEvent.processed_at < cutoff)
+            .limit(batch_size)
+        ).scalars().all()
+        if not ids:
+            return deleted
+        db.session.execute(delete(OutboxEvent).where(OutboxEvent.id.in_(ids)))
+        db.session.commit()
+        deleted += len(ids)
+        if pause:
+            time.sleep(pause)
+
+
+def run_scheduled(app):
+    """
+    Scheduler hook: one retention pass in its own app context, for an
+    in-process scheduler (e.g. APScheduler's add_job(run_scheduled, args=[app])).
+    From cron, run `flask notifications prune` instead.
+    """
+    with app.app_context():
+        try:
+            report = prune_notifications()
+        except Exception:
+            db.session.rollback()
+            app.logger.exception("Notification retention failed")
+            raise
+        finally:
+            db.session.remove()
+    app.logger.info("Notification retention: %s", json.dumps(report))
+    return report
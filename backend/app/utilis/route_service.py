@@ -0,0 +1,277 @@
+# app/utilis/route_service.py
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from app.extensions import db, route_cache, upstreams, singleflight
+from app.models import Parcel, ParcelStatus
+from app.utilis.polyline import simplify, encode
+from app.utilis.routing import RouteEstimator
+from app.utilis.upstream import UpstreamError
+
+
+# OSRM codes meaning the points can't be joined by road, as opposed to a bad reply
+NO_ROUTE_CODES = ("NoRoute", "NoSegment")
+
+
+class RouteNotFound(Exception):
+    """
+    OSRM answered, but without a usable route. `status` is 404 when there
+    is no route between the points and 502 when the reply is unusable.
+    """
+
+    def __init__(self, details):
+        super().__init__(details.get("code", "OSRM request failed"))
+        self.details = details
+        self.status = 404 if details.get("code") in NO_ROUTE_CODES else 502
+
+    @property
+    def message(self):
+        return "No route found" if self.status == 404 else "OSRM request failed"
+
+
+def fetch_route(o_lat, o_lng, d_lat, d_lng):
+    """
+    Full-geometry driving route, from the route cache or OSRM. Returns
+    {"distance_km", "duration_min", "coordinates", "source"}.
+    Raises UpstreamError or RouteNotFound.
+    """
+    cache_key = route_cache.key(o_lat, o_lng, d_lat, d_lng)
+    cached = route_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    # Concurrent viewers of the same route share one upstream call
+    data = singleflight.do(cache_key, lambda: upstreams.osrm.get_json(
+        f"/route/v1/driving/{o_lng},{o_lat};{d_lng},{d_lat}",
+        params={"overview": "full", "geometries": "geojson"},
+    ))
+    result = parse_osrm_route(data)
+    route_cache.set(cache_key, result)
+    return result
+
+
+async def fetch_route_async(osrm, flight, o_lat, o_lng, d_lat, d_lng):
+    """fetch_route for the asyncio maps API, using an AsyncUpstreamClient and AsyncSingleFlight."""
+    cache_key = route_cache.key(o_lat, o_lng, d_lat, d_lng)
+    cached = await route_cache.get_async(cache_key)
+    if cached is not None:
+        return cached
+
+    data = await flight.do(cache_key, lambda: osrm.get_json(
+        f"/route/v1/driving/{o_lng},{o_lat};{d_lng},{d_lat}",
+        params={"overview": "full", "geometries": "geojson"},
+    ))
+    result = parse_osrm_route(data)
+    await route_cache.set_async(cache_key, result)
+    return result
+
+
+def first_route(data):
+    """The first route of an OSRM reply; RouteNotFound if it has none."""
+    if data.get("code") != "Ok" or not data.get("routes"):
+        raise RouteNotFound(data)
+    return data["routes"][0]
+
+
+def parse_osrm_route(data):
+    route = first_route(data)
+    return {
+        "distance_km": route["distance"] / 1000,
+        "duration_min": route["duration"] / 60,
+        # Geometry (list of [lat, lng])
+        "coordinates": [[lat, lng] for lng, lat in route["geometry"]["coordinates"]],
+        "source": "osrm",
+    }
+
+
+def estimate_route(o_lat, o_lng, d_lat, d_lng, profile="driving"):
+    """Local estimate in the same shape as fetch_route, with a straight-line geometry."""
+    estimator = RouteEstimator.from_config(current_app.config)
+    distance_km, duration_min = estimator.estimate(o_lat, o_lng, d_lat, d_lng, profile)
+    return {
+        "distance_km": distance_km,
+        "duration_min": duration_min,
+        "coordinates": [[o_lat, o_lng], [d_lat, d_lng]],
+        "source": "estimate",
+    }
+
+
+def route_tolerance(value, config):
+    """
+    ?tolerance= in metres, snapped down to the nearest ROUTE_SIMPLIFY_TOLERANCES
+    step (default ROUTE_SIMPLIFY_TOLERANCE_M). ValueError if it isn't a
+    finite, non-negative number.
+    """
+    tolerance = float(config["ROUTE_SIMPLIFY_TOLERANCE_M"] if value is None else value)
+    if not math.isfinite(tolerance) or tolerance < 0:
+        raise ValueError("tolerance must be a number of metres")
+    return max(step for step in config["ROUTE_SIMPLIFY_TOLERANCES"] if step <= tolerance)
+
+
+def shape_route(route, tolerance, fmt):
+    """
+    Builds the /distance response from a route: geometry simplified to
+    `tolerance` metres and, for format=polyline, Google-encoded.
+    """
+    shaped = {
+        "distance": f"{round(route['distance_km'], 2)} km",
+        "duration": f"{round(route['duration_min'], 2)} mins",
+    }
+    coordinates = simplify(route["coordinates"], tolerance)
+    if fmt == "polyline":
+        shaped["polyline"] = encode(coordinates)
+    else:
+        shaped["coordinates"] = coordinates  # for frontend Map polyline
+    shaped["source"] = route["source"]
+    return shaped
+
+
+# -------------------------
+# REVERSE GEOCODING
+# -------------------------
+def geocode_key(lat, lng):
+    return f"geocode:{lat:.5f},{lng:.5f}"
+
+
+def geocode_payload(data):
+    """Reverse-geocode response from a Nominatim answer."""
+    address = data.get("address", {})
+    return {
+        "street": address.get("road") or "",
+        "city": address.get("city") or address.get("town") or address.get("village") or "",
+        "country": address.get("country") or "",
+    }
+
+
+def locality_payload(local, payload=None):
+    """
+    Reverse-geocode response near a known address: city and country from the
+    address index, the street from the Nominatim `payload` (empty without
+    one). Street text of customer addresses is never used.
+    """
+    return {"street": payload["street"] if payload else "", **local}
+
+
+# -------------------------
+# PARCEL ROUTES
+# -------------------------
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor(app):
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=app.config.get("PARCEL_ROUTE_WORKERS", 2), thread_name_prefix="parcel-route"
+            )
+        return _executor
+
+
+def clear_parcel_route(parcel):
+    parcel.route_distance_km = None
+    parcel.route_duration_min = None
+    parcel.route_polyline = None
+    parcel.route_computed_at = None
+    parcel.route_source = None
+
+
+def update_parcel_route(parcel_id):
+    """Computes and stores the pickup -> delivery route of a parcel."""
+    parcel = db.session.get(Parcel, parcel_id)
+    if parcel is None:
+        return None
+
+    pickup, delivery = parcel.pickup_address, parcel.delivery_address
+    if None in (pickup.lat, pickup.lng, delivery.lat, delivery.lng):
+        clear_parcel_route(parcel)
+        db.session.commit()
+        return None
+
+    points = (float(pickup.lat), float(pickup.lng), float(delivery.lat), float(delivery.lng))
+    try:
+        route = fetch_route(*points)
+    except (UpstreamError, RouteNotFound) as e:
+        current_app.logger.warning("Estimating route for parcel %s: %s", parcel.tracking_id, e)
+        route = estimate_route(*points)
+
+    tolerance = current_app.config["ROUTE_SIMPLIFY_TOLERANCE_M"]
+    parcel.route_distance_km = round(route["distance_km"], 2)
+    parcel.route_duration_min = round(route["duration_min"], 2)
+    parcel.route_polyline = encode(simplify(route["coordinates"], tolerance))
+    parcel.route_computed_at = datetime.now(timezone.utc)
+    parcel.route_source = route["source"]
+    db.session.commit()
+    return parcel
+
+
+def retry_estimated_routes(limit=None):
+    """
+    Recomputes routes that were stored as estimates while OSRM was
+    unavailable, oldest first, for parcels still on their way. Returns
+    (retried, still_estimated).
+    """
+    retry_after = timedelta(seconds=current_app.config["PARCEL_ROUTE_RETRY_AFTER"])
+    query = (
+        db.session.query(Parcel.id)
+        .filter(
+            Parcel.route_source == "estimate",
+            Parcel.route_computed_at <= datetime.now(timezone.utc) - retry_after,
+            Parcel.status.notin_([ParcelStatus.DELIVERED, ParcelStatus.CANCELLED]),
+        )
+        .order_by(Parcel.route_computed_at)
+    )
+    if limit is not None:
+        query = query.limit(limit)
+    parcel_ids = [parcel_id for (parcel_id,) in query]
+
+    still_estimated = 0
+    for parcel_id in parcel_ids:
+        parcel = update_parcel_route(parcel_id)
+        if parcel is not None and parcel.route_source == "estimate":
+            still_estimated += 1
+    return len(parcel_ids), still_estimated
+
+
+def _update_in_background(app, parcel_ids):
+    with app.app_context():
+        try:
+            for parcel_id in parcel_ids:
+                try:
+                    update_parcel_route(parcel_id)
+                except Exception:
+                    db.session.rollback()
+                    app.logger.exception("Failed to compute route for parcel %s", parcel_id)
+        finally:
+            db.session.remove()
+
+
+def schedule_parcel_routes(parcel_ids):
+    """
+    Computes the routes of `parcel_ids` one after another as a single job
+    off the request thread, so a bulk request holds one of the
+    PARCEL_ROUTE_WORKERS threads and leaves the others to other requests.
+    With PARCEL_ROUTE_ASYNC disabled (tests) it runs inline instead.
+    """
+    app = current_app._get_current_object()
+    parcel_ids = list(parcel_ids)
+    if not app.config.get("PARCEL_ROUTE_ASYNC", True):
+        for parcel_id in parcel_ids:
+            update_parcel_route(parcel_id)
+        return None
+    return _get_executor(app).submit(_update_in_background, app, parcel_ids)
+
+
+def schedule_parcel_route(parcel_id):
+    """Computes one parcel's route off the request thread; see schedule_parcel_routes."""
+    return schedule_parcel_routes([parcel_id])
+
+
+def address_coords(address):
+    """(lat, lng) as floats, for comparing an address before and after an update."""
+    if address is None or address.lat is None or address.lng is None:
+        return None
+    return float(address.lat), float(address.lng)
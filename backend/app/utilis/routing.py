@@ -0,0 +1,84 @@
+# app/utilis/routing.py
+from math import radians, sin, cos, asin, sqrt
+
+EARTH_RADIUS_KM = 6371.0088
+
+# Average door-to-door speeds in km/h, including stops
+DEFAULT_SPEED_PROFILES = {
+    "driving": 35.0,
+    "motorcycle": 40.0,
+    "cycling": 15.0,
+    "walking": 5.0,
+}
+
+# Roads are rarely straight: typical urban road distance / great-circle distance
+DEFAULT_CIRCUITY_FACTOR = 1.3
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    """Great-circle distance between two points in kilometres."""
+    phi1, phi2 = radians(lat1), radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = radians(lng2 - lng1)
+    a = sin(dphi / 2) ** 2 + cos(phi1) * cos(phi2) * sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * asin(min(1.0, sqrt(a)))
+
+
+def haversine_matrix_km(origins, destinations):
+    """
+    Great-circle distances for every origin/destination pair, as a list of
+    rows. Trig terms are computed once per point rather than once per pair.
+    """
+    o_terms = [(radians(lat), cos(radians(lat)), radians(lng)) for lat, lng in origins]
+    d_terms = [(radians(lat), cos(radians(lat)), radians(lng)) for lat, lng in destinations]
+    two_r = 2 * EARTH_RADIUS_KM
+
+    matrix = []
+    for o_phi, o_cos, o_lmb in o_terms:
+        row = []
+        for d_phi, d_cos, d_lmb in d_terms:
+            a = sin((d_phi - o_phi) / 2) ** 2 + o_cos * d_cos * sin((d_lmb - o_lmb) / 2) ** 2
+            row.append(two_r * asin(min(1.0, sqrt(a))))
+        matrix.append(row)
+    return matrix
+
+
+class RouteEstimator:
+    """
+    Offline routing: road distance is the great-circle distance times a
+    circuity factor, duration comes from a per-profile average speed.
+    Used for ?mode=fast and whenever OSRM is unavailable.
+    """
+
+    def __init__(self, circuity=DEFAULT_CIRCUITY_FACTOR, speed_profiles=None):
+        self.circuity = circuity
+        self.speed_profiles = speed_profiles or DEFAULT_SPEED_PROFILES
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(
+            circuity=config.get("ROUTE_CIRCUITY_FACTOR", DEFAULT_CIRCUITY_FACTOR),
+            speed_profiles=config.get("ROUTE_SPEED_PROFILES", DEFAULT_SPEED_PROFILES),
+        )
+
+    def speed_for(self, profile):
+        try:
+            return self.speed_profiles[profile]
+        except KeyError:
+            raise ValueError(f"Unknown profile: {profile}")
+
+    def estimate(self, o_lat, o_lng, d_lat, d_lng, profile="driving"):
+        """Returns (distance_km, duration_min)."""
+        speed = self.speed_for(profile)
+        distance_km = haversine_km(o_lat, o_lng, d_lat, d_lng) * self.circuity
+        return distance_km, distance_km / speed * 60
+
+    def estimate_matrix(self, origins, destinations, profile="driving"):
+        """Returns (distances_km, durations_min) matrices."""
+        minutes_per_km = 60 / self.speed_for(profile)
+        distances = [
+            [km * self.circuity for km in row]
+            for row in haversine_matrix_km(origins, destinations)
+        ]
+        durations = [[km * minutes_per_km for km in row] for row in distances]
+        return distances, durations
@@ -0,0 +1,282 @@
+# app/utilis/upstream.py
+import asyncio
+import random
+import threading
+import time
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from flask import current_app
+
+
+class UpstreamError(Exception):
+    """Raised when an upstream call fails after all retries."""
+
+
+class UpstreamRejectedError(UpstreamError):
+    """
+    Raised when the upstream answered with a 4xx: it is up and will keep
+    refusing the same request, so callers should not fall back or retry.
+    """
+
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+class CircuitOpenError(UpstreamError):
+    """Raised without touching the network while the circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures. While open, calls
+    fail fast; after `reset_timeout` seconds one trial call is let through
+    (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._state = self.CLOSED
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+            return self._state
+
+    def allow_request(self):
+        state = self.state
+        if state == self.CLOSED:
+            return True
+        if state == self.HALF_OPEN:
+            # Only one trial request; everyone else keeps failing fast
+            with self._lock:
+                if self._state == self.HALF_OPEN:
+                    self._state = self.OPEN
+                    self.opened_at = time.monotonic()
+                    return True
+        return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._state = self.CLOSED
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.failures >= self.failure_threshold:
+                self._state = self.OPEN
+                self.opened_at = time.monotonic()
+
+
+class UpstreamClient:
+    """
+    Keep-alive HTTP client for one upstream service. Every call is bounded
+    by (connect, read) timeouts, retried with jittered exponential backoff
+    on network errors, 429 and 5xx, and guarded by a circuit breaker.
+    """
+
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __init__(self, name, base_url, connect_timeout=3.05, read_timeout=10,
+                 retries=2, backoff=0.2, pool_size=10, headers=None, breaker=None):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        if headers:
+            self.session.headers.update(headers)
+
+    def _sleep_before_retry(self, attempt):
+        # Full jitter: uniform in [0, backoff * 2^attempt]
+        time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+
+    def get_json(self, path="", params=None):
+        if not self.breaker.allow_request():
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+        url = f"{self.base_url}{path}"
+        last_error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                self._sleep_before_retry(attempt - 1)
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+            except requests.RequestException as e:
+                last_error = e
+                continue
+
+            if response.status_code in self.RETRY_STATUSES:
+                last_error = UpstreamError(f"{self.name} returned {response.status_code}")
+                continue
+            if 400 <= response.status_code < 500:
+                # Client errors won't fix themselves; don't retry or trip the breaker
+                self.breaker.record_success()
+                raise UpstreamRejectedError(f"{self.name} returned {response.status_code}",
+                                            response.status_code)
+            if response.status_code >= 500:
+                # Not worth retrying (e.g. 501), but still a server failure
+                self.breaker.record_failure()
+                raise UpstreamError(f"{self.name} returned {response.status_code}")
+
+            try:
+                data = response.json()
+            except ValueError as e:
+                last_error = e
+                continue
+
+            self.breaker.record_success()
+            return data
+
+        self.breaker.record_failure()
+        raise UpstreamError(f"{self.name} request failed: {last_error}")
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+        }
+
+    def close(self):
+        self.session.close()
+
+
+class AsyncUpstreamClient:
+    """
+    asyncio counterpart of UpstreamClient built on httpx.AsyncClient, with
+    the same timeouts, retry policy and circuit breaker semantics. One event
+    loop can hold hundreds of in-flight calls on a bounded connection pool.
+    """
+
+    RETRY_STATUSES = UpstreamClient.RETRY_STATUSES
+
+    def __init__(self, name, base_url, connect_timeout=3.05, read_timeout=10,
+                 retries=2, backoff=0.2, pool_size=100, headers=None, breaker=None):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.retries = retries
+        self.backoff = backoff
+        self.breaker = breaker or CircuitBreaker()
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            limits=httpx.Limits(max_connections=pool_size, max_keepalive_connections=pool_size),
+            headers=headers,
+        )
+
+    async def get_json(self, path="", params=None):
+        if not self.breaker.allow_request():
+            raise CircuitOpenError(f"{self.name} circuit is open")
+
+        url = f"{self.base_url}{path}"
+        last_error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                await asyncio.sleep(random.uniform(0, self.backoff * (2 ** (attempt - 1))))
+            try:
+                response = await self.client.get(url, params=params)
+            except httpx.HTTPError as e:
+                last_error = e
+                continue
+
+            if response.status_code in self.RETRY_STATUSES:
+                last_error = UpstreamError(f"{self.name} returned {response.status_code}")
+                continue
+            if 400 <= response.status_code < 500:
+                self.breaker.record_success()
+                raise UpstreamRejectedError(f"{self.name} returned {response.status_code}",
+                                            response.status_code)
+            if response.status_code >= 500:
+                self.breaker.record_failure()
+                raise UpstreamError(f"{self.name} returned {response.status_code}")
+
+            try:
+                data = response.json()
+            except ValueError as e:
+                last_error = e
+                continue
+
+            self.breaker.record_success()
+            return data
+
+        self.breaker.record_failure()
+        raise UpstreamError(f"{self.name} request failed: {last_error}")
+
+    def stats(self):
+        return {
+            "name": self.name,
+            "circuit": self.breaker.state,
+            "consecutive_failures": self.breaker.failures,
+        }
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+class Upstreams:
+    """
+    Flask extension holding one shared UpstreamClient per external service
+    (OSRM routing and Nominatim geocoding).
+    """
+
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        old = app.extensions.get("upstreams")
+        if old:
+            for client in old.values():
+                client.close()
+
+        def build(name, base_url, headers=None):
+            return UpstreamClient(
+                name,
+                base_url,
+                connect_timeout=app.config.get("UPSTREAM_CONNECT_TIMEOUT", 3.05),
+                read_timeout=app.config.get("UPSTREAM_READ_TIMEOUT", 10),
+                retries=app.config.get("UPSTREAM_RETRIES", 2),
+                backoff=app.config.get("UPSTREAM_BACKOFF", 0.2),
+                pool_size=app.config.get("UPSTREAM_POOL_SIZE", 10),
+                headers=headers,
+                breaker=CircuitBreaker(
+                    failure_threshold=app.config.get("CIRCUIT_FAILURE_THRESHOLD", 5),
+                    reset_timeout=app.config.get("CIRCUIT_RESET_TIMEOUT", 30),
+                ),
+            )
+
+        app.extensions["upstreams"] = {
+            "osrm": build("osrm", app.config["OSRM_URL"]),
+            "nominatim": build("nominatim", app.config["NOMINATIM_URL"],
+                               headers={"User-Agent": "DeliverooApp"}),
+        }
+
+    @property
+    def osrm(self):
+        return current_app.extensions["upstreams"]["osrm"]
+
+    @property
+    def nominatim(self):
+        return current_app.extensions["upstreams"]["nominatim"]
+
+    def stats(self):
+        return [client.stats() for client in current_app.extensions["upstreams"].values()]
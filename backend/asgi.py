@@ -0,0 +1,12 @@
+import os
+from app import create_app
+from app.routes.maps_async import create_asgi_app
+
+app = create_app(os.getenv("FLASK_CONFIG", "development"))
+application = create_asgi_app(app)
+
+# Opt-in: the Procfile serves run:app on threaded workers. Serve this with an
+# async worker where the maps traffic is routed, e.g.:
+#   PYTHONPATH=. gunicorn -k uvicorn.workers.UvicornWorker asgi:application
+# Keep /api/notifications/stream on run:app: the WSGI bridge does not see SSE
+# clients disconnect.
@@ -0,0 +1,94 @@
+"""
+Benchmark: creating N parcels by looping POST /api/customer/parcels vs
+one POST /api/customer/parcels/bulk, against the in-memory database.
+
+    cd backend && python -m benchmarks.bench_bulk_parcels [parcels] [rounds]
+
+Only the request is timed, as production sees it: outbox handlers and
+route computation run off the request thread there, so the outbox worker
+is not woken and route scheduling is skipped. Statements counts every
+SQL statement the requests sent.
+"""
+import statistics
+import sys
+import time
+import uuid
+
+from sqlalchemy import event
+
+import app.routes.customer as customer_routes
+from app import create_app
+from app.extensions import db, outbox
+from app.models import User, UserRole
+from flask_jwt_extended import create_access_token
+
+ADDRESS = {"street": "Moi Avenue", "city": "Nairobi", "country": "Kenya", "postal_code": "00100"}
+ITEM = {"pickup_address": ADDRESS, "delivery_address": ADDRESS, "weight_kg": 1.5}
+
+
+def customer_token():
+    user = User(
+        name="Bench Merchant",
+        email=f"bench{uuid.uuid4().hex[:8]}@example.com",
+        phone_number=f"07{uuid.uuid4().int % 10**8:08d}",
+        role=UserRole.CUSTOMER,
+        password="password123",
+    )
+    db.session.add(user)
+    db.session.commit()
+    return create_access_token(identity=str(user.id), additional_claims={"role": "CUSTOMER"})
+
+
+def measure(fn, rounds):
+    """Median seconds per call of fn, and statements sent by one call."""
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    times = []
+    for i in range(rounds):
+        if i == 0:
+            event.listen(db.engine, "before_cursor_execute", record)
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+        if i == 0:
+            event.remove(db.engine, "before_cursor_execute", record)
+    return statistics.median(times), len(statements)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    app = create_app("testing")
+    app.config.update(OUTBOX_ASYNC=True, BULK_PARCELS_MAX=max(count, 500))
+    type(outbox).wake = lambda self: None
+    customer_routes.schedule_parcel_route = lambda parcel_id: None
+    customer_routes.schedule_parcel_routes = lambda parcel_ids: None
+
+    with app.app_context():
+        db.create_all()
+        client = app.test_client()
+        headers = {"Authorization": f"Bearer {customer_token()}"}
+
+        def single():
+            for _ in range(count):
+                assert client.post("/api/customer/parcels", headers=headers, json=ITEM).status_code == 201
+
+        def bulk():
+            response = client.post("/api/customer/parcels/bulk", headers=headers, json={"parcels": [ITEM] * count})
+            assert response.status_code == 201
+
+        loop_s, loop_statements = measure(single, rounds)
+        bulk_s, bulk_statements = measure(bulk, rounds)
+        db.drop_all()
+
+    print(f"{count} parcels       seconds   parcels/s   statements")
+    print(f"loop of singles  {loop_s:8.3f}   {count / loop_s:9.1f}   {loop_statements:10d}")
+    print(f"one bulk call    {bulk_s:8.3f}   {count / bulk_s:9.1f}   {bulk_statements:10d}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark: login throughput per CPU core at each bcrypt cost, to pick
+BCRYPT_LOG_ROUNDS for an environment.
+
+    cd backend && python -m benchmarks.bench_hash_cost [min_cost] [max_cost] [seconds]
+
+Everything runs on one thread with hashing inline (HASH_POOL_WORKERS = 0),
+so the numbers are per core. "bcrypt" is checkpw alone; "login" is a full
+POST /api/auth/login against an in-memory database.
+"""
+import sys
+import time
+import uuid
+
+from app import create_app
+from app.extensions import db, password_hasher
+from app.models import User, UserRole
+from app.utilis.hashing import _hash, _check
+
+PASSWORD = "password123"
+
+
+def rate(fn, seconds):
+    """Calls fn repeatedly for about `seconds` and returns calls per second."""
+    fn()  # warm up
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        fn()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= seconds:
+            return calls / elapsed
+
+
+def bench_bcrypt(cost, seconds):
+    hashed = _hash(PASSWORD, cost)
+    return rate(lambda: _check(PASSWORD, hashed), seconds)
+
+
+def bench_login(cost, seconds):
+    app = create_app("testing")
+    app.config.update(BCRYPT_LOG_ROUNDS=cost, HASH_POOL_WORKERS=0, HASH_POOL_MAX_PENDING=1)
+    # The pool was built from the config by create_app; rebuild it from ours
+    password_hasher.init_app(app)
+    with app.app_context():
+        db.create_all()
+        user = User(
+            name="Bench User",
+            email=f"bench{uuid.uuid4().hex[:8]}@example.com",
+            phone_number=f"07{uuid.uuid4().int % 10**8:08d}",
+            role=UserRole.CUSTOMER,
+        )
+        user.password = PASSWORD
+        db.session.add(user)
+        db.session.commit()
+
+        client = app.test_client()
+        payload = {"email": user.email, "password": PASSWORD}
+
+        def login():
+            assert client.post("/api/auth/login", json=payload).status_code == 200
+
+        result = rate(login, seconds)
+        db.drop_all()
+    return result
+
+
+def main():
+    low = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    high = int(sys.argv[2]) if len(sys.argv) > 2 else 13
+    seconds = float(sys.argv[3]) if len(sys.argv) > 3 else 2
+
+    print("cost   bcrypt/s/core   login/s/core   ms per login")
+    for cost in range(low, high + 1):
+        bcrypt_rate = bench_bcrypt(cost, seconds)
+        login_rate = bench_login(cost, seconds)
+        print(f"{cost:4d}   {bcrypt_rate:13.1f}   {login_rate:12.1f}   {1000 / login_rate:12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+Benchmark: write throughput and hot-query latency with the legacy
+single-column indexes ("before") vs the query-shaped composites of
+migration 5d9c1e7b3f42 ("after"), on the in-memory testing database.
+
+    cd backend && python -m benchmarks.bench_indexes [customers] [parcels_per_customer] [reps]
+
+Rows are inserted with Core executemany, outside the ORM hooks, so the
+insert numbers are index maintenance plus SQLite itself. Each read is the
+statement the app issues, run `reps` times against a random customer or
+parcel; the median is reported.
+"""
+import importlib.util
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from sqlalchemy import func, select, text
+
+from app import create_app
+from app.extensions import db
+from app.models import (
+    Address, Notification, NotificationType, Parcel, ParcelStatus, StatusHistory, User, UserRole
+)
+from app.utilis.retention import index_bytes
+
+MIGRATION = Path(__file__).resolve().parent.parent / "migrations" / "versions" / "5d9c1e7b3f42_query_shaped_indexes.py"
+TABLES = ["users", "addresses", "parcels", "status_history", "notifications"]
+BATCH = 1000
+
+
+def load_migration():
+    spec = importlib.util.spec_from_file_location("query_shaped_indexes", MIGRATION)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def use_legacy_indexes(conn, migration):
+    for table, name, _ in migration.ADDED:
+        conn.execute(text(f"DROP INDEX {name}"))
+    for table, name, columns in migration.DROPPED:
+        conn.execute(text(f"CREATE INDEX {name} ON {table} ({', '.join(columns)})"))
+
+
+def rows(customers, per_customer):
+    now = datetime.now(timezone.utc)
+    users, addresses, parcels, history, notifications = [], [], [], [], []
+    admin_id = uuid.uuid4()
+    users.append({
+        "id": admin_id, "name": "Admin", "email": "admin@example.com", "phone_number": "0700000000",
+        "_password_hash": "x", "role": UserRole.ADMIN, "created_at": now, "updated_at": now,
+    })
+    statuses = list(ParcelStatus)
+    for c in range(customers):
+        user_id = uuid.uuid4()
+        users.append({
+            "id": user_id, "name": f"Customer {c}", "email": f"c{c}@example.com",
+            "phone_number": f"071{c:07d}", "_password_hash": "x", "role": UserRole.CUSTOMER,
+            "created_at": now, "updated_at": now,
+        })
+        for p in range(per_customer):
+            created = now - timedelta(minutes=random.randrange(60 * 24 * 365))
+            pickup, delivery = uuid.uuid4(), uuid.uuid4()
+            for address_id in (pickup, delivery):
+                addresses.append({
+                    "id": address_id, "street": f"{p} Moi Avenue", "city": "Nairobi", "county": "Nairobi",
+                    "country": "Kenya", "postal_code": "00100", "lat": -1.29, "lng": 36.82, "created_at": created,
+                })
+            parcel_id = uuid.uuid4()
+            parcels.append({
+                "id": parcel_id, "tracking_id": uuid.uuid4().hex[:12].upper(), "customer_id": user_id,
+                "pickup_address_id": pickup, "delivery_address_id": delivery, "weight_kg": 1.0,
+                "status": random.choice(statuses), "created_at": created, "updated_at": created,
+            })
+            for step in range(3):
+                history.append({
+                    "id": uuid.uuid4(), "parcel_id": parcel_id, "status": statuses[step], "actor_id": admin_id,
+                    "timestamp": created + timedelta(hours=step),
+                })
+                notifications.append({
+                    "id": uuid.uuid4(), "user_id": user_id, "message": f"Parcel update {step}",
+                    "type": NotificationType.PARCEL_UPDATE, "is_read": step < 2, "parcel_id": parcel_id,
+                    "event_count": 1, "created_at": created + timedelta(hours=step),
+                })
+    return [
+        (User, users), (Address, addresses), (Parcel, parcels),
+        (StatusHistory, history), (Notification, notifications),
+    ]
+
+
+def timed(fn, reps):
+    samples = []
+    for _ in range(reps):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return statistics.median(samples) * 1000
+
+
+def run(legacy, data, reps):
+    app = create_app("testing")
+    results = {}
+    with app.app_context():
+        db.create_all()
+        conn = db.session.connection()
+        if legacy:
+            use_legacy_indexes(conn, load_migration())
+
+        for model, batch in data:
+            start = time.perf_counter()
+            for i in range(0, len(batch), BATCH):
+                conn.execute(model.__table__.insert(), batch[i:i + BATCH])
+            results[f"insert {model.__tablename__} /s"] = len(batch) / (time.perf_counter() - start)
+        db.session.commit()
+        db.session.execute(text("ANALYZE"))
+
+        customers = [row["id"] for row in data[0][1] if row["role"] == UserRole.CUSTOMER]
+        parcels = [row["id"] for row in data[2][1]]
+        session = db.session
+        queries = {
+            "customer parcels": lambda: session.execute(
+                select(Parcel.id).where(Parcel.customer_id == random.choice(customers))
+                .order_by(Parcel.created_at.desc()).limit(20)
+            ).all(),
+            "admin by status": lambda: session.execute(
+                select(Parcel.id).where(Parcel.status == random.choice(list(ParcelStatus)))
+                .order_by(Parcel.created_at.desc()).limit(20)
+            ).all(),
+            "parcel history": lambda: session.execute(
+                select(StatusHistory.id).where(StatusHistory.parcel_id == random.choice(parcels))
+                .order_by(StatusHistory.timestamp)
+            ).all(),
+            "unread count": lambda: session.execute(
+                select(func.count(Notification.id))
+                .where(Notification.user_id == random.choice(customers), Notification.is_read.is_(False))
+            ).scalar(),
+            "expired by type": lambda: session.execute(
+                select(Notification.id).where(
+                    Notification.type == NotificationType.PARCEL_UPDATE,
+                    Notification.created_at < datetime.now(timezone.utc) - timedelta(days=300),
+                ).order_by(Notification.created_at).limit(100)
+            ).all(),
+        }
+        for name, fn in queries.items():
+            results[f"{name} ms"] = timed(fn, reps)
+        results["index KiB"] = sum(index_bytes(table) or 0 for table in TABLES) / 1024
+        db.drop_all()
+    return results
+
+
+def main():
+    customers = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    per_customer = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    reps = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+
+    random.seed(0)
+    data = rows(customers, per_customer)
+    before = run(True, data, reps)
+    after = run(False, data, reps)
+
+    print(f"{'':24s} {'before':>12s} {'after':>12s}")
+    for key in before:
+        print(f"{key:24s} {before[key]:12.2f} {after[key]:12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Benchmark: sync maps blueprint vs the asyncio maps API against a local
+stub OSRM/Nominatim that answers every call after a fixed delay.
+
+    cd backend && python -m benchmarks.bench_maps_async [requests] [delay_ms]
+
+The sync path is measured as one sync gunicorn worker sees it (requests
+served one after another); the async path sends every request at once
+into a single event loop.
+"""
+import asyncio
+import json
+import socket
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import httpx
+
+from app import create_app
+from app.extensions import route_cache, upstreams
+from app.routes.maps_async import create_asgi_app
+
+ROUTE = {
+    "code": "Ok",
+    "routes": [{
+        "distance": 12345.0,
+        "duration": 1800.0,
+        "geometry": {"coordinates": [[36.8219, -1.2921], [36.9, -1.3], [37.0, -1.35]]},
+    }],
+}
+REVERSE = {"address": {"road": "Moi Avenue", "city": "Nairobi", "country": "Kenya"}}
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # listen() backlog; the default of 5 makes bursts of connects wait on SYN retries
+    request_queue_size = 1024
+
+
+def start_stub(delay):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def setup(self):
+            super().setup()
+            # Headers and body go out in separate writes; don't let Nagle delay the body
+            self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+        def do_GET(self):
+            time.sleep(delay)
+            body = json.dumps(REVERSE if self.path.startswith("/reverse") else ROUTE).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = StubServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}"
+
+
+def distinct_params(n):
+    # Distinct origins so neither path is helped by the route cache
+    return [{"origin": f"-1.{2000 + i},36.8219", "destination": "-1.35,37.0"} for i in range(n)]
+
+
+def bench_sync(app, params):
+    client = app.test_client()
+    start = time.perf_counter()
+    for p in params:
+        assert client.get("/api/maps/distance", query_string=p).status_code == 200
+    return time.perf_counter() - start
+
+
+def bench_async(app, params):
+    application = create_asgi_app(app)
+
+    async def main():
+        transport = httpx.ASGITransport(app=application)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            start = time.perf_counter()
+            responses = await asyncio.gather(*[client.get("/api/maps/distance", params=p) for p in params])
+            elapsed = time.perf_counter() - start
+        await application.maps_api.state.maps.aclose()
+        assert all(r.status_code == 200 for r in responses)
+        return elapsed
+
+    return asyncio.run(main())
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    delay = (int(sys.argv[2]) if len(sys.argv) > 2 else 100) / 1000
+
+    server, url = start_stub(delay)
+    app = create_app("testing")
+    app.config.update(OSRM_URL=url, NOMINATIM_URL=url, UPSTREAM_RETRIES=0)
+    upstreams.init_app(app)
+
+    with app.app_context():
+        route_cache.clear()
+        sync_s = bench_sync(app, distinct_params(n))
+        route_cache.clear()
+        async_s = bench_async(app, distinct_params(n))
+
+    server.shutdown()
+    print(f"{n} route requests, upstream latency {delay * 1000:.0f} ms")
+    print(f"  sync worker : {sync_s:7.2f} s  ({n / sync_s:8.1f} req/s)")
+    print(f"  async worker: {async_s:7.2f} s  ({n / async_s:8.1f} req/s)")
+    print(f"  speedup     : {sync_s / async_s:7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Replace single-column indexes with query-shaped composite ones
+
+Revision ID: 5d9c1e7b3f42
+Revises: 2b8e4f0c7a15
+Create Date: 2026-10-18 17:58:40.337912
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5d9c1e7b3f42'
+down_revision = '2b8e4f0c7a15'
+branch_labels = None
+depends_on = None
+
+
+# (table, index, columns) dropped by this revision; recreated on downgrade
+DROPPED = [
+    ('addresses', 'ix_addresses_city', ['city']),
+    ('addresses', 'ix_addresses_country', ['country']),
+    ('addresses', 'ix_addresses_county', ['county']),
+    ('addresses', 'ix_addresses_created_at', ['created_at']),
+    ('addresses', 'ix_addresses_lat', ['lat']),
+    ('addresses', 'ix_addresses_lng', ['lng']),
+    ('addresses', 'ix_addresses_postal_code', ['postal_code']),
+    ('addresses', 'ix_addresses_street', ['street']),
+    ('users', 'ix_users_created_at', ['created_at']),
+    ('users', 'ix_users_name', ['name']),
+    ('users', 'ix_users_role', ['role']),
+    ('users', 'ix_users_updated_at', ['updated_at']),
+    ('notifications', 'ix_notifications_created_at', ['created_at']),
+    ('notifications', 'ix_notifications_is_read', ['is_read']),
+    ('notifications', 'ix_notifications_type', ['type']),
+    ('notifications', 'ix_notifications_user_id', ['user_id']),
+    ('parcels', 'ix_parcels_customer_id', ['customer_id']),
+    ('parcels', 'ix_parcels_delivery_address_id', ['delivery_address_id']),
+    ('parcels', 'ix_parcels_estimated_delivery_date', ['estimated_delivery_date']),
+    ('parcels', 'ix_parcels_pickup_address_id', ['pickup_address_id']),
+    ('parcels', 'ix_parcels_status', ['status']),
+    ('parcels', 'ix_parcels_updated_at', ['updated_at']),
+    ('status_history', 'ix_status_history_actor_id', ['actor_id']),
+    ('status_history', 'ix_status_history_parcel_id', ['parcel_id']),
+    ('status_history', 'ix_status_history_status', ['status']),
+    ('status_history', 'ix_status_history_timestamp', ['timestamp']),
+]
+
+ADDED = [
+    ('notifications', 'ix_notifications_user_unread', ['user_id', 'is_read', 'created_at']),
+    ('notifications', 'ix_notifications_type_created', ['type', 'created_at']),
+    ('parcels', 'ix_parcels_customer_created', ['customer_id', 'created_at']),
+    ('parcels', 'ix_parcels_status_created', ['status', 'created_at']),
+    ('status_history', 'ix_status_history_parcel_timestamp', ['parcel_id', 'timestamp']),
+]
+
+
+def upgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    # New indexes first, so queries never run without one
+    for table, name, columns in ADDED:
+        op.create_index(name, table, columns, unique=False)
+    for table, name, columns in DROPPED:
+        op.drop_index(name, table_name=table)
+
+    # ### end Alembic commands ###
+
+
+def downgrade():
+    # ### commands auto generated by Alembic - please adjust! ###
+    for table, name, columns in DROPPED:
+        op.create_index(name, table, columns, unique=False)
+    for table, name, columns in ADDED:
+        op.drop_index(name, table_name=table)
+
+    # ### end Alembic commands ###
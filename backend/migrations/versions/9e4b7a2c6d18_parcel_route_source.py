@@ -0,0 +1,28 @@
+"""Record whether a parcel route came from OSRM or a local estimate
+
+Revision ID: 9e4b7a2c6d18
+Revises: 5d9c1e7b3f42
+Create Date: 2026-10-18 21:05:12.480163
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e4b7a2c6d18'
+down_revision = '5d9c1e7b3f42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Routes computed before this revision keep a NULL source: there is no
+    # telling which were estimates, and they are never retried
+    with op.batch_alter_table('parcels', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('route_source', sa.String(length=10), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('parcels', schema=None) as batch_op:
+        batch_op.drop_column('route_source')
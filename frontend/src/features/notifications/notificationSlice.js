@@ -1,19 +1,41 @@
 import { createSlice, createAsyncThunk } from "@reduxjs/toolkit";
 import api from "../../api/axios";
 
-// Fetch notifications
+// Fetch the newest page of notifications
 export const fetchNotifications = createAsyncThunk(
   "notifications/fetch",
   async (_, { rejectWithValue }) => {
     try {
       const res = await api.get("/notifications/get/notifications");
-      return res.data;
+      return { items: res.data, nextCursor: res.headers["x-next-cursor"] || null };
     } catch (err) {
       return rejectWithValue(err.response?.data?.error || err.message);
     }
   }
 );
 
+// Fetch the page after the oldest notification loaded so far
+export const fetchOlderNotifications = createAsyncThunk(
+  "notifications/fetchOlder",
+  async (_, { getState, rejectWithValue }) => {
+    try {
+      const { nextCursor } = getState().notifications;
+      const res = await api.get("/notifications/get/notifications", {
+        params: { before: nextCursor },
+      });
+      return { items: res.data, nextCursor: res.headers["x-next-cursor"] || null };
+    } catch (err) {
+      return rejectWithValue(err.response?.data?.error || err.message);
+    }
+  },
+  {
+    condition: (_, { getState }) => {
+      const { nextCursor, loadingMore } = getState().notifications;
+      return Boolean(nextCursor) && !loadingMore;
+    },
+  }
+);
+
 // Mark a single notification as read
 export const markNotificationRead = createAsyncThunk(
   "notifications/markRead",
@@ -70,7 +92,10 @@ const notificationsSlice = createSlice({
   name: "notifications",
   initialState: {
     items: [],
+    // Cursor of the next older page; null once the oldest page is loaded
+    nextCursor: null,
     loading: false,
+    loadingMore: false,
     error: null,
   },
   reducers: {},
@@ -83,13 +108,30 @@ const notificationsSlice = createSlice({
       })
       .addCase(fetchNotifications.fulfilled, (state, action) => {
         state.loading = false;
-        state.items = action.payload;
+        state.items = action.payload.items;
+        state.nextCursor = action.payload.nextCursor;
       })
       .addCase(fetchNotifications.rejected, (state, action) => {
         state.loading = false;
         state.error = action.payload;
       })
 
+      // Fetch older notifications
+      .addCase(fetchOlderNotifications.pending, (state) => {
+        state.loadingMore = true;
+        state.error = null;
+      })
+      .addCase(fetchOlderNotifications.fulfilled, (state, action) => {
+        state.loadingMore = false;
+        const seen = new Set(state.items.map((n) => n.id));
+        state.items.push(...action.payload.items.filter((n) => !seen.has(n.id)));
+        state.nextCursor = action.payload.nextCursor;
+      })
+      .addCase(fetchOlderNotifications.rejected, (state, action) => {
+        state.loadingMore = false;
+        state.error = action.payload;
+      })
+
       // Mark single read
       .addCase(markNotificationRead.fulfilled, (state, action) => {
         const notif = state.items.find((n) => n.id === action.payload);
@@ -109,6 +151,7 @@ const notificationsSlice = createSlice({
       // Delete all notifications
       .addCase(deleteAllNotifications.fulfilled, (state) => {
         state.items = [];
+        state.nextCursor = null;
       });
   },
 });
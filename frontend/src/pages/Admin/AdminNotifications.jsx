@@ -5,6 +5,7 @@ import { useSelector, useDispatch } from "react-redux";
 import "../../styles/Notifications.css";
 import {
   fetchNotifications,
+  fetchOlderNotifications,
   markNotificationRead,
   markAllNotificationsRead,
   deleteNotification,
@@ -14,7 +15,7 @@ import { Check, Trash2 } from "lucide-react";
 
 const AdminNotifications = () => {
   const dispatch = useDispatch();
-  const { items: notifications, loading, error } = useSelector(
+  const { items: notifications, nextCursor, loading, loadingMore, error } = useSelector(
     (state) => state.notifications
   );
 
@@ -42,6 +43,10 @@ const AdminNotifications = () => {
     }
   };
 
+  const handleLoadOlder = () => {
+    dispatch(fetchOlderNotifications());
+  };
+
   if (loading) return <p>Loading notifications...</p>;
   if (error) return <p style={{ color: "red" }}>{error}</p>;
 
@@ -97,6 +102,12 @@ const AdminNotifications = () => {
               ))}
             </ul>
           )}
+
+          {nextCursor && (
+            <button className="load-older-btn" onClick={handleLoadOlder} disabled={loadingMore}>
+              {loadingMore ? "Loading..." : "Load older notifications"}
+            </button>
+          )}
         </section>
       </main>
     </div>
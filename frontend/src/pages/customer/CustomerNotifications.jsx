@@ -1,6 +1,6 @@
 import React, { useEffect } from "react";
 import { useDispatch, useSelector } from "react-redux";
-import { fetchNotifications,markNotificationRead,
+import { fetchNotifications,fetchOlderNotifications,markNotificationRead,
   markAllNotificationsRead,
   deleteNotification,
   deleteAllNotifications } from "../../features/notifications/notificationSlice";
@@ -10,7 +10,7 @@ import CustomerSideNav from "../../components/customer/CustomerSideNav";
 
 export default function CustomerNotifications({ user }) {
   const dispatch = useDispatch();
-  const { items: notifications, loading, error } = useSelector(
+  const { items: notifications, nextCursor, loading, loadingMore, error } = useSelector(
     (state) => state.notifications
   );
 
@@ -34,6 +34,10 @@ export default function CustomerNotifications({ user }) {
     dispatch(deleteAllNotifications());
   };
 
+  const handleLoadOlder = () => {
+    dispatch(fetchOlderNotifications());
+  };
+
   return (
     <div className="customer-dashboard">
       <CustomerSideNav user={user} view="notifications" setView={() => {}} onLogout={() => {}} />
@@ -76,6 +80,12 @@ export default function CustomerNotifications({ user }) {
             </li>
           ))}
         </ul>
+
+        {nextCursor && (
+          <button className="load-older-btn" onClick={handleLoadOlder} disabled={loadingMore}>
+            {loadingMore ? "Loading..." : "Load older notifications"}
+          </button>
+        )}
       </main>
     </div>
   );
@@ -0,0 +1,38 @@
+import { describe, it, expect, vi, beforeEach } from "vitest";
+import { configureStore } from "@reduxjs/toolkit";
+import api from "../api/axios";
+import notificationsReducer, {
+  fetchNotifications,
+  fetchOlderNotifications,
+} from "../features/notifications/notificationSlice";
+
+vi.mock("../api/axios", () => ({ default: { get: vi.fn() } }));
+
+const page = (ids, nextCursor) => ({
+  data: ids.map((id) => ({ id, message: id, is_read: false })),
+  headers: nextCursor ? { "x-next-cursor": nextCursor } : {},
+});
+
+describe("notifications slice", () => {
+  beforeEach(() => api.get.mockReset());
+
+  it("follows before cursors until the oldest page", async () => {
+    const store = configureStore({ reducer: { notifications: notificationsReducer } });
+    api.get.mockResolvedValueOnce(page(["c", "b"], "cursor-b")).mockResolvedValueOnce(page(["a"]));
+
+    await store.dispatch(fetchNotifications());
+    expect(store.getState().notifications.nextCursor).toBe("cursor-b");
+
+    await store.dispatch(fetchOlderNotifications());
+    expect(api.get).toHaveBeenLastCalledWith("/notifications/get/notifications", {
+      params: { before: "cursor-b" },
+    });
+    const state = store.getState().notifications;
+    expect(state.items.map((n) => n.id)).toEqual(["c", "b", "a"]);
+    expect(state.nextCursor).toBeNull();
+
+    // Nothing older left to fetch
+    await store.dispatch(fetchOlderNotifications());
+    expect(api.get).toHaveBeenCalledTimes(2);
+  });
+});